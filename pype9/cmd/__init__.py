@@ -1,3 +1,4 @@
+from . import build
 from . import convert
 from . import simulate
 from . import plot
@@ -0,0 +1,158 @@
+"""
+Generates and compiles the simulator code for the cell and network models in
+one or more 9ML documents without simulating them, e.g. so that simulation
+jobs can be run afterwards with the 'require' build mode::
+
+    $ pype9 build catalog://network/Brunel2000/AI my_cell.xml \\
+      --simulator nest --simulator neuron --manifest ~/build-manifest.json
+
+A manifest of the digests of the builds is printed to the standard output
+(or saved to file with the '--manifest' option).
+"""
+from __future__ import print_function
+import os.path
+import json
+from argparse import ArgumentParser
+from pype9.simulate.common.code_gen import BaseCodeGenerator
+from pype9.utils.arguments import nineml_document
+from pype9.utils.logging import logger
+
+
+def argparser():
+    parser = ArgumentParser(prog='pype9 build',
+                            description=__doc__)
+    parser.add_argument('models', type=str, nargs='+',
+                        help=("Paths to the 9ML documents or models to build. "
+                              "They can be relative paths, absolute paths, "
+                              "URLs or, if they start with 'catalog://', "
+                              "ninemlcatalog paths. A particular model in a "
+                              "document can be selected by appending its name "
+                              "after a #, e.g. "
+                              "catalog://neuron/Izhikevich#Izhikevich"))
+    parser.add_argument('--simulator', choices=('neuron', 'nest'), type=str,
+                        action='append', required=True,
+                        help=("Simulator backend to build the models for (can "
+                              "be supplied multiple times)"))
+    parser.add_argument('--build_mode', type=str, default='lazy',
+                        help=("The strategy used to build and compile the "
+                              "models. Can be one of '{}' (default "
+                              "%(default)s)".format("', '".join(
+                                  BaseCodeGenerator.BUILD_MODE_OPTIONS))))
+    parser.add_argument('--build_dir', default=None, type=str,
+                        help=("Base build directory"))
+    parser.add_argument('--build_version', type=str, default=None,
+                        help=("Version to append to name to use when building "
+                              "component classes"))
+    parser.add_argument('--build_workers', type=int, default=None,
+                        help=("The number of worker processes to build the "
+                              "models in (defaults to the number of CPUs)"))
+    parser.add_argument('--bundle_cells', action='store_true', default=False,
+                        help=("Compile the cell classes of each network into "
+                              "a single library"))
+    parser.add_argument('--manifest', type=str, default=None,
+                        help=("Path of the file to save the build manifest "
+                              "to instead of printing it"))
+    return parser
+
+
+def resolve_models(model_path):
+    """
+    Resolves the networks and cell component classes to build from a path to
+    a 9ML document or model
+
+    Parameters
+    ----------
+    model_path : str
+        Path to a 9ML document or model (see 'nineml_document')
+
+    Returns
+    -------
+    networks : list(nineml.Network)
+        The networks to build
+    component_classes : list(nineml.Dynamics)
+        The cell component classes to build
+    """
+    import nineml
+    from pype9.exceptions import Pype9UsageError
+    model = nineml_document(model_path)
+    networks = []
+    component_classes = []
+    if isinstance(model, nineml.Document):
+        if any(isinstance(e, nineml.Population) for e in model.elements):
+            networks.append(model.as_network(
+                os.path.splitext(os.path.basename(model_path))[0]))
+        else:
+            for elem in model.elements:
+                if isinstance(elem, nineml.DynamicsProperties):
+                    elem = elem.component_class
+                if (isinstance(elem, nineml.Dynamics) and not any(
+                        c.name == elem.name for c in component_classes)):
+                    component_classes.append(elem)
+    elif isinstance(model, nineml.Network):
+        networks.append(model)
+    elif isinstance(model, nineml.DynamicsProperties):
+        component_classes.append(model.component_class)
+    elif isinstance(model, nineml.Dynamics):
+        component_classes.append(model)
+    else:
+        raise Pype9UsageError(
+            "Cannot build '{}' as it is not a network, dynamics or dynamics "
+            "properties object".format(model))
+    return networks, component_classes
+
+
+def run(argv):
+    """
+    Builds the models from the provided arguments
+    """
+    args = argparser().parse_args(argv)
+
+    networks = []
+    component_classes = []
+    for model_path in args.models:
+        model_networks, model_component_classes = resolve_models(model_path)
+        networks.extend(model_networks)
+        component_classes.extend(model_component_classes)
+
+    build_kwargs = {'build_mode': args.build_mode,
+                    'build_base_dir': args.build_dir}
+    if args.build_version is not None:
+        build_kwargs['build_version'] = args.build_version
+
+    manifest = []
+    for simulator in args.simulator:
+        if simulator == 'neuron':
+            from pype9.simulate.neuron import Network, CellMetaClass  # @UnusedImport @IgnorePep8
+        elif simulator == 'nest':
+            from pype9.simulate.nest import Network, CellMetaClass  # @Reimport @IgnorePep8
+        else:
+            assert False
+        builds = []
+        for network in networks:
+            logger.info("Building the cell classes of the '{}' network for {}"
+                        .format(network.name, simulator))
+            for cell_class in Network.build_cell_classes(
+                    network, build_workers=args.build_workers,
+                    bundle_cells=args.bundle_cells, **build_kwargs):
+                builds.append((network.name, cell_class))
+        if component_classes:
+            logger.info("Building the '{}' cell classes for {}".format(
+                "', '".join(c.name for c in component_classes), simulator))
+            for cell_class in CellMetaClass.build_many(
+                    [dict(component_class=c, **build_kwargs)
+                     for c in component_classes],
+                    build_workers=args.build_workers):
+                builds.append((None, cell_class))
+        for network_name, cell_class in builds:
+            manifest.append({'simulator': simulator,
+                             'network': network_name,
+                             'name': cell_class.name,
+                             'build_name': cell_class.library_name,
+                             'digest': cell_class.build_digest})
+    manifest_str = json.dumps(manifest, indent=2, sort_keys=True)
+    if args.manifest is not None:
+        with open(args.manifest, 'w') as f:
+            f.write(manifest_str)
+        logger.info("Saved build manifest to '{}'".format(args.manifest))
+    else:
+        print(manifest_str)
@@ -98,6 +98,9 @@ def argparser():
     parser.add_argument('--build_version', type=str, default=None,
                         help=("Version to append to name to use when building "
                               "component classes"))
+    parser.add_argument('--bundle_cells', action='store_true', default=False,
+                        help=("Compile the cell classes of a network into a "
+                              "single library"))
     return parser
 
 
@@ -172,7 +175,8 @@ def run(argv):
             # Construct the network
             logger.info("Constructing network")
             network = Network(model, build_mode=args.build_mode,
-                              build_base_dir=args.build_dir)
+                              build_base_dir=args.build_dir,
+                              bundle_cells=args.bundle_cells)
             logger.info("Finished constructing the '{}' network"
                         .format(model.name))
             for rspec in record_specs:
@@ -181,11 +185,19 @@ def run(argv):
             logger.info("Running the simulation")
             sim.run(time)
         logger.info("Writing recorded data to file")
+        # Group the record specs by component array so the recordings of
+        # each array are gathered in a single call
+        array_specs = collections.defaultdict(list)
         for rspec in record_specs:
             pop_name, port_name = rspec.port.split('.')
+            array_specs[(pop_name, rspec.t_start)].append(
+                (port_name, rspec.fname))
+        for (pop_name, t_start), specs in array_specs.items():
             pop = network.component_array(pop_name)
-            neo.PickleIO(rspec.fname).write(pop.recording(
-                port_name, t_start=rspec.t_start))
+            recordings = pop.recordings([p for p, _ in specs],
+                                        t_start=t_start)
+            for port_name, fname in specs:
+                neo.PickleIO(fname).write(recordings[port_name])
     else:
         assert isinstance(model, (nineml.DynamicsProperties, nineml.Dynamics))
         # Override properties passed as options
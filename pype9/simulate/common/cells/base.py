@@ -14,6 +14,10 @@
 from builtins import next
 from builtins import object
 from itertools import chain
+from collections import namedtuple
+import os
+import tempfile
+import multiprocessing
 import numpy as np
 import quantities as pq
 import neo
@@ -37,6 +41,13 @@ logger = logging.Logger("Pype9")
 # e.g. 'Izhikevich'
 BUILD_NAME_SUFFIX = '9ML'
 
+# The details required to get and set a parameter or state variable of a
+# cell class, i.e. its dimension, the exponent of the simulator units, the
+# simulator units as 9ML and python-quantities units and the 9ML class
+# (Property or Initial) used to store its value
+CellVariable = namedtuple('CellVariable', ('dimension exponent units '
+                                           'pq_units nineml_type'))
+
 
 class CellMetaClass(type):
     """
@@ -55,9 +66,228 @@ class CellMetaClass(type):
         must be unique among classes loaded within the same simulation script.
     """
 
-    def __new__(cls, component_class, build_url=None, build_version=None,
-                build_base_dir=None, code_generator=None, build_mode='lazy',
-                **kwargs):
+    # The build modes in which builds that only differ by name can share the
+    # same compiled library
+    SHARED_BUILD_MODES = ('lazy', 'require')
+
+    def __new__(cls, component_class, **kwargs):
+        return cls.build_many([dict(component_class=component_class,
+                                    **kwargs)], build_workers=1)[0]
+
+    @classmethod
+    def build_many(cls, builds, build_workers=None, bundle=None):
+        """
+        Creates the cell classes for multiple component classes. The code for
+        the cell classes that haven't been loaded previously is generated and
+        compiled concurrently in a pool of worker processes, and then the
+        built libraries are loaded in a single pass. Alternatively, if a
+        bundle name is provided (and the code generator supports it), the
+        cell classes are compiled into a single library that is loaded in one
+        step.
+
+        Parameters
+        ----------
+        builds : list(dict)
+            The keyword arguments that would be passed to the CellMetaClass
+            constructor for each cell class
+        build_workers : int | None
+            The number of worker processes used to generate and compile the
+            cell classes. If None, the number of CPUs is used
+        bundle : str | None
+            The name of the library to compile the cell classes that need
+            to be built into. If None, each cell class is compiled into its
+            own library
+
+        Returns
+        -------
+        cell_classes : list(Cell)
+            The cell classes in the same order as the 'builds' argument
+        """
+        names = []
+        to_build = {}
+        new_names = []  # The names of the builds in to_build in order
+        cache_keys = []
+        for build_kwargs in builds:
+            # Check whether a structurally identical component class has
+            # already been built with the same arguments before cloning and
+            # transforming it for the build
+            cache_key, name = cls._cached_build_name(**build_kwargs)
+            cache_keys.append(cache_key)
+            if name is not None:
+                names.append(name)
+                continue
+            build = cls._prepare_build(**build_kwargs)
+            name = build['name']
+            try:
+                prev_build_component_class = cls._built_types[
+                    name].build_component_class
+            except KeyError:
+                try:
+                    prev_build_component_class = to_build[name][
+                        'build_component_class']
+                except KeyError:
+                    to_build[name] = build
+                    new_names.append(name)
+                    prev_build_component_class = None
+            if prev_build_component_class is not None:
+                cls._check_build_match(name, build['build_component_class'],
+                                       prev_build_component_class)
+            names.append(name)
+        if to_build:
+            # Calculate the digests that address the build directories (on
+            # all nodes so they can locate the built libraries)
+            for name in new_names:
+                build = to_build[name]
+                code_generator = build['code_generator']
+                build['digest'] = code_generator.build_digest(
+                    build['build_component_class'], **build['kwargs'])
+                # Builds that only differ by name (e.g. the same cell
+                # dynamics with different 'build_version' suffixes) share the
+                # library of the first of them that is loaded, built in this
+                # batch or found on disk
+                if build['build_mode'] in cls.SHARED_BUILD_MODES:
+                    build['shared_key'] = key = (
+                        code_generator.base_dir,
+                        code_generator.shared_digest(
+                            build['build_component_class'],
+                            **build['kwargs']))
+                    try:
+                        build['shares'] = cls._shared_builds[key]
+                    except KeyError:
+                        shared = next((to_build[n] for n in new_names
+                                       if n != name and to_build[n].get(
+                                           'shared_key') == key), None)
+                        if shared is not None:
+                            build['shares'] = shared.get('shares', (
+                                shared['name'], shared['url'],
+                                shared['digest']))
+                        elif not code_generator.is_built(
+                                name, build['url'], build['digest']):
+                            found = code_generator.find_shared_build(key[1])
+                            if found is not None:
+                                build['shares'] = found
+                    if 'shares' in build:
+                        logger.info(
+                            "Sharing library built for '{}' with '{}' as "
+                            "their build component classes are identical"
+                            .format(build['shares'][0], name))
+            unshared = [to_build[n] for n in new_names
+                        if 'shares' not in to_build[n]]
+            bundled = []
+            if bundle is not None:
+                # Bundle the builds that don't have an existing build
+                bundled = [b for b in unshared if not (
+                    b['build_mode'] == 'lazy' and b['code_generator'].is_built(
+                        b['name'], b['url'], b['digest']))]
+            if bundled:
+                code_generator = bundled[0]['code_generator']
+                build_mode = bundled[0]['build_mode']
+                if not code_generator.SUPPORTS_BUNDLES:
+                    logger.info("{} code generator does not support bundled "
+                                "builds, building cell classes separately"
+                                .format(code_generator.SIMULATOR_NAME))
+                    bundled = []
+                elif any(b['code_generator'] != code_generator or
+                         b['build_mode'] != build_mode for b in bundled):
+                    raise Pype9UsageError(
+                        "Cell classes compiled into the same bundle ('{}') "
+                        "must share the same code generator and build mode"
+                        .format(bundle))
+                else:
+                    bundle_digest = code_generator.bundle_digest(bundled)
+                    for build in bundled:
+                        build['bundled'] = True
+            # Only build the components on the root node
+            if is_mpi_master():
+                if bundled:
+                    code_generator.generate_bundle(
+                        bundle, bundled, build_mode=build_mode,
+                        digest=bundle_digest)
+                    unshared = [b for b in unshared if 'bundled' not in b]
+                cls._generate_builds(unshared, build_workers)
+                for build in unshared:
+                    if 'shared_key' in build:
+                        build['code_generator'].register_shared_build(
+                            build['shared_key'][1], build['name'],
+                            build['url'], build['digest'])
+            # Make slave nodes wait for the root node to finish building
+            mpi_comm.barrier()
+            if bundled:
+                code_generator.load_bundle(bundle, bundle_digest)
+            for name in new_names:
+                build = to_build[name]
+                code_generator = build['code_generator']
+                build_name, build_url, build_digest = build.get(
+                    'shares', (name, build['url'], build['digest']))
+                # Load newly built model (unless it shares a library that is
+                # already loaded or it was loaded in the bundle)
+                if build.get('shared_key') not in cls._shared_builds:
+                    if 'bundled' not in build:
+                        code_generator.load_libraries(build_name, build_url,
+                                                      build_digest)
+                    if 'shared_key' in build:
+                        cls._shared_builds[build['shared_key']] = (
+                            build_name, build_url, build_digest)
+                # Create class member dict of new class
+                component_class = build['component_class']
+                dct = {'name': name,
+                       # The name the cell is compiled and loaded into the
+                       # simulator under, which differs from 'name' if it
+                       # shares the library of another build
+                       'library_name': build_name,
+                       'component_class': component_class,
+                       'build_component_class': build[
+                           'build_component_class'],
+                       'build_digest': build_digest,
+                       'code_generator': code_generator,
+                       'unit_handler': code_generator.UnitHandler(
+                           component_class),
+                       'Simulation': cls.Simulation,
+                       '_variable_names': frozenset(chain(
+                           component_class.parameter_names,
+                           component_class.state_variable_names)),
+                       '_variables': {}}
+                # Create new class using Type.__new__ method
+                Cell = super(CellMetaClass, cls).__new__(
+                    cls, name, (cls.BaseCellClass,), dct)
+                # Save Cell class to allow it to save it being built again
+                cls._built_types[name] = Cell
+        for (key, component_class), name in zip(cache_keys, names):
+            cls._build_cache[key] = (component_class, name)
+        return [cls._built_types[n] for n in names]
+
+    @classmethod
+    def _cached_build_name(cls, component_class, **kwargs):
+        """
+        Looks up the name of a cell class built previously from a
+        structurally identical component class (i.e. with the same NineML
+        hash) and the same build arguments. As NineML objects are mutable,
+        the cached name is only returned if the component class it was built
+        from is still equal to the one provided
+
+        Returns
+        -------
+        cache_key : tuple(tuple(int, str), nineml.Dynamics)
+            The key of the build in the cache and the component class
+        name : str | None
+            The name of the previously built cell class or None if there
+            isn't one
+        """
+        key = (hash(component_class), repr(sorted(kwargs.items())))
+        try:
+            cached_component_class, name = cls._build_cache[key]
+        except KeyError:
+            name = None
+        else:
+            if not (cached_component_class is component_class or
+                    cached_component_class == component_class):
+                name = None
+        return (key, component_class), name
+
+    @classmethod
+    def _prepare_build(cls, component_class, build_url=None,
+                       build_version=None, build_base_dir=None,
+                       code_generator=None, build_mode='lazy', **kwargs):
         # Grab the url before the component class is cloned
         url = (build_url if build_url is not None else component_class.url)
         # Clone component class so annotations can be added to it and not bleed
@@ -80,61 +310,75 @@ class CellMetaClass(type):
         # Get transformed build class
         build_component_class = code_generator.transform_for_build(
             name=name, component_class=component_class, **kwargs)
-        try:
-            Cell = cls._built_types[name]
-        except KeyError:
-            build = True
+        return {'name': name, 'url': url,
+                'component_class': component_class,
+                'build_component_class': build_component_class,
+                'code_generator': code_generator,
+                'build_mode': build_mode,
+                'kwargs': kwargs}
+
+    @classmethod
+    def _check_build_match(cls, name, build_component_class,
+                           prev_build_component_class):
+        if not prev_build_component_class.equals(
+                build_component_class, annotations_ns=[PYPE9_NS]):
+            serial_kwargs = {'format': 'yaml', 'version': 2,
+                             'to_str': True}
+            raise Pype9BuildMismatchError(
+                "Cannot build '{}' cell dynamics as name clashes with "
+                "non-equal component class that was previously loaded. "
+                "Use 'build_version' option to differentiate between "
+                "them (will be appended to the built name)\n\n"
+                "This (url:{})\n-------------------\n{}\n{}"
+                "\nPrevious (url:{})\n-------------------\n{}\n{}\n"
+                "Mismatch\n-------------------\n{}\n\n"
+                .format(name,
+                        build_component_class.url,
+                        build_component_class.serialize(**serial_kwargs),
+                        build_component_class.dynamics.serialize(
+                            **serial_kwargs),
+                        prev_build_component_class.url,
+                        prev_build_component_class.serialize(
+                            **serial_kwargs),
+                        prev_build_component_class.dynamics.serialize(
+                            **serial_kwargs),
+                        build_component_class.find_mismatch(
+                            prev_build_component_class,
+                            annotations_ns=[PYPE9_NS])))
+
+    @classmethod
+    def _generate_builds(cls, builds, build_workers):
+        """
+        Generates and compiles the code for the given builds, in parallel
+        worker processes if more than one requires building
+        """
+        jobs = []
+        for build in builds:
+            code_generator = build['code_generator']
+            # Skip lazy builds that have already been built to avoid
+            # spawning worker processes unnecessarily
+            if build['build_mode'] == 'lazy' and code_generator.is_built(
+                    build['name'], build['url'], build['digest']):
+                continue
+            jobs.append((code_generator, dict(
+                component_class=build['build_component_class'],
+                url=build['url'], build_mode=build['build_mode'],
+                digest=build['digest'], **build['kwargs'])))
+        if build_workers is None:
+            build_workers = multiprocessing.cpu_count()
+        build_workers = min(build_workers, len(jobs))
+        if build_workers > 1:
+            logger.info("Building {} cell classes in {} worker processes"
+                        .format(len(jobs), build_workers))
+            pool = multiprocessing.Pool(build_workers)
+            try:
+                pool.map(_generate, jobs)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            if not Cell.build_component_class.equals(
-                    build_component_class, annotations_ns=[PYPE9_NS]):
-                serial_kwargs = {'format': 'yaml', 'version': 2,
-                                 'to_str': True}
-                raise Pype9BuildMismatchError(
-                    "Cannot build '{}' cell dynamics as name clashes with "
-                    "non-equal component class that was previously loaded. "
-                    "Use 'build_version' option to differentiate between "
-                    "them (will be appended to the built name)\n\n"
-                    "This (url:{})\n-------------------\n{}\n{}"
-                    "\nPrevious (url:{})\n-------------------\n{}\n{}\n"
-                    "Mismatch\n-------------------\n{}\n\n"
-                    .format(name,
-                            build_component_class.url,
-                            build_component_class.serialize(**serial_kwargs),
-                            build_component_class.dynamics.serialize(
-                                **serial_kwargs),
-                            Cell.build_component_class.url,
-                            Cell.build_component_class.serialize(
-                                **serial_kwargs),
-                            Cell.build_component_class.dynamics.serialize(
-                                **serial_kwargs),
-                            build_component_class.find_mismatch(
-                                Cell.build_component_class,
-                                annotations_ns=[PYPE9_NS])))
-            build = False
-        if build:
-            # Only build the components on the root node
-            if is_mpi_master():
-                # Generate and compile cell class
-                code_generator.generate(component_class=build_component_class,
-                                        url=url, build_mode=build_mode,
-                                        **kwargs)
-            # Make slave nodes wait for the root node to finish building
-            mpi_comm.barrier()
-            # Load newly built model
-            code_generator.load_libraries(name, url)
-            # Create class member dict of new class
-            dct = {'name': name,
-                   'component_class': component_class,
-                   'build_component_class': build_component_class,
-                   'code_generator': code_generator,
-                   'unit_handler': code_generator.UnitHandler(component_class),
-                   'Simulation': cls.Simulation}
-            # Create new class using Type.__new__ method
-            Cell = super(CellMetaClass, cls).__new__(
-                cls, name, (cls.BaseCellClass,), dct)
-            # Save Cell class to allow it to save it being built again
-            cls._built_types[name] = Cell
-        return Cell
+            for job in jobs:
+                _generate(job)
 
     def __init__(self, component_class, **kwargs):
         # This initializer is empty, but since I have changed the signature of
@@ -143,6 +387,15 @@ class CellMetaClass(type):
         pass
 
 
+def _generate(job):
+    """
+    Generates and compiles a build job (defined at the module level so it can
+    be pickled and passed to worker processes)
+    """
+    code_generator, kwargs = job
+    return code_generator.generate(**kwargs)
+
+
 class Cell(object):
     """
     Base class for all cell classes created from the CellMetaClass. It defines
@@ -168,9 +421,10 @@ class Cell(object):
         sim = self.Simulation.active()
         self._t_start = sim.t_start
         self._t_stop = None
+        # Values set since the 9ML properties were last updated
+        self._unsynced = {}
         if self.in_array:
-            for k, v in kwargs.items():
-                self._set(k, v)  # Values should be in the right units.
+            self._set_many(kwargs)  # Values should be in the right units.
             self._regime_index = None
         else:
             # These position arguments are a little more complex to retrieve
@@ -222,22 +476,97 @@ class Cell(object):
                     initial_values.append(nineml.Initial(name, qty))
                 else:
                     properties.append(nineml.Property(name, qty))
-            self._nineml = nineml.DynamicsProperties(
+            self._dynamics_properties = nineml.DynamicsProperties(
                 name=self.name + '_properties',
                 definition=prototype,
                 properties=properties, initial_values=initial_values,
                 check_initial_values=True)
             # Set up references from parameter names to internal variables and
             # set parameters
+            values = []
             for p in chain(self.properties, self.initial_values):
                 qty = p.quantity
                 if qty.value.nineml_type != 'SingleValue':
                     raise Pype9UsageError(
                         "Only SingleValue quantities can be used to initiate "
                         "individual cell classes ({})".format(p))
-                self._set(p.name, float(self.unit_handler.scale_value(qty)))
+                values.append((p.name, self._variable(p.name), qty))
+            self._set_many(self._scale_many(values))
             sim.register_cell(self)
 
+    @classmethod
+    def create_many(cls, n, prototype=None, regime=None, properties=None,
+                    initial_values=None):
+        """
+        Creates multiple cells of the class, with the simulator objects for
+        all the cells created in a single batch where the simulator supports
+        it (e.g. a single 'nest.Create' call)
+
+        Parameters
+        ----------
+        n : int
+            The number of cells to create
+        prototype : DynamicsProperties | None
+            A dynamics properties object used as the "prototype" for the
+            cells
+        regime : str | None
+            Name of regime the cells will be initiated in
+        properties : dict(str, nineml.Quantity | pq.Quantity | list)
+            Properties to initiate the cells with. Either a single quantity
+            shared by all cells, or an array quantity or list of quantities
+            of length n with a value for each cell
+        initial_values : dict(str, nineml.Quantity | pq.Quantity | list)
+            Initial values of state variables to initiate the cells with, in
+            the same format as 'properties'
+
+        Returns
+        -------
+        cells : list(Cell)
+            The created cells
+        """
+        values = {}
+        if properties is not None:
+            values.update(properties)
+        if initial_values is not None:
+            values.update(initial_values)
+        # Split values into per-cell lists of values
+        per_cell = {}
+        for name, value in list(values.items()):
+            if isinstance(value, pq.Quantity):
+                if value.ndim:
+                    per_cell[name] = list(value)
+            elif isinstance(value, (list, tuple, np.ndarray)):
+                per_cell[name] = list(value)
+            elif value.value.nineml_type == 'ArrayValue':
+                per_cell[name] = [nineml.Quantity(v, value.units)
+                                  for v in value.value]
+        for name, cell_values in per_cell.items():
+            if len(cell_values) != n:
+                raise Pype9UsageError(
+                    "Number of values provided for '{}' ({}) does not match "
+                    "the number of cells to create ({})".format(
+                        name, len(cell_values), n))
+            del values[name]
+        if prototype is None:
+            prototype = cls.component_class
+        cells = []
+        for i, sim_cell in enumerate(cls._create_simulator_cells(n)):
+            kwargs = dict(values)
+            kwargs.update((k, v[i]) for k, v in per_cell.items())
+            cells.append(cls(prototype, regime, _sim_cell=sim_cell,
+                             **kwargs))
+        return cells
+
+    @classmethod
+    def _create_simulator_cells(cls, n):
+        """
+        Creates the simulator objects for multiple cells in a single batch,
+        which are passed to the cell constructor via the '_sim_cell' keyword
+        argument. Can be overridden by simulator-specific classes, by default
+        the simulator objects are created by the cell constructors
+        """
+        return [None] * n
+
     @property
     def component_class(self):
         return self._nineml.component_class
@@ -253,28 +582,79 @@ class Cell(object):
         """
         super(Cell, self).__setattr__('_created', flag)
 
+    @property
+    def _nineml(self):
+        """
+        The 9ML properties of the cell, which are updated with the values set
+        via attributes (since they were last accessed) on demand to keep the
+        attribute setting fast
+        """
+        if self._unsynced:
+            for varname, value in self._unsynced.items():
+                variable = self._variables[varname]
+                self._dynamics_properties.set(variable.nineml_type(
+                    varname, nineml.Quantity(value, variable.units)))
+            self._unsynced.clear()
+        return self._dynamics_properties
+
     def __contains__(self, varname):
-        return varname in chain(self.component_class.parameter_names,
-                                self.component_class.state_variable_names)
+        return varname in self._variable_names
+
+    @classmethod
+    def _variable(cls, varname):
+        """
+        Returns the details required to get and set a parameter or state
+        variable (see CellVariable), which are calculated on first access and
+        stored in the cell class
+        """
+        try:
+            return cls._variables[varname]
+        except KeyError:
+            pass
+        dimension = cls.component_class.element(
+            varname, child_types=Dynamics.nineml_children).dimension
+        exponent, compound = cls.unit_handler.dimension_to_units_compound(
+            dimension)
+        if compound:
+            try:
+                pq_units = pq.Quantity(
+                    1.0, cls.unit_handler.compound_to_units_str(
+                        compound)).units
+            except (ValueError, LookupError):
+                pq_units = None  # Units that python-quantities can't parse
+        else:
+            pq_units = pq.dimensionless
+        if varname in cls.component_class.state_variable_names:
+            nineml_type = Initial
+        else:
+            nineml_type = Property
+        variable = cls._variables[varname] = CellVariable(
+            dimension, exponent, cls.unit_handler.dimension_to_units(
+                dimension), pq_units, nineml_type)
+        return variable
 
     def __getattr__(self, varname):
         """
         Gets the value of parameters and state variables
         """
         if self._created:
-            if varname not in self:
-                raise Pype9AttributeError(
-                    "'{}' is not an attribute nor parameter or state variable "
-                    "of the '{}' component class ('{}')"
-                    .format(varname, self.component_class.name,
-                            "', '".join(chain(
-                                self.component_class.parameter_names,
-                                self.component_class.state_variable_names))))
+            try:
+                variable = self._variables[varname]
+            except KeyError:
+                if varname not in self._variable_names:
+                    raise Pype9AttributeError(
+                        "'{}' is not an attribute nor parameter or state "
+                        "variable of the '{}' component class ('{}')"
+                        .format(varname, self.component_class.name,
+                                "', '".join(chain(
+                                    self.component_class.parameter_names,
+                                    self.component_class.state_variable_names)
+                                )))
+                variable = self._variable(varname)
             val = self._get(varname)
-            qty = self.unit_handler.assign_units(
-                val, self.component_class.element(
-                    varname, child_types=Dynamics.nineml_children).dimension)
-            return qty
+            if variable.pq_units is None:
+                return self.unit_handler.assign_units(val, variable.dimension)
+            return pq.Quantity(val, variable.pq_units)
 
     def __setattr__(self, varname, val):
         """
@@ -289,7 +669,26 @@ class Cell(object):
         """
         if self._created:
             # Once the __init__ method has set all the members
-            if varname not in self:
+            value = self._scale_value(varname, self._lookup_variable(varname),
+                                      val)
+            if not self.in_array:
+                # Save the value to be set in the 9ML properties when they
+                # are next accessed
+                self._unsynced[varname] = value
+            # Set the value in the simulator
+            self._set(varname, value)
+        else:
+            super(Cell, self).__setattr__(varname, val)
+
+    def _lookup_variable(self, varname):
+        """
+        Returns the details of a parameter or state variable (see
+        CellVariable), raising an error if it isn't one
+        """
+        try:
+            return self._variables[varname]
+        except KeyError:
+            if varname not in self._variable_names:
                 raise Pype9AttributeError(
                     "'{}' is not a parameter or state variable of the '{}'"
                     " component class ('{}')"
@@ -297,28 +696,106 @@ class Cell(object):
                             "', '".join(chain(
                                 self.component_class.parameter_names,
                                 self.component_class.state_variable_names))))
-            if isinstance(val, pq.Quantity):
-                qty = self.unit_handler.from_pq_quantity(val)
+            return self._variable(varname)
+
+    def get_many(self, varnames):
+        """
+        Gets the values of multiple parameters and/or state variables, which
+        are retrieved from the simulator in a single batch
+
+        Parameters
+        ----------
+        varnames : list(str)
+            Names of the parameters and/or state variables
+
+        Returns
+        -------
+        values : dict(str, pq.Quantity)
+            The values of the parameters and/or state variables
+        """
+        varnames = list(varnames)
+        variables = [self._lookup_variable(n) for n in varnames]
+        values = {}
+        for varname, variable, val in zip(varnames, variables,
+                                          self._get_many(varnames)):
+            if variable.pq_units is None:
+                values[varname] = self.unit_handler.assign_units(
+                    val, variable.dimension)
             else:
-                qty = val
-            if qty.units.dimension != self.component_class.dimension_of(
-                    varname):
-                raise Pype9DimensionError(
-                    "Attempting so set '{}', which has dimension {} to "
-                    "{}, which has dimension {}".format(
-                        varname,
-                        self.component_class.dimension_of(varname), qty,
-                        qty.units.dimension))
-            if not self.in_array:
-                # Set the quantity in the nineml class
-                if varname in self.component_class.state_variable_names:
-                    self._nineml.set(Initial(varname, qty))
-                else:
-                    self._nineml.set(Property(varname, qty))
-            # Set the value in the simulator
-            self._set(varname, float(self.unit_handler.scale_value(qty)))
-        else:
-            super(Cell, self).__setattr__(varname, val)
+                values[varname] = pq.Quantity(val, variable.pq_units)
+        return values
+
+    def set_many(self, values):
+        """
+        Sets the values of multiple parameters and/or state variables, which
+        are converted to the simulator units in a single pass and passed to
+        the simulator in a single batch
+
+        Parameters
+        ----------
+        values : dict(str, pq.Quantity | nineml.Quantity)
+            The values to set, keyed by parameter/state variable name
+        """
+        scaled = self._scale_many(
+            (n, self._lookup_variable(n), v) for n, v in values.items())
+        if not self.in_array:
+            self._unsynced.update(scaled)
+        self._set_many(scaled)
+
+    def _scale_many(self, values):
+        """
+        Scales (varname, variable, value) tuples to a dictionary of values in
+        simulator units
+        """
+        return dict((n, self._scale_value(n, var, v)) for n, var, v in values)
+
+    def _get_many(self, varnames):
+        """
+        Gets the values of multiple variables from the simulator (can be
+        overridden by simulator-specific classes to retrieve them in a single
+        call)
+        """
+        return [self._get(n) for n in varnames]
+
+    def _set_many(self, values):
+        """
+        Sets the values of multiple variables in the simulator (can be
+        overridden by simulator-specific classes to set them in a single call)
+        """
+        for varname, value in values.items():
+            self._set(varname, value)
+
+    def _scale_value(self, varname, variable, val):
+        """
+        Scales a quantity to the value in simulator units of the given
+        parameter or state variable
+
+        Parameters
+        ----------
+        varname : str
+            Name of the of the parameter or state variable
+        variable : CellVariable
+            The precomputed details of the parameter or state variable
+        val : pq.Quantity | nineml.Quantity
+            The value to scale
+        """
+        if isinstance(val, pq.Quantity):
+            if variable.pq_units is not None:
+                try:
+                    return float(val.rescale(variable.pq_units))
+                except ValueError:
+                    raise Pype9DimensionError(
+                        "Attempting so set '{}', which has dimension {} to "
+                        "{}, which has incompatible units".format(
+                            varname, variable.dimension, val))
+            val = self.unit_handler.from_pq_quantity(val)
+        units = val.units
+        if tuple(units.dimension) != tuple(variable.dimension):
+            raise Pype9DimensionError(
+                "Attempting so set '{}', which has dimension {} to "
+                "{}, which has dimension {}".format(
+                    varname, variable.dimension, val, units.dimension))
+        return float(val.value) * 10 ** (units.power - variable.exponent)
 
     def set_regime(self, regime):
         if regime not in self.component_class.regime_names:
@@ -343,8 +820,7 @@ class Cell(object):
         return self._nineml.prop(varname)
 
     def set(self, **kwargs):
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+        self.set_many(kwargs)
 
     def __dir__(self):
         """
@@ -409,8 +885,11 @@ class Cell(object):
             nineml_children=Dynamics.nineml_children).name
 
     def initialize(self):
-        for iv in self._nineml.initial_values:
-            setattr(self, iv.name, iv.quantity)
+        # The initial values are already stored in the 9ML properties so only
+        # need to be set in the simulator
+        self._set_many(self._scale_many(
+            (i.name, self._lookup_variable(i.name), i.quantity)
+            for i in self._nineml.initial_values))
         self._set_regime()
 
     def write(self, file, **kwargs):  # @ReservedAssignment
@@ -481,6 +960,55 @@ class Cell(object):
     def _regime_recording(self):
         raise NotImplementedError("Should be implemented by derived class")
 
+    def _recorded_data(self, port_name):
+        """
+        Returns the raw data recorded from a port (or state variable), which
+        is served from the recording cache after the simulation has ended
+
+        Parameters
+        ----------
+        port_name : str
+            Name of the port to retrieve the recorded data for
+
+        Returns
+        -------
+        data : numpy.ndarray
+            The spike times (in ms) or signal values recorded from the port
+        interval : float | None
+            The sampling interval (in ms) of the recording if applicable
+        """
+        if self.is_dead():
+            return self._recording_cache[port_name]
+        return self._fetch_recorded_data([port_name])[port_name]
+
+    def _fetch_recorded_data(self, port_names=None):
+        """
+        Retrieves the raw data recorded from the given ports (all recorded
+        ports if None) from the simulator, in the format returned by
+        '_recorded_data'
+        """
+        raise NotImplementedError("Should be implemented by derived class")
+
+    @classmethod
+    def _spill_to_disk(cls, data, cache_dir):
+        """
+        Writes the data to a temporary file in the cache directory and returns
+        a read-only memory-mapped array of it
+        """
+        if not data.size:
+            return data  # Empty arrays cannot be memory-mapped
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        fd, fname = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, data)
+        mapped = np.load(fname, mmap_mode='r')
+        try:
+            os.remove(fname)  # The mapping remains valid on POSIX systems
+        except OSError:
+            pass
+        return mapped
+
     def regime_epochs(self):
         """
         Retrieves the periods spent in each regime during the simulation
@@ -566,14 +1094,34 @@ class Cell(object):
                     .format(prop.name, prop.units.dimension,
                             params_dict[prop.name].dimension))
 
-    def _kill(self, t_stop):
+    def _kill(self, t_stop, cache_dir=None):
         """
         Caches recording data and sets all references to the actual
         simulator object to None ahead of a simulator reset. This allows cell
         data to be accessed after a simulation has completed, and potentially
         a new simulation to have been started.
+
+        Parameters
+        ----------
+        t_stop : nineml.Quantity (time)
+            The time the simulation was stopped at
+        cache_dir : str | None
+            If provided, the recorded data is spilled into memory-mapped files
+            in this directory instead of being held in memory
         """
-        # TODO: Cache has not been implemented yet
+        if hasattr(self, '_recorders'):
+            cache = self._fetch_recorded_data()
+            if cache_dir is not None:
+                cache = dict(
+                    (n, (self._spill_to_disk(d, cache_dir), i))
+                    for n, (d, i) in cache.items())
+            # Keep the names of the recorded ports but drop the references to
+            # the simulator recorders
+            super(Cell, self).__setattr__(
+                '_recorders', dict.fromkeys(self._recorders))
+        else:
+            cache = {}
+        super(Cell, self).__setattr__('_recording_cache', cache)
         super(Cell, self).__setattr__('_t_stop', t_stop)
 
     def is_dead(self):
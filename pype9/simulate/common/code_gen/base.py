@@ -16,19 +16,28 @@ import platform
 import os
 import subprocess as sp
 import time
-from itertools import chain
+import hashlib
+import errno
+try:
+    import fcntl
+except ImportError:  # Locking isn't available on Windows
+    fcntl = None
+from itertools import chain, count
 from copy import deepcopy
+from contextlib import contextmanager
 import shutil
 from os.path import join
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from jinja2 import (
+    Environment, FileSystemLoader, FileSystemBytecodeCache, StrictUndefined)
 from future.utils import with_metaclass
 from abc import ABCMeta, abstractmethod
 import sympy
+from sympy.core.function import AppliedUndef
+from sympy.logic.boolalg import BooleanFunction, BooleanAtom
 from nineml import units
-from nineml.exceptions import NineMLNameError, NineMLSerializationError
 from pype9.exceptions import (
-    Pype9BuildError, Pype9CommandNotFoundError, Pype9RuntimeError)
-from ..cells.with_synapses import read
+    Pype9BuildError, Pype9CommandNotFoundError, Pype9RuntimeError,
+    Pype9UsageError)
 import pype9.annotations
 from pype9.annotations import PYPE9_NS, BUILD_PROPS
 from os.path import expanduser
@@ -46,6 +55,9 @@ BASE_BUILD_DIR = os.path.join(
     'v{}'.format(__version__),
     'python{}'.format(sysconfig.get_config_var('py_version')))
 
+# Sympy types of boolean expressions, which can't be stored as doubles
+_BOOLEAN_TYPES = (sympy.Rel, BooleanFunction, BooleanAtom)
+
 
 class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
     """
@@ -69,6 +81,17 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
     _INSTL_DIR = 'install'
     _CMPL_DIR = 'compile'  # Ignored for NEURON but used for NEST
     _BUILT_COMP_CLASS = 'built_component_class.xml'
+    _BUILD_COMPLETE = '.build_complete'  # Written once compilation succeeds
+    _TMPL_BYTECODE_DIR = '.template_bytecode'
+    _LOCK_FILE = '.lock'  # Locked while the work directory is being built
+    _SHARED_DIR = 'shared'  # Index of builds by name-independent digest
+    _BUNDLES_DIR = 'bundles'  # Libraries containing multiple cell classes
+    _SHARED_NAME = 'Shared'  # Placeholder name for name-independent digests
+
+    # Digests of the template directories of each code generator class
+    _template_digests = {}
+    # Jinja2 environments for each template directory and set of switches
+    _jinja_envs = {}
 
     # Python functions and annotations to be made available in the templates
     _globals = dict(
@@ -84,6 +107,10 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
     # units
     DEFAULT_UNITS = {}
 
+    # Whether multiple cell classes can be compiled into a single library
+    # (see 'generate_bundle')
+    SUPPORTS_BUNDLES = False
+
     def __init__(self, base_dir=None, **kwargs):  # @UnusedVariable
         if base_dir is None:
             base_dir = BASE_BUILD_DIR
@@ -126,7 +153,8 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
     def compile_source_files(self, compile_dir, name):
         pass
 
-    def generate(self, component_class, build_mode='lazy', url=None, **kwargs):
+    def generate(self, component_class, build_mode='lazy', url=None,
+                 digest=None, **kwargs):
         """
         Generates and builds the required simulator-specific files for a given
         NineML cell class
@@ -142,7 +170,10 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
             will be generated and compiled
         build_mode : str
             Available build options:
-                lazy - only build if files are modified
+                lazy - only build if there isn't a build with matching digest
+                       (generated files that are unchanged from a previous
+                       build are not rewritten so only the files that have
+                       changed need to be recompiled)
                 force - always generate and build
                 purge - remove all config files, generate and rebuild
                 require - require built binaries are present
@@ -155,6 +186,9 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
         url : str
             The URL where the component class is stored (used to form the
             build path)
+        digest : str | None
+            The digest of the build (see ``build_digest``). Calculated from
+            the component class and kwargs if not provided
         kwargs : dict
             A dictionary of (potentially simulator- specific) template
             arguments
@@ -165,121 +199,415 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
         orig_dir = os.getcwd()
         if url is None:
             url = component_class.url
+        if digest is None:
+            digest = self.build_digest(component_class, **kwargs)
         # Calculate compile directory path within build directory
-        src_dir = self.get_source_dir(name, url)
-        compile_dir = self.get_compile_dir(name, url)
-        install_dir = self.get_install_dir(name, url)
+        build_dir = self.get_build_dir(name, url, digest)
+        src_dir = self.get_source_dir(name, url, digest)
+        compile_dir = self.get_compile_dir(name, url, digest)
+        install_dir = self.get_install_dir(name, url, digest)
         # Path of the build component class
         built_comp_class_pth = os.path.join(src_dir, self._BUILT_COMP_CLASS)
+        # Path of the file that flags the build has completed successfully
+        build_complete_pth = os.path.join(build_dir, self._BUILD_COMPLETE)
         # Determine whether the installation needs rebuilding or whether there
-        # is an existing library module to use.
+        # is an existing library module to use. The work directories can be
+        # shared between the digests of a build (see 'get_source_dir') so
+        # they are locked while the build is generated and compiled
+        with self._work_lock(src_dir):
+            generate_source, compile_source = self._build_actions(
+                build_mode, name, digest, build_dir)
+            if generate_source or compile_source:
+                remove_ignore_missing(build_complete_pth)
+            # Generate source files from NineML code
+            if generate_source:
+                start_time = time.time()
+                self.clean_src_dir(src_dir, name,
+                                   purge=(build_mode == 'purge'))
+                self.generate_source_files(
+                    name=name,
+                    component_class=component_class,
+                    src_dir=src_dir,
+                    compile_dir=compile_dir,
+                    install_dir=install_dir,
+                    **kwargs)
+                # Saved for reference only, the digest is used to check the
+                # build
+                component_class.write(built_comp_class_pth,
+                                      preserve_order=True, version=2.0)
+                logger.info("Generated source files for '{}' in {:.2f} s"
+                            .format(name, time.time() - start_time))
+            if compile_source:
+                start_time = time.time()
+                # Clean existing compile & install directories from previous
+                # builds
+                if generate_source:
+                    self.clean_compile_dir(compile_dir,
+                                           purge=(build_mode == 'purge'))
+                    self.configure_build_files(
+                        name=name, src_dir=src_dir, compile_dir=compile_dir,
+                        install_dir=install_dir, **kwargs)
+                    self.clean_install_dir(install_dir)
+                self.compile_source_files(compile_dir, name)
+                with open(build_complete_pth, 'w') as f:
+                    f.write(digest)
+                logger.info("Compiled '{}' in {:.2f} s"
+                            .format(name, time.time() - start_time))
+        # Switch back to original dir
+        os.chdir(orig_dir)
+        # Cache any dimension maps that were calculated during the generation
+        # process
+        return install_dir
+
+    def _build_actions(self, build_mode, name, digest, build_dir):
+        """
+        Determines whether the source needs to be generated and/or compiled
+        for the given build mode. As the build directory is addressed by the
+        digest of the build, any completed build in it will match.
+
+        Returns
+        -------
+        generate_source : bool
+            Whether the source files need to be generated
+        compile_source : bool
+            Whether the source files need to be compiled
+        """
+        is_built = os.path.exists(os.path.join(build_dir,
+                                               self._BUILD_COMPLETE))
         if build_mode == 'purge':
-            remove_ignore_missing(src_dir)
-            remove_ignore_missing(install_dir)
-            remove_ignore_missing(compile_dir)
+            remove_ignore_missing(build_dir)
             generate_source = compile_source = True
         elif build_mode in ('force', 'build_only'):  # Force build
             generate_source = compile_source = True
         elif build_mode == 'require':  # Just check that prebuild is present
+            if not is_built:
+                raise Pype9BuildError(
+                    "Prebuilt installation of '{}' (digest {}) is not present "
+                    "in '{}', and is required for 'require' build option"
+                    .format(name, digest, build_dir))
             generate_source = compile_source = False
         elif build_mode == 'generate_only':  # Only generate
             generate_source = True
             compile_source = False
-        elif build_mode == 'lazy':  # Generate if source has been modified
-            compile_source = True
-            if not os.path.exists(built_comp_class_pth):
-                generate_source = True
+        elif build_mode == 'lazy':  # Generate if there is no matching build
+            if is_built:
+                generate_source = compile_source = False
+                logger.info("Found existing build of '{}' with matching "
+                            "digest in '{}' directory, code generation and "
+                            "compilation skipped (set 'build_mode' argument "
+                            "to 'force' or 'build_only' to enforce rebuild)"
+                            .format(name, build_dir))
             else:
-                try:
-                    built_component_class = read(built_comp_class_pth)[name]
-                    if built_component_class.equals(component_class,
-                                                    annotations_ns=[PYPE9_NS]):
-                        generate_source = False
-                        logger.info("Found existing source in '{}' directory, "
-                                    "code generation skipped (set 'build_mode'"
-                                    " argument to 'force' or 'build_only' to "
-                                    "enforce regeneration)".format(src_dir))
-                    else:
-                        generate_source = True
-                        logger.info("Found existing source in '{}' directory, "
-                                    "but the component classes differ so "
-                                    "regenerating sources".format(src_dir))
-                except (NineMLNameError, NineMLSerializationError):
-                    generate_source = True
-                    logger.info("Found existing source in '{}' directory, "
-                                "but could not find '{}' component class so "
-                                "regenerating sources".format(name, src_dir))
-        # Check if required directories are present depending on build_mode
-        elif build_mode == 'require':
-            if not os.path.exists(install_dir):
-                raise Pype9BuildError(
-                    "Prebuilt installation directory '{}' is not "
-                    "present, and is required for  'require' build option"
-                    .format(install_dir))
+                generate_source = compile_source = True
         else:
             raise Pype9BuildError(
                 "Unrecognised build option '{}', must be one of ('{}')"
                 .format(build_mode, "', '".join(self.BUILD_MODE_OPTIONS)))
-        # Generate source files from NineML code
-        if generate_source:
-            self.clean_src_dir(src_dir, name)
-            self.generate_source_files(
-                name=name,
-                component_class=component_class,
-                src_dir=src_dir,
-                compile_dir=compile_dir,
-                install_dir=install_dir,
-                **kwargs)
-            component_class.write(built_comp_class_pth,
-                                  preserve_order=True, version=2.0)
-        if compile_source:
-            # Clean existing compile & install directories from previous builds
+        return generate_source, compile_source
+
+    @contextmanager
+    def _work_lock(self, src_dir):
+        """
+        Holds an exclusive file lock on the work directory containing the
+        given source directory, so that concurrent processes building
+        variants that share the same source and compile directories don't
+        overwrite each other's files
+        """
+        work_dir = os.path.dirname(src_dir)
+        try:
+            os.makedirs(work_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise Pype9BuildError(
+                    "Could not create work directory '{}': {}"
+                    .format(work_dir, e))
+        with open(os.path.join(work_dir, self._LOCK_FILE), 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def build_digest(self, component_class, **kwargs):
+        """
+        Calculates a digest of everything that determines the built module,
+        i.e. the canonical serialization of the build component class, the
+        templates, the build options (e.g. solver switches), and the Pype9
+        and simulator versions. It is used to address the build directory
+
+        Parameters
+        ----------
+        component_class : Dynamics | MultiDynamics
+            The build component class (i.e. after 'transform_for_build')
+        kwargs : dict
+            The build options passed to 'generate'
+
+        Returns
+        -------
+        digest : str
+            Hex digest of the build
+        """
+        digest = hashlib.sha1()
+        digest.update(component_class.serialize(
+            format='xml', version=2.0, to_str=True,
+            ref_style='inline').encode('utf-8'))
+        digest.update(self.template_digest().encode('utf-8'))
+        digest.update(repr(sorted(kwargs.items())).encode('utf-8'))
+        digest.update('{} {} {}'.format(
+            pype9.__version__, self.SIMULATOR_NAME,
+            self.SIMULATOR_VERSION).encode('utf-8'))
+        return digest.hexdigest()
+
+    def shared_digest(self, component_class, **kwargs):
+        """
+        Calculates a digest of the build that is independent of its name, so
+        that the builds of structurally identical component classes under
+        different names (e.g. with different 'build_version' suffixes) can
+        share the same compiled library
+
+        Parameters
+        ----------
+        component_class : Dynamics | MultiDynamics
+            The build component class (i.e. after 'transform_for_build')
+        kwargs : dict
+            The build options passed to 'generate'
+
+        Returns
+        -------
+        digest : str
+            Hex digest of the build with the name of the component class
+            replaced with a placeholder
+        """
+        component_class = component_class.clone()
+        component_class.name = self._SHARED_NAME
+        return self.build_digest(component_class, **kwargs)
+
+    def find_shared_build(self, shared_digest):
+        """
+        Looks up a completed build with a matching name-independent digest
+        (see ``shared_digest``)
+
+        Returns
+        -------
+        build : tuple(str, str, str) | None
+            The name, url and digest of the completed build or None if there
+            isn't one
+        """
+        try:
+            with open(os.path.join(self.base_dir, self._SHARED_DIR,
+                                   shared_digest)) as f:
+                name, url, digest = f.read().split('\n')
+        except (IOError, ValueError):
+            return None
+        url = url if url else None
+        if not self.is_built(name, url, digest):
+            return None
+        return name, url, digest
+
+    def register_shared_build(self, shared_digest, name, url, digest):
+        """
+        Records a completed build under its name-independent digest so that
+        it can be found by ``find_shared_build``
+        """
+        if not self.is_built(name, url, digest):
+            return
+        shared_dir = os.path.join(self.base_dir, self._SHARED_DIR)
+        try:
+            os.makedirs(shared_dir)
+        except OSError:
+            if not os.path.isdir(shared_dir):
+                raise
+        with open(os.path.join(shared_dir, shared_digest), 'w') as f:
+            f.write('\n'.join((name, url if url else '', digest)))
+
+    def bundle_digest(self, builds):
+        """
+        Calculates the digest of a bundle of builds from the names and
+        digests of the builds it contains
+
+        Parameters
+        ----------
+        builds : list(dict)
+            The builds in the bundle, each containing 'name' and 'digest'
+            items
+        """
+        digest = hashlib.sha1()
+        for name, build_digest in sorted((b['name'], b['digest'])
+                                         for b in builds):
+            digest.update('{} {}\n'.format(name, build_digest).encode('utf-8'))
+        return digest.hexdigest()
+
+    def generate_bundle(self, bundle_name, builds, build_mode='lazy',
+                        digest=None):
+        """
+        Generates and compiles a single library containing multiple cell
+        classes, which can then be loaded in one step with ``load_bundle``.
+        Only supported by code generators for which SUPPORTS_BUNDLES is True
+
+        Parameters
+        ----------
+        bundle_name : str
+            The name of the bundled library
+        builds : list(dict)
+            The builds to include in the bundle, each containing the 'name',
+            build 'component_class', 'digest' and build 'kwargs'
+        build_mode : str
+            The build mode (see ``generate``)
+        digest : str | None
+            The digest of the bundle (see ``bundle_digest``). Calculated from
+            the builds if not provided
+        """
+        if not self.SUPPORTS_BUNDLES:
+            raise Pype9UsageError(
+                "{} code generator does not support bundled builds"
+                .format(self.SIMULATOR_NAME.upper()))
+        if digest is None:
+            digest = self.bundle_digest(builds)
+        orig_dir = os.getcwd()
+        build_dir = self.get_bundle_dir(bundle_name, digest)
+        src_dir = self.get_bundle_source_dir(bundle_name, digest)
+        compile_dir = self.get_bundle_compile_dir(bundle_name, digest)
+        install_dir = self.get_bundle_install_dir(bundle_name, digest)
+        build_complete_pth = os.path.join(build_dir, self._BUILD_COMPLETE)
+        purge = (build_mode == 'purge')
+        with self._work_lock(src_dir):
+            generate_source, compile_source = self._build_actions(
+                build_mode, bundle_name, digest, build_dir)
+            if generate_source or compile_source:
+                remove_ignore_missing(build_complete_pth)
+            model_names = [b['name'] for b in builds]
             if generate_source:
-                self.clean_compile_dir(compile_dir,
-                                       purge=(build_mode == 'purge'))
-                self.configure_build_files(
-                    name=name, src_dir=src_dir, compile_dir=compile_dir,
-                    install_dir=install_dir, **kwargs)
-                self.clean_install_dir(install_dir)
-            self.compile_source_files(compile_dir, name)
-        # Switch back to original dir
+                start_time = time.time()
+                self.clean_src_dir(src_dir, bundle_name, purge=purge)
+                self.generate_bundle_source_files(bundle_name, builds, src_dir)
+                logger.info("Generated source files for '{}' bundle ('{}') in "
+                            "{:.2f} s".format(
+                                bundle_name, "', '".join(model_names),
+                                time.time() - start_time))
+            if compile_source:
+                start_time = time.time()
+                if generate_source:
+                    self.clean_compile_dir(compile_dir, purge=purge)
+                    self.configure_build_files(
+                        name=bundle_name, src_dir=src_dir,
+                        compile_dir=compile_dir, install_dir=install_dir,
+                        model_names=model_names)
+                    self.clean_install_dir(install_dir)
+                self.compile_source_files(compile_dir, bundle_name)
+                with open(build_complete_pth, 'w') as f:
+                    f.write(digest)
+                logger.info("Compiled '{}' bundle in {:.2f} s"
+                            .format(bundle_name, time.time() - start_time))
         os.chdir(orig_dir)
-        # Cache any dimension maps that were calculated during the generation
-        # process
         return install_dir
 
-    def get_build_dir(self, name, url):
-        return os.path.join(self.base_dir, self.url_build_path(url), name)
+    def generate_bundle_source_files(self, bundle_name, builds, src_dir):
+        """
+        To be overridden by derived classes that support bundled builds to
+        generate the source files of all the builds in the bundle
+        """
+        raise Pype9UsageError(
+            "{} code generator does not support bundled builds"
+            .format(self.SIMULATOR_NAME.upper()))
+
+    def load_bundle(self, bundle_name, digest):
+        """
+        To be overridden by derived classes that support bundled builds to
+        load the bundled library
+        """
+        raise Pype9UsageError(
+            "{} code generator does not support bundled builds"
+            .format(self.SIMULATOR_NAME.upper()))
+
+    def get_bundle_dir(self, bundle_name, digest):
+        return os.path.join(self.base_dir, self._BUNDLES_DIR, bundle_name,
+                            digest)
 
-    def get_source_dir(self, name, url):
+    def get_bundle_source_dir(self, bundle_name, digest):
         return os.path.abspath(os.path.join(
-            self.get_build_dir(name, url), self._SRC_DIR))
+            self.get_bundle_dir(bundle_name, digest), self._SRC_DIR))
 
-    def get_compile_dir(self, name, url):
+    def get_bundle_compile_dir(self, bundle_name, digest):
         return os.path.abspath(os.path.join(
-            self.get_build_dir(name, url), self._CMPL_DIR))
+            self.get_bundle_dir(bundle_name, digest), self._CMPL_DIR))
 
-    def get_install_dir(self, name, url):
+    def get_bundle_install_dir(self, bundle_name, digest):
         return os.path.abspath(os.path.join(
-            self.get_build_dir(name, url), self._INSTL_DIR))
+            self.get_bundle_dir(bundle_name, digest), self._INSTL_DIR))
 
-    def clean_src_dir(self, src_dir, component_name):  # @UnusedVariable
-        # Clean existing src directories from previous builds.
-        shutil.rmtree(src_dir, ignore_errors=True)
+    @classmethod
+    def template_digest(cls):
+        """
+        Digest of the paths and contents of all files in the template
+        directory (only calculated once per code generator class)
+        """
+        try:
+            return cls._template_digests[cls.BASE_TMPL_PATH]
+        except KeyError:
+            digest = hashlib.sha1()
+            for dpath, _, fnames in sorted(os.walk(cls.BASE_TMPL_PATH)):
+                for fname in sorted(fnames):
+                    path = os.path.join(dpath, fname)
+                    digest.update(os.path.relpath(
+                        path, cls.BASE_TMPL_PATH).encode('utf-8'))
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+            hexdigest = cls._template_digests[
+                cls.BASE_TMPL_PATH] = digest.hexdigest()
+            return hexdigest
+
+    def is_built(self, name, url, digest):
+        """
+        Checks whether there is a completed build matching the digest
+        """
+        return os.path.exists(os.path.join(
+            self.get_build_dir(name, url, digest), self._BUILD_COMPLETE))
+
+    def get_build_dir(self, name, url, digest):
+        return os.path.join(self.base_dir, self.url_build_path(url), name,
+                            digest)
+
+    def get_source_dir(self, name, url, digest):
+        return os.path.abspath(os.path.join(
+            self.get_build_dir(name, url, digest), self._SRC_DIR))
+
+    def get_compile_dir(self, name, url, digest):
+        return os.path.abspath(os.path.join(
+            self.get_build_dir(name, url, digest), self._CMPL_DIR))
+
+    def get_install_dir(self, name, url, digest):
+        return os.path.abspath(os.path.join(
+            self.get_build_dir(name, url, digest), self._INSTL_DIR))
+
+    def clean_src_dir(self, src_dir, component_name, purge=False):  # @UnusedVariable @IgnorePep8
+        # Existing source files are only removed when purging, otherwise they
+        # are overwritten only if their contents change (see render_to_file)
+        # so that their modification times can be used to recompile
+        # incrementally
+        if purge:
+            shutil.rmtree(src_dir, ignore_errors=True)
         try:
             os.makedirs(src_dir)
         except OSError as e:
+            if os.path.isdir(src_dir):
+                return
             raise Pype9BuildError(
                 "Could not create source directory ({}), please check the "
                 "required permissions or specify a different \"build dir"
                 "base\" ('build_dir_base'):\n{}".format(src_dir, e))
 
-    def clean_compile_dir(self, compile_dir, purge=False):  # @UnusedVariable
-        # Clean existing compile & install directories from previous builds
-        shutil.rmtree(compile_dir, ignore_errors=True)
+    def clean_compile_dir(self, compile_dir, purge=False):
+        # Intermediate compilation files are kept between builds (unless
+        # purging) so that only the sources that have changed are recompiled
+        if purge:
+            shutil.rmtree(compile_dir, ignore_errors=True)
         try:
             os.makedirs(compile_dir)
         except OSError as e:
+            if os.path.isdir(compile_dir):
+                return
             raise Pype9BuildError(
                 "Could not create compile directory ({}), please check the "
                 "required permissions or specify a different \"build dir"
@@ -298,31 +626,103 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
 
     def render_to_file(self, template, args, filename, directory, switches={},
                        post_hoc_subs={}):
+        """
+        Renders a template to file. If the file already exists and its
+        contents match the rendered contents it is left untouched so that
+        its modification time is preserved and build tools (e.g. make) don't
+        recompile it unnecessarily
+
+        Returns
+        -------
+        changed : bool
+            Whether the file was (re)written
+        """
+        start_time = time.time()
+        jinja_env = self.jinja_environment(switches)
+        # Actually render the contents
+        contents = jinja_env.get_template(template).render(**args)
+        for old, new in list(post_hoc_subs.items()):
+            contents = contents.replace(old, new)
+        path = os.path.join(directory, filename)
+        changed = self.file_digest(path) != self.contents_digest(contents)
+        if changed:
+            # Write the contents to file
+            with open(path, 'w') as f:
+                f.write(contents)
+        logger.debug("Rendered '{}' template to '{}' in {:.3f} s ({})".format(
+            template, filename, time.time() - start_time,
+            'updated' if changed else 'unchanged'))
+        return changed
+
+    @classmethod
+    def contents_digest(cls, contents):
+        """
+        The fingerprint of the contents of a (rendered) file
+        """
+        if not isinstance(contents, bytes):
+            contents = contents.encode('utf-8')
+        return hashlib.sha1(contents).hexdigest()
+
+    @classmethod
+    def file_digest(cls, path):
+        """
+        The fingerprint of the contents of an existing file or None if the
+        file doesn't exist
+        """
+        try:
+            with open(path, 'rb') as f:
+                return cls.contents_digest(f.read())
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+    def jinja_environment(self, switches={}):
+        """
+        Returns the Jinja2 environment used to render the templates for the
+        given switches. Environments are cached per code generator class and
+        switches so that the compiled templates are reused between renders,
+        and the compiled template bytecode is cached in the build directory
+        so it is reused between sessions.
+
+        Parameters
+        ----------
+        switches : dict(str, str)
+            Switches that select include directories (e.g. solver type)
+        """
+        switches = tuple(sorted((n, v) for n, v in switches.items()
+                                if v is not None))
+        key = (self.BASE_TMPL_PATH, self.base_dir, switches)
+        try:
+            return self._jinja_envs[key]
+        except KeyError:
+            pass
         # Initialise the template loader to include the flag directories
         template_paths = [
             self.BASE_TMPL_PATH,
             os.path.join(self.BASE_TMPL_PATH, 'includes')]
         # Add include paths for various switches (e.g. solver type)
-        for name, value in list(switches.items()):
-            if value is not None:
-                template_paths.append(os.path.join(self.BASE_TMPL_PATH,
-                                                   'includes', name, value))
+        for name, value in switches:
+            template_paths.append(os.path.join(self.BASE_TMPL_PATH,
+                                               'includes', name, value))
         # Add default path for template includes
         template_paths.append(
             os.path.join(self.BASE_TMPL_PATH, 'includes', 'default'))
+        bytecode_dir = os.path.join(self.base_dir, self._TMPL_BYTECODE_DIR)
+        try:
+            os.makedirs(bytecode_dir)
+        except OSError:
+            if not os.path.isdir(bytecode_dir):
+                raise
         # Initialise the Jinja2 environment
-        jinja_env = Environment(loader=FileSystemLoader(template_paths),
-                                trim_blocks=True, lstrip_blocks=True,
-                                undefined=StrictUndefined)
+        jinja_env = Environment(
+            loader=FileSystemLoader(template_paths),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+            trim_blocks=True, lstrip_blocks=True, undefined=StrictUndefined)
         # Add some globals used by the template code
         jinja_env.globals.update(**self._globals)
-        # Actually render the contents
-        contents = jinja_env.get_template(template).render(**args)
-        for old, new in list(post_hoc_subs.items()):
-            contents = contents.replace(old, new)
-        # Write the contents to file
-        with open(os.path.join(directory, filename), 'w') as f:
-            f.write(contents)
+        self._jinja_envs[key] = jinja_env
+        return jinja_env
 
     def path_to_utility(self, utility_name, env_var='', **kwargs):  # @UnusedVariable @IgnorePep8
         """
@@ -421,8 +821,366 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
                 ('version', pype9.__version__)]:
             component_class.annotations.set((BUILD_PROPS, PYPE9_NS), k, v)
 
-    def run_command(self, cmd, fail_msg=None, **kwargs):
+    @classmethod
+    def expand_scaled_aliases(cls, expr, component_class, unit_handler):
+        """
+        Substitutes the (scaled) right-hand sides of the aliases referenced in
+        a scaled expression into it, so that it only refers to states,
+        parameters, ports, constants and reserved symbols
+
+        Parameters
+        ----------
+        expr : sympy.Expr
+            The scaled expression (e.g. from UnitHandler.scale_expr)
+        component_class : Dynamics
+            The component class the expression belongs to
+        unit_handler : UnitHandler
+            The unit handler used to scale the expression
+
+        Returns
+        -------
+        expanded : sympy.Expr
+            The expression with all aliases substituted
+        """
+        alias_names = set(component_class.alias_names)
+        while True:
+            aliases = [s for s in expr.free_symbols
+                       if str(s) in alias_names]
+            if not aliases:
+                break
+            expr = expr.subs(
+                [(s, unit_handler.scale_alias(
+                    component_class.alias(str(s)))[0].rhs) for s in aliases])
+        return expr
+
+    @classmethod
+    def expanded_time_derivatives(cls, regime, component_class,
+                                  unit_handler):
+        """
+        Returns the scaled right-hand sides of the time derivatives of a
+        regime with the aliases they refer to substituted in
+
+        Parameters
+        ----------
+        regime : Regime
+            The regime containing the time derivatives
+        component_class : Dynamics
+            The component class the regime belongs to
+        unit_handler : UnitHandler
+            The unit handler used to scale the time derivatives
+
+        Returns
+        -------
+        time_derivatives : list(tuple(str, sympy.Expr))
+            The names of the state variables and the expanded right-hand sides
+            of their time derivatives (in the order of the regime)
+        """
+        return [(td.variable, cls.expand_scaled_aliases(
+            scaled.rhs, component_class, unit_handler))
+            for td, scaled, _ in unit_handler.scale_time_derivatives(
+                regime.time_derivatives)]
+
+    @classmethod
+    def linear_system(cls, regime, component_class, unit_handler):
+        """
+        Checks whether the time derivatives of a regime form a linear system
+        with constant coefficients, dx/dt = A x + b, where the elements of A
+        only depend on parameters and constants and b is constant over a
+        timestep (i.e. doesn't depend on the states updated by the system,
+        time or random variables)
+
+        Parameters
+        ----------
+        regime : Regime
+            The regime to check
+        component_class : Dynamics
+            The component class the regime belongs to
+        unit_handler : UnitHandler
+            The unit handler used to scale the time derivatives
+
+        Returns
+        -------
+        system : tuple(list(str), list(list(sympy.Expr)), list) | None
+            The names of the state variables (x), the coefficient matrix (A)
+            and the inputs (b) of the system, or None if the regime doesn't
+            have time derivatives or they aren't linear with constant
+            coefficients
+        """
+        time_derivatives = cls.expanded_time_derivatives(
+            regime, component_class, unit_handler)
+        if not time_derivatives:
+            return None
+        states = [sympy.Symbol(n) for n, _ in time_derivatives]
+        coeff_names = set(chain(component_class.parameter_names,
+                                component_class.constant_names))
+        input_names = set(chain(
+            coeff_names, component_class.state_variable_names,
+            component_class.analog_receive_port_names,
+            component_class.analog_reduce_port_names)).difference(
+                str(s) for s in states)
+        A = []
+        b = []
+        for _, rhs in time_derivatives:
+            row = [sympy.diff(rhs, s) for s in states]
+            if any(not {str(s) for s in c.free_symbols}.issubset(coeff_names)
+                   for c in row):
+                return None
+            inpt = rhs.subs([(s, 0) for s in states])
+            if not {str(s) for s in inpt.free_symbols}.issubset(input_names):
+                return None
+            A.append(row)
+            b.append(inpt)
+        return [str(s) for s in states], A, b
+
+    @classmethod
+    def jacobian(cls, regime, component_class, unit_handler):
+        """
+        Differentiates the time derivatives of a regime symbolically with
+        respect to the state variables they update and time
+
+        Parameters
+        ----------
+        regime : Regime
+            The regime to differentiate the time derivatives of
+        component_class : Dynamics
+            The component class the regime belongs to
+        unit_handler : UnitHandler
+            The unit handler used to scale the time derivatives
+
+        Returns
+        -------
+        jacobian : tuple(list(str), list(list(sympy.Expr)), list) | None
+            The names of the state variables, the Jacobian matrix (df_i/dy_j)
+            and the partial derivatives of the time derivatives with respect
+            to time (df_i/dt), or None if the regime doesn't have any time
+            derivatives or they can't be differentiated symbolically (e.g.
+            they contain random variables or non-differentiable functions)
+        """
+        time_derivatives = cls.expanded_time_derivatives(
+            regime, component_class, unit_handler)
+        if not time_derivatives:
+            return None
+        states = [sympy.Symbol(n) for n, _ in time_derivatives]
+        known_names = set(chain(
+            component_class.parameter_names, component_class.constant_names,
+            component_class.state_variable_names,
+            component_class.analog_receive_port_names,
+            component_class.analog_reduce_port_names, ['t']))
+        t = sympy.Symbol('t')
+        J = []
+        dfdt = []
+        for _, rhs in time_derivatives:
+            if not {str(s) for s in rhs.free_symbols}.issubset(known_names):
+                return None
+            row = [sympy.diff(rhs, s) for s in states]
+            dfdt_i = sympy.diff(rhs, t)
+            if any(d.has(sympy.Derivative, sympy.Subs, sympy.DiracDelta,
+                         sympy.Heaviside, sympy.sign)
+                   for d in chain(row, [dfdt_i])):
+                return None
+            J.append(row)
+            dfdt.append(dfdt_i)
+        return [str(s) for s in states], J, dfdt
+
+    @classmethod
+    def depends_only_on(cls, expr, names):
+        """
+        Checks whether a (non-boolean) expression only refers to the given
+        symbol names and doesn't contain random distributions or piecewise
+        expressions, i.e. whether it can be evaluated once beforehand if the
+        names are parameters and constants
+
+        Parameters
+        ----------
+        expr : sympy.Expr
+            The expression to check
+        names : set(str)
+            The names of the symbols the expression is allowed to refer to
+        """
+        return (not isinstance(expr, _BOOLEAN_TYPES) and
+                not expr.atoms(AppliedUndef) and
+                not expr.has(sympy.Piecewise) and
+                {str(s) for s in expr.free_symbols}.issubset(names))
+
+    @classmethod
+    def parameter_aliases(cls, component_class, unit_handler):
+        """
+        Returns the names of the aliases that only depend on parameters and
+        constants (and are not overridden in any regime) so they only need to
+        be calculated when the parameters change
+
+        Parameters
+        ----------
+        component_class : Dynamics
+            The component class containing the aliases
+        unit_handler : UnitHandler
+            The unit handler used to scale the aliases
+
+        Returns
+        -------
+        alias_names : list(str)
+            The names of the parameter-only aliases, ordered so that each
+            alias is after the aliases it depends on
+        """
+        parameter_names = set(chain(component_class.parameter_names,
+                                    component_class.constant_names))
+        overridden = set(
+            a.name for a in component_class.aliases
+            if list(component_class.overridden_in_regimes(a)))
+        candidates = {}
+        for alias in component_class.aliases:
+            # Aliases that refer to overridden aliases depend on the regime
+            # (NB: 'expand_scaled_aliases' substitutes the default definition)
+            if cls._depends_on_aliases(alias, component_class, overridden):
+                continue
+            scaled = unit_handler.scale_alias(alias)[0].rhs
+            expanded = cls.expand_scaled_aliases(scaled, component_class,
+                                                 unit_handler)
+            if cls.depends_only_on(expanded, parameter_names):
+                candidates[alias.name] = set(
+                    str(s) for s in scaled.free_symbols).difference(
+                        parameter_names)
+        # Drop the aliases that refer to aliases that aren't candidates
+        # themselves
+        pruned = True
+        while pruned:
+            pruned = [n for n, deps in candidates.items()
+                      if not deps.issubset(candidates)]
+            for name in pruned:
+                del candidates[name]
+        # Sort the aliases so that their dependencies are calculated first
+        ordered = []
+        while candidates:
+            ready = sorted(n for n, deps in candidates.items()
+                           if deps.issubset(ordered))
+            if not ready:
+                raise Pype9BuildError(
+                    "Could not order the parameter-only aliases of '{}' "
+                    "('{}'), they contain a circular reference".format(
+                        component_class.name, "', '".join(sorted(candidates))))
+            ordered.extend(ready)
+            for name in ready:
+                del candidates[name]
+        return ordered
+
+    @classmethod
+    def _depends_on_aliases(cls, alias, component_class, names):
+        """
+        Checks whether an alias is, or refers to (directly or indirectly), any
+        of the given aliases
+        """
+        alias_names = set(component_class.alias_names)
+        to_check = [alias.name]
+        checked = set()
+        while to_check:
+            name = to_check.pop()
+            if name in names:
+                return True
+            checked.add(name)
+            to_check.extend(
+                n for n in component_class.alias(name).rhs_symbol_names
+                if n in alias_names and n not in checked)
+        return False
+
+    @classmethod
+    def hoist_parameter_terms(cls, exprs, parameter_names, derived,
+                              prefix='derived'):
+        """
+        Replaces the (maximal) terms of the expressions that only depend on
+        parameters and constants with "derived variables", which can be
+        calculated once when the parameters change instead of every time the
+        expressions are evaluated
+
+        Parameters
+        ----------
+        exprs : list(sympy.Expr)
+            The expressions to hoist the parameter-only terms from
+        parameter_names : set(str)
+            The names of the parameters and constants
+        derived : OrderedDict(sympy.Expr, sympy.Symbol)
+            The hoisted terms and the symbols of the derived variables that
+            replace them. Terms already in the dictionary are reused and new
+            ones are appended to it
+        prefix : str
+            The prefix of the names of new derived variables
+
+        Returns
+        -------
+        reduced : list(sympy.Expr)
+            The expressions with the parameter-only terms replaced
+        """
+        def is_trivial(expr):
+            # Not worth storing, e.g. 'tau', '2' or '-tau'
+            return expr.is_Atom or (expr.is_Mul and len(expr.args) == 2 and
+                                    expr.args[0].is_Number and
+                                    expr.args[1].is_Atom)
+
+        def derived_symbol(expr):
+            try:
+                return derived[expr]
+            except KeyError:
+                symbol = sympy.Symbol('{}{}_'.format(prefix, len(derived)))
+                derived[expr] = symbol
+                return symbol
+
+        def hoist(expr):
+            if expr.is_Atom or isinstance(
+                    expr, (sympy.Piecewise,) + _BOOLEAN_TYPES):
+                return expr
+            if cls.depends_only_on(expr, parameter_names):
+                return expr if is_trivial(expr) else derived_symbol(expr)
+            if expr.is_Add or expr.is_Mul:
+                # Group the parameter-only arguments of sums and products
+                params = [a for a in expr.args
+                          if cls.depends_only_on(a, parameter_names)]
+                args = [hoist(a) for a in expr.args
+                        if not cls.depends_only_on(a, parameter_names)]
+                if params:
+                    group = expr.func(*params)
+                    args.append(group if is_trivial(group)
+                                else derived_symbol(group))
+                return expr.func(*args)
+            return expr.func(*(hoist(a) for a in expr.args))
+
+        return [hoist(e) for e in exprs]
+
+    @classmethod
+    def common_subexpressions(cls, exprs, prefix='cse'):
+        """
+        Eliminates the common subexpressions of a set of expressions (e.g. the
+        time derivatives of a regime) with sympy's CSE
+
+        Parameters
+        ----------
+        exprs : list(sympy.Expr)
+            The expressions to eliminate the common subexpressions from
+        prefix : str
+            The prefix of the names of the temporary variables
+
+        Returns
+        -------
+        temporaries : list(tuple(sympy.Symbol, sympy.Expr))
+            The temporary variables, in the order they need to be calculated
+        reduced : list(sympy.Expr)
+            The expressions in terms of the temporary variables
+        """
+        # Drop the unit scale factors left over from the unit conversions so
+        # they don't produce trivial temporaries
+        exprs = [e.xreplace({sympy.Float(1.0): sympy.S.One}) for e in exprs]
+        temporaries, reduced = sympy.cse(
+            exprs, symbols=(sympy.Symbol('{}{}_'.format(prefix, i))
+                            for i in count()))
+        if any(isinstance(e, _BOOLEAN_TYPES)
+               for _, e in temporaries):
+            # Boolean temporaries (from piecewise conditions) can't be stored
+            # as doubles
+            return [], list(exprs)
+        return temporaries, reduced
+
+    def run_command(self, cmd, fail_msg=None, env_vars=None, **kwargs):
         env = os.environ.copy()
+        if env_vars is not None:
+            env.update(env_vars)
         try:
             process = sp.Popen(cmd, stdout=sp.PIPE,
                                stderr=sp.PIPE, env=env, **kwargs)
@@ -461,7 +1219,7 @@ class BaseCodeGenerator(with_metaclass(ABCMeta, object)):
                 path = os.path.join('file', os.path.realpath(url)[1:])
         return path
 
-    def load_libraries(self, name, url, **kwargs):
+    def load_libraries(self, name, url, digest, **kwargs):
         """
         To be overridden by derived classes to allow the model to be loaded
         from compiled external libraries
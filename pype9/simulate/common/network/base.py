@@ -6,6 +6,7 @@
 """
 from __future__ import absolute_import
 from builtins import next
+from builtins import zip
 from builtins import str
 from past.builtins import basestring
 from builtins import object
@@ -16,7 +17,10 @@ import neo
 from nineml.user import Property
 from pype9.exceptions import Pype9RuntimeError
 from .values import get_pyNN_value
+from pype9.utils.misc import structural_memo
 import os.path
+import errno
+import numpy
 import nineml
 from nineml import units as un
 from pyNN.parameters import Sequence
@@ -38,6 +42,8 @@ from ..cells import (
     MultiDynamicsWithSynapsesProperties, ConnectionPropertySet,
     SynapseProperties)
 from pype9.exceptions import Pype9UsageError, Pype9NameError
+from pype9.utils.mpi import mpi_comm, is_mpi_master
+from pype9.utils.logging import logger
 
 
 _REQUIRED_SIM_PARAMS = ['timestep', 'min_delay', 'max_delay', 'temperature']
@@ -57,13 +63,39 @@ class Network(object):
         A 9ML-Python model of a network (or Document containing
         populations and projections for 9MLv1) or a URL referring to a 9ML
         model.
+    build_mode : str
+        The build/compilation strategy for rebuilding the generated code, can
+        be one of 'lazy', 'force', 'build_only', 'require'.
+    build_workers : int | None
+        The number of worker processes used to generate and compile the cell
+        classes of the network concurrently. If None, the number of CPUs is
+        used
+    connections_from : str | None
+        Path to a directory the connections of a previous construction of the
+        network were saved to (see 'save_connections'). If provided the
+        connection groups are connected from the saved connections instead of
+        sampling their connectivity
+    bundle_cells : bool
+        Whether to compile the cell classes of the network that need to be
+        built into a single library (if supported by the simulator), which
+        only needs to be configured, linked and loaded once
     """
 
     # Name given to the "cell" component of the cell dynamics + linear synapse
     # dynamics multi-dynamics
     CELL_COMP_NAME = 'cell'
 
-    def __init__(self, nineml_model, build_mode='lazy', **kwargs):
+    # The columns saved for each connection by 'save_connections'
+    CONNECTION_COLUMNS = ('pre', 'post', 'weight', 'delay')
+    # Name of the file that records the number of shards (i.e. processes)
+    # the connections of a connection group were saved from
+    CONNECTION_SHARDS_FILENAME = 'num_shards'
+    # Appended to the build version of the network to name the library the
+    # cell classes are bundled into
+    CELL_BUNDLE_SUFFIX = 'Cells'
+
+    def __init__(self, nineml_model, build_mode='lazy', build_workers=None,
+                 connections_from=None, bundle_cells=False, **kwargs):
         if isinstance(nineml_model, basestring):
             nineml_model = nineml.read(nineml_model).as_network(
                 name=os.path.splitext(os.path.basename(nineml_model))[0])
@@ -87,6 +119,14 @@ class Network(object):
         # opposed to other networks
         build_url = kwargs.pop('build_url', nineml_model.url)
         build_version = nineml_model.name + kwargs.pop('build_version', '')
+        # Generate and compile the cell classes of all component arrays
+        # concurrently so they are already loaded when the arrays are created
+        self._build_cell_classes(
+            flat_comp_arrays.values(), build_workers,
+            bundle=(build_version + self.CELL_BUNDLE_SUFFIX
+                    if bundle_cells else None),
+            build_mode=build_mode, build_url=build_url,
+            build_version=build_version, **kwargs)
         for name, comp_array in flat_comp_arrays.items():
             self._component_arrays[name] = self.ComponentArrayClass(
                 comp_array, build_mode=build_mode,
@@ -118,10 +158,80 @@ class Network(object):
                         conn_group.destination.name]
                 except KeyError:
                     destination = self._selections[conn_group.destination.name]
+                if connections_from is not None:
+                    connections = self._load_connections(connections_from,
+                                                         name)
+                else:
+                    connections = None
                 self._connection_groups[name] = self.ConnectionGroupClass(
-                    conn_group, source=source, destination=destination)
+                    conn_group, source=source, destination=destination,
+                    connections=connections)
             self._finalise_construction()
 
+    @classmethod
+    def build_cell_classes(cls, nineml_model, build_workers=None,
+                           bundle_cells=False, **kwargs):
+        """
+        Generates, compiles and loads the cell classes required by a network
+        without constructing it, e.g. so that they can be built ahead of time
+        and the network constructed later with ``build_mode='require'``
+
+        Parameters
+        ----------
+        nineml_model : nineml.Network
+            The network model to build the cell classes for
+        build_workers : int | None
+            The number of worker processes to build the cell classes in
+        bundle_cells : bool
+            Whether to compile the cell classes into a single library
+        kwargs : dict
+            Build arguments as passed to the Network constructor (e.g.
+            'build_mode', 'build_version', 'build_base_dir')
+
+        Returns
+        -------
+        cell_classes : list(Cell)
+            The cell classes of the component arrays of the network
+        """
+        flat_comp_arrays = cls._flatten_to_arrays_and_conns(nineml_model)[0]
+        build_url = kwargs.pop('build_url', nineml_model.url)
+        build_version = nineml_model.name + kwargs.pop('build_version', '')
+        return cls._build_cell_classes(
+            flat_comp_arrays.values(), build_workers,
+            bundle=(build_version + cls.CELL_BUNDLE_SUFFIX
+                    if bundle_cells else None),
+            build_url=build_url, build_version=build_version, **kwargs)
+
+    @classmethod
+    def _build_cell_classes(cls, comp_arrays, build_workers, bundle=None,
+                            **kwargs):
+        """
+        Generates, compiles and loads the cell classes of the component arrays
+        in a single batch (see CellMetaClass.build_many)
+
+        Parameters
+        ----------
+        comp_arrays : list(nineml.ComponentArray)
+            The flattened component arrays of the network
+        build_workers : int | None
+            The number of worker processes to build the cell classes in
+        bundle : str | None
+            The name of the library to compile the cell classes into, or None
+            to compile them separately
+        kwargs : dict
+            Build arguments passed on to the CellMetaClass
+        """
+        WrapperMetaClass = cls.ComponentArrayClass.PyNNCellWrapperMetaClass
+        builds = []
+        for comp_array in comp_arrays:
+            celltype_kwargs = cls.ComponentArrayClass._celltype_kwargs(
+                comp_array)
+            celltype_kwargs.update(kwargs)
+            builds.append(WrapperMetaClass.cell_build_kwargs(
+                **celltype_kwargs))
+        return WrapperMetaClass.CellMetaClass.build_many(
+            builds, build_workers=build_workers, bundle=bundle)
+
     def _finalise_construction(self):
         """
         Can be overriden by deriving classes to do any simulator-specific
@@ -222,19 +332,105 @@ class Network(object):
 
     def save_connections(self, output_dir):
         """
-        Saves generated connections to output directory
+        Saves the generated connections of each connection group into a
+        sub-directory of the output directory, from which they can be loaded
+        by passing the output directory to the 'connections_from' argument of
+        the Network. Each process saves the connections local to it into
+        separate binary (NumPy) files for each column of the connections
+        (i.e. pre, post, weight and delay), so no connections need to be
+        communicated between processes.
 
-        @param output_dir:
+        Parameters
+        ----------
+        output_dir : str
+            Path to the directory to save the connections in
         """
-        for conn_grp in self.connection_groups.values():
+        for conn_grp in self.connection_groups:
             if isinstance(conn_grp.synapse_type,
                           pyNN.standardmodels.synapses.ElectricalSynapse):
-                attributes = 'weight'
+                attributes = ['weight']
             else:
-                attributes = 'all'
-            conn_grp.save(attributes, os.path.join(
-                output_dir, conn_grp.label + '.proj'), format='list',
-                gather=True)
+                attributes = ['weight', 'delay']
+            conns = numpy.asarray(
+                conn_grp.get(attributes, format='list', gather=False,
+                             with_address=True),
+                dtype=float).reshape(-1, len(attributes) + 2)
+            grp_dir = os.path.join(output_dir, conn_grp.name)
+            try:
+                os.makedirs(grp_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:  # Created by another process
+                    raise
+            for i, column in enumerate(self.CONNECTION_COLUMNS[:2] +
+                                       tuple(attributes)):
+                values = conns[:, i]
+                if column in ('pre', 'post'):
+                    values = values.astype(int)
+                numpy.save(os.path.join(grp_dir, '{}.{}.npy'.format(
+                    column, mpi_comm.rank)), values)
+            if is_mpi_master():
+                with open(os.path.join(
+                        grp_dir, self.CONNECTION_SHARDS_FILENAME), 'w') as f:
+                    f.write(str(mpi_comm.size))
+
+    @classmethod
+    def _load_connections(cls, connections_dir, name):
+        """
+        Loads the connections of a connection group saved by
+        'save_connections'. If the connections were saved from the same
+        number of processes, each process only loads the shard it saved (i.e.
+        the connections local to it), otherwise every process loads all the
+        shards. The shard files are memory-mapped and copied column by column
+        into a single connection list
+
+        Parameters
+        ----------
+        connections_dir : str
+            Path to the directory the connections were saved to
+        name : str
+            Name of the connection group
+
+        Returns
+        -------
+        conn_list : numpy.ndarray
+            The saved connections, one per row, with columns pre, post and
+            the saved attributes
+        column_names : list(str)
+            The names of the saved attributes (i.e. weight and delay)
+        """
+        grp_dir = os.path.join(connections_dir, name)
+        try:
+            with open(os.path.join(
+                    grp_dir, cls.CONNECTION_SHARDS_FILENAME)) as f:
+                num_shards = int(f.read())
+        except IOError:
+            raise Pype9UsageError(
+                "No saved connections found for '{}' connection group in "
+                "'{}'".format(name, connections_dir))
+        if num_shards == mpi_comm.size:
+            shard_indices = [mpi_comm.rank]
+        else:
+            logger.warning(
+                "Connections of '{}' were saved from {} processes but are "
+                "being loaded into {}, so every process will load all of "
+                "them".format(name, num_shards, mpi_comm.size))
+            shard_indices = list(range(num_shards))
+        # Delays are not saved for electrical synapses
+        columns = [c for c in cls.CONNECTION_COLUMNS
+                   if os.path.exists(os.path.join(grp_dir, '{}.{}.npy'.format(
+                       c, shard_indices[0])))]
+        shards = [[numpy.load(os.path.join(grp_dir, '{}.{}.npy'.format(c, i)),
+                              mmap_mode='r') for c in columns]
+                  for i in shard_indices]
+        conn_list = numpy.empty((sum(len(s[0]) for s in shards),
+                                 len(columns)))
+        start = 0
+        for shard in shards:
+            end = start + len(shard[0])
+            for j, values in enumerate(shard):
+                conn_list[start:end, j] = values
+            start = end
+        return conn_list, columns[2:]
 
     def record(self, variable, t_start=None):  # @UnusedVariable
         """
@@ -336,18 +532,27 @@ class Network(object):
         """
         component_arrays = {}
         connection_groups = {}
+        # Flatten the synapse of each projection once and index the
+        # projections by the populations they project to/from so the
+        # flattening is linear in the size of the network
+        flat_synapses = {}
+        receiving_projs = defaultdict(list)
+        sending_projs = defaultdict(list)
+        for proj in network_model.projections:
+            flat_synapses[proj.name] = cls._flatten_synapse(proj)
+            for index, end in ((receiving_projs, proj.post),
+                               (sending_projs, proj.pre)):
+                if end.nineml_type == 'Selection':
+                    for pop in end.populations:
+                        index[pop.name].append(proj)
+                else:
+                    index[end.name].append(proj)
         # Create flattened component with all synapses combined with the post-
         # synaptic cell dynamics using MultiDynamics
         for pop in network_model.populations:
             # Get all the projections that project to/from the given population
-            receiving = [p for p in network_model.projections
-                         if (pop == p.post or
-                             (p.post.nineml_type == 'Selection' and
-                              pop in p.post.populations))]
-            sending = [p for p in network_model.projections
-                       if (pop == p.pre or
-                           (p.pre.nineml_type == 'Selection' and
-                            pop in p.pre.populations))]
+            receiving = receiving_projs[pop.name]
+            sending = sending_projs[pop.name]
             # Create a dictionary to hold the cell dynamics and any synapse
             # dynamics that can be flattened into the cell dynamics
             # (i.e. linear ones).
@@ -379,7 +584,7 @@ class Network(object):
                 # version 2 as response and plasticity elements will be
                 # replaced by a synapse element in the standard. It will need
                 # be copied at this point though as it is modified
-                synapse, proj_conns = cls._flatten_synapse(proj)
+                synapse, proj_conns = flat_synapses[proj.name]
                 # Get all connections to/from the pre-synaptic cell
                 pre_conns = [pc for pc in proj_conns
                              if 'pre' in (pc.receiver_role, pc.sender_role)]
@@ -391,7 +596,7 @@ class Network(object):
                 # If the synapse is non-linear it can be combined into the
                 # dynamics of the post-synaptic cell.
                 try:
-                    if not synapse.component_class.is_linear():
+                    if not _is_linear(synapse.component_class):
                         raise Pype9UnflattenableSynapseException()
                     role2name['synapse'] = proj.name
                     # Extract "connection weights" (any non-singular property
@@ -419,8 +624,8 @@ class Network(object):
                             {'post': cls.CELL_COMP_NAME,
                              'pre': cls.CELL_COMP_NAME,
                              'synapse': proj.name}) for pc in post_conns]
-                    synapses.append(SynapseProperties(proj.name, synapse,
-                                                      synapse_conns))
+                    synapses.append(SynapseProperties(
+                        proj.name, synapse.clone(), synapse_conns))
                     # Add exposures to the post-synaptic cell for connections
                     # from the synapse
                     add_exposures(chain(*(
@@ -435,7 +640,7 @@ class Network(object):
             # populations.
             for proj in sending:
                 # Not required after transition to version 2 syntax
-                synapse, proj_conns = cls._flatten_synapse(proj)
+                _, proj_conns = flat_synapses[proj.name]
                 # Add send and receive exposures to list
                 add_exposures(chain(*(
                     pc.expose_ports({'pre': cls.CELL_COMP_NAME})
@@ -471,7 +676,7 @@ class Network(object):
             chain(iter(component_arrays.items()), iter(selections.items())))
         # Create ConnectionGroups from each port connection in Projection
         for proj in network_model.projections:
-            _, proj_conns = cls._flatten_synapse(proj)
+            _, proj_conns = flat_synapses[proj.name]
             # Get all connections to/from the pre-synaptic cell
             pre_conns = [pc for pc in proj_conns
                          if 'pre' in (pc.receiver_role, pc.sender_role)]
@@ -527,32 +732,27 @@ class Network(object):
         treated as a property of the connection (i.e. are not referenced
         anywhere except within the OnEvent blocks event port).
         """
-        component_class = dynamics_properties.component_class
         varying_params = set(
-            component_class.parameter(p.name).id
-            for p in dynamics_properties.properties
+            p.name for p in dynamics_properties.properties
             if p.value.nineml_type != 'SingleValue')
-        # Get list of ports refereneced (either directly or indirectly) by
-        # time derivatives and on-conditions
-        not_permitted = set(p.id for p in component_class.required_for(
-            chain(component_class.all_time_derivatives(),
-                  component_class.all_on_conditions())).parameters)
+        not_permitted, on_event_params = _parameters_required_for(
+            dynamics_properties.component_class)
         # If varying params intersects parameters that are referenced in time
         # derivatives they can not be redefined as connection parameters
         if varying_params & not_permitted:
             raise Pype9UnflattenableSynapseException()
-        conn_params = defaultdict(dict)
-        for on_event in component_class.all_on_events():
-            for param in component_class.required_for(
-                    on_event.state_assignments).parameters:
-                if param.id in varying_params:
-                    conn_params[on_event.src_port_name][param.id] = param
+        conn_params = defaultdict(list)
+        for port_name, param_names in on_event_params:
+            for param_name in param_names:
+                if (param_name in varying_params and
+                        param_name not in conn_params[port_name]):
+                    conn_params[port_name].append(param_name)
         return [
             ConnectionPropertySet(
                 append_namespace(prt, namespace),
-                [Property(append_namespace(p.name, namespace),
-                          dynamics_properties.property(p.name).quantity)
-                 for p in params.values()])
+                [Property(append_namespace(p, namespace),
+                          dynamics_properties.property(p).quantity)
+                 for p in params])
             for prt, params in conn_params.items()]
 
 #             raise NotImplementedError(
@@ -570,6 +770,30 @@ class Network(object):
 #             if not isinstance(p.value, SingleValue)]
 
 
+@structural_memo
+def _is_linear(component_class):
+    return component_class.is_linear()
+
+
+@structural_memo
+def _parameters_required_for(component_class):
+    """
+    Returns the names of the parameters referenced (either directly or
+    indirectly) by the time derivatives and on-conditions of the component
+    class, and the names of the parameters referenced by the state assignments
+    of each on-event (as a list of port name and parameter names pairs)
+    """
+    not_permitted = frozenset(p.name for p in component_class.required_for(
+        chain(component_class.all_time_derivatives(),
+              component_class.all_on_conditions())).parameters)
+    on_event_params = tuple(
+        (on_event.src_port_name, tuple(
+            p.name for p in component_class.required_for(
+                on_event.state_assignments).parameters))
+        for on_event in component_class.all_on_events())
+    return not_permitted, on_event_params
+
+
 class ComponentArray(object):
     """
     Component array object corresponds to a NineML type to be introduced in
@@ -592,13 +816,10 @@ class ComponentArray(object):
                 "Expected a component array, found {}".format(nineml_model))
         self._nineml = nineml_model
         dynamics_properties = nineml_model.dynamics_properties
-        dynamics = dynamics_properties.component_class
-        celltype = self.PyNNCellWrapperMetaClass(
-            component_class=dynamics,
-            default_properties=dynamics_properties,
-            initial_state=list(dynamics_properties.initial_values),
-            initial_regime=dynamics_properties.initial_regime,
-            build_mode=build_mode, **kwargs)
+        celltype_kwargs = self._celltype_kwargs(nineml_model)
+        celltype_kwargs.update(kwargs)
+        celltype = self.PyNNCellWrapperMetaClass(build_mode=build_mode,
+                                                 **celltype_kwargs)
         if build_mode != 'build_only':
             rng = self.Simulation.active().properties_rng
             cellparams = dict(
@@ -617,8 +838,21 @@ class ComponentArray(object):
                 label=nineml_model.name)
             self._inputs = {}
         self._t_stop = None
+        self._gathered = None
         self.Simulation.active().register_array(self)
 
+    @classmethod
+    def _celltype_kwargs(cls, nineml_model):
+        """
+        The arguments used to create the PyNN cell type of the component
+        array from its 9ML model
+        """
+        dynamics_properties = nineml_model.dynamics_properties
+        return {'component_class': dynamics_properties.component_class,
+                'default_properties': dynamics_properties,
+                'initial_state': list(dynamics_properties.initial_values),
+                'initial_regime': dynamics_properties.initial_regime}
+
     @property
     def name(self):
         return self._nineml.name
@@ -789,24 +1023,68 @@ class ComponentArray(object):
         recording : neo.Segment
             The recorded data in a neo.Segment
         """
+        return self.recordings([port_name], t_start=t_start)[port_name]
 
-        pyNN_data = self.get_data().segments[0]
-        recording = neo.Segment()
-        communicates, _ = self._get_port_details(port_name)
-        if communicates == 'event':
-            for st in pyNN_data.spiketrains:
-                # FIXME: At some point we need to be able to specify multiple
-                # event outputs
-                if st.annotations:
-                    if t_start is not None:
-                        st = st[st > t_start]
-                    recording.spiketrains.append(st)
-        else:
-            for asig in pyNN_data.analogsignals:
-                # FIXME: Not sure if this will work
-                if asig.annotations['name'] == port_name:
-                    recording.analogsignals.append(asig)
-        return recording
+    def recordings(self, port_names, t_start=None):
+        """
+        Returns the recorded data for multiple ports, which is gathered from
+        the simulator in a single call
+
+        Parameters
+        ----------
+        port_names : list(str)
+            The names of the ports (or state-variables) to retrieve the
+            recorded data for
+
+        Returns
+        -------
+        recordings : dict(str, neo.Segment)
+            The recorded data for each port in a neo.Segment
+        """
+        details = [self._get_port_details(n) for n in port_names]
+        pyNN_data = self._gather(set(
+            'spikes' if communicates == 'event' else record_name
+            for communicates, record_name in details))
+        recordings = {}
+        for port_name, (communicates, record_name) in zip(port_names,
+                                                          details):
+            recording = neo.Segment()
+            if communicates == 'event':
+                for st in pyNN_data.spiketrains:
+                    # FIXME: At some point we need to be able to specify
+                    # multiple event outputs
+                    if st.annotations:
+                        if t_start is not None:
+                            st = st[st > t_start]
+                        recording.spiketrains.append(st)
+            else:
+                for asig in pyNN_data.analogsignals:
+                    if asig.name == record_name:
+                        recording.analogsignals.append(asig)
+            recordings[port_name] = recording
+        return recordings
+
+    def _gather(self, variables):
+        """
+        Gathers the recorded data of the given variables from the simulator
+        (across all MPI processes). The gathered segment is reused until the
+        simulation is advanced or variables that were not gathered are
+        requested.
+        """
+        if self.is_dead:
+            if self._recording_cache is None:
+                raise Pype9UsageError(
+                    "No data was recorded from '{}' before the simulation "
+                    "ended".format(self.name))
+            return self._recording_cache.segments[0]
+        t = self.Simulation.active().t
+        if self._gathered is not None:
+            gathered_t, gathered_vars, segment = self._gathered
+            if gathered_t == t and variables <= gathered_vars:
+                return segment
+        segment = self.get_data(variables=sorted(variables)).segments[0]
+        self._gathered = (t, frozenset(variables), segment)
+        return segment
 
     def _kill(self, t_stop):
         """
@@ -814,12 +1092,25 @@ class ComponentArray(object):
         simulator object to None ahead of a simulator reset. This allows
         data to be accessed after a simulation has completed, and potentially
         a new simulation to have been started.
+
+        NB: Unlike cells, the recordings of component arrays are always cached
+        in memory (i.e. they are not spilled to the recording cache directory
+        of the simulation).
         """
+        # Retrieve all the recorded data from the simulator in one go, unless
+        # the population was never created (i.e. 'build_only') or nothing was
+        # recorded from it
+        recorder = getattr(self, 'recorder', None)
+        if recorder is not None and any(recorder.recorded.values()):
+            self._recording_cache = self.get_data()
+        else:
+            self._recording_cache = None
+        self._gathered = None
         self._t_stop = t_stop
 
     @property
     def is_dead(self):
-        return self._t_stop is None
+        return self._t_stop is not None
 
 
 class Selection(object):
@@ -908,9 +1199,13 @@ class ConnectionGroup(object):
         Source component array
     destination : ComponentArray
         Destination component array
+    connections : tuple(numpy.ndarray, list(str)) | None
+        Previously saved connections and the names of their attribute columns
+        (see Network._load_connections) to connect the connection group with
+        instead of sampling its connectivity
     """
 
-    def __init__(self, nineml_model, source, destination):
+    def __init__(self, nineml_model, source, destination, connections=None):
         rng = self.Simulation.active().properties_rng
         if not isinstance(nineml_model, EventConnectionGroup9ML):
             raise Pype9RuntimeError(
@@ -943,6 +1238,12 @@ class ConnectionGroup(object):
             weight = 0.0
         self._nineml = nineml_model
         delay = get_pyNN_value(nineml_model.delay, self.UnitHandler, rng)
+        if connections is not None:
+            conn_list, column_names = connections
+            connector = self.FromListConnector(conn_list,
+                                               column_names=column_names)
+        else:
+            connector = nineml_model.connectivity
         # FIXME: Ignores send_port, assumes there is only one...
         # NB: Simulator-specific derived classes extend the corresponding
         # PyNN population class
@@ -950,7 +1251,7 @@ class ConnectionGroup(object):
             self,
             presynaptic_population=source,
             postsynaptic_population=destination,
-            connector=nineml_model.connectivity,
+            connector=connector,
             synapse_type=self.SynapseClass(weight=weight, delay=delay),
             receptor_type=nineml_model.destination_port,
             label=nineml_model.name)
@@ -81,6 +81,17 @@ class PyNNCellWrapperMetaClass(type):
         return super(PyNNCellWrapperMetaClass, cls).__new__(
             cls, celltype_id + 'PyNN', bases, dct)
 
+    @classmethod
+    def cell_build_kwargs(cls, component_class, default_properties,
+                          initial_state, initial_regime, **kwargs):  # @UnusedVariable @IgnorePep8
+        """
+        Returns the keyword arguments passed to the CellMetaClass to create
+        the cell class underlying the cell type (can be overridden by
+        simulator-specific classes)
+        """
+        kwargs['component_class'] = component_class
+        return kwargs
+
     def __init__(cls, *args, **kwargs):
         """
         Not required, but since I have changed the signature of the new method
@@ -8,7 +8,6 @@ from __future__ import absolute_import
 from builtins import zip
 from nineml.user.connectionrule import (
     BaseConnectivity, InverseConnectivity as BaseInverseConnectivity)
-from pyNN.parameters import LazyArray
 import numpy
 from pype9.exceptions import Pype9RuntimeError
 
@@ -17,7 +16,11 @@ class PyNNConnectivity(BaseConnectivity):
 
     def __init__(self, *args, **kwargs):
         super(PyNNConnectivity, self).__init__(*args, **kwargs)
-        self._prev_connected = None
+        # The sampled connections are stored in compressed sparse row format
+        # with a row for each destination cell, i.e. the source indices of the
+        # connections to destination i are sources[indptr[i]:indptr[i + 1]]
+        self._sources = None
+        self._indptr = None
         self._rng = kwargs['rng']
         self._kwargs = kwargs
 
@@ -27,14 +30,14 @@ class PyNNConnectivity(BaseConnectivity):
                 "Connections have not been generated for PyNNConnectivity "
                 "object (they are only generated during network construction "
                 "for efficiency")
-        raise NotImplementedError(
-            "Need to work out connection list from connection map")
+        return zip(self._sources, self._destinations)
 
     def connect(self, connection_group):
         if self.has_been_sampled():
-            # Get connection from previously connected projection
-            connector = self._pyNN_module.MapConnector()
-            connector._connect_with_map(connection_group, self._connection_map)
+            # Replay the connections sampled for the previous connection group
+            connector = self._pyNN_module.FromListConnector(
+                numpy.column_stack((self._sources, self._destinations)))
+            connector.connect(connection_group)
         else:
             if self.rule_properties.lib_type == 'AllToAll':
                 connector_cls = self._pyNN_module.AllToAllConnector
@@ -70,15 +73,32 @@ class PyNNConnectivity(BaseConnectivity):
                 params['rng'] = self._rng
             connector = connector_cls(**params)
             connector.connect(connection_group)
-            self._prev_connected = connection_group
+            self._store_connections(connection_group)
 
     def has_been_sampled(self):
-        return self._prev_connected is not None
+        return self._sources is not None
+
+    def _store_connections(self, connection_group):
+        """
+        Gathers the (source, destination) indices of the connections made in
+        the connection group from all processes and stores them in
+        compressed sparse row format
+        """
+        conns = numpy.asarray(
+            connection_group.get([], format='list', gather='all',
+                                 with_address=True),
+            dtype=int).reshape(-1, 2)
+        order = numpy.argsort(conns[:, 1], kind='mergesort')
+        self._sources = conns[order, 0]
+        self._indptr = numpy.zeros(self.destination_size + 1, dtype=int)
+        numpy.cumsum(numpy.bincount(conns[:, 1],
+                                    minlength=self.destination_size),
+                     out=self._indptr[1:])
 
     @property
-    def _connection_map(self):
-        return LazyArray(~numpy.isnan(
-            self._prev_connected.get(['weight'], 'array', gather='all')[0]))
+    def _destinations(self):
+        return numpy.repeat(numpy.arange(self.destination_size),
+                            numpy.diff(self._indptr))
 
     def clone(self, memo=None, **kwargs):
         if memo is None:
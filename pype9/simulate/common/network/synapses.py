@@ -26,7 +26,7 @@ class Synapse(with_metaclass(ABCMeta, object)):
         """
         converted_params = {}
         for prop in nineml_props.items():
-            val = get_pyNN_value(prop, rng, cls.UnitHandler)
+            val = get_pyNN_value(prop, cls.UnitHandler, rng)
             converted_params[cls.nineml_translations[prop.name]] = val
         return converted_params
 
@@ -1,5 +1,6 @@
 from __future__ import division
 from past.utils import old_div
+import numpy
 from pyNN.parameters import Sequence
 from pyNN.random import RandomDistribution
 from nineml.values import SingleValue, ArrayValue, RandomDistributionValue
@@ -19,32 +20,70 @@ random_value_map = {
     ('lognormal', ('mu', 'sigma'))}
 
 
+class ScaledRandomDistribution(RandomDistribution):
+    """
+    A PyNN random distribution, the drawn values of which are multiplied by a
+    scalar to convert them into the units used by the simulator
+
+    Parameters
+    ----------
+    distribution : str
+        Name of the PyNN random distribution
+    parameters_pos : list(float)
+        Parameters of the distribution (in the units of the 9ML quantity)
+    scalar : float
+        The scalar the drawn values are multiplied by
+    rng : pyNN.random.AbstractRNG
+        The random number generator to draw the values from
+    """
+
+    def __init__(self, distribution, parameters_pos, scalar, rng=None):
+        super(ScaledRandomDistribution, self).__init__(
+            distribution, parameters_pos, rng=rng)
+        self.scalar = scalar
+
+    def next(self, n=None, mask=None):
+        res = super(ScaledRandomDistribution, self).next(n=n, mask=mask)
+        if isinstance(res, numpy.ndarray):
+            res *= self.scalar  # Freshly drawn so can be scaled in place
+        else:
+            res = res * self.scalar
+        return res
+
+    def __str__(self):
+        return ("ScaledRandomDistribution('{}', {}, {}, {})".format(
+            self.name, self.parameters, self.scalar, self.rng))
+
+
 def get_pyNN_value(qty, unit_handler, rng):
     if isinstance(qty.value, SingleValue):
         val = unit_handler.scale_value(qty)
     elif isinstance(qty.value, ArrayValue):
         scalar = unit_handler.scalar(qty.units)
-        val = Sequence(v * scalar for v in qty.value)
+        # Copied so the array can be scaled in place without modifying the
+        # values of the 9ML object
+        values = numpy.array(qty.value.values, dtype=float)
+        if scalar != 1.0:
+            values *= scalar
+        val = Sequence(values)
     elif isinstance(qty.value, RandomDistributionValue):
-        if unit_handler.scalar(qty.units) != 1.0:
-            raise NotImplementedError(
-                "Cannot currently scale random distributions as required to "
-                "get {} into the correct units".format(qty))
+        scalar = unit_handler.scalar(qty.units)
         try:
             rv_name, rv_param_names = random_value_map[
                 qty.value.distribution.standard_library]
         except KeyError:
             raise NotImplementedError(
                 "Sorry, '{}' random distributions are not currently supported"
-                .format(qty.value.distribution.standard_libary))
+                .format(qty.value.distribution.standard_library))
         rv_params = [
             qty.value.distribution.property(n).value for n in rv_param_names]
         # UncertML uses 'rate' parameter whereas PyNN uses 'beta' parameter
         # (1/rate) to define exponential random distributions.
         if rv_name == 'exponential':
             rv_params[0] = 1.0 / rv_params[0]
-        # FIXME: Need to scale random distribution to correct units. Should
-        #        probably derive PyNN RandomDistribution class to multiply by
-        #        when a value is drawn
-        val = RandomDistribution(rv_name, rv_params, rng=rng)
+        if scalar != 1.0:
+            val = ScaledRandomDistribution(rv_name, rv_params, scalar,
+                                           rng=rng)
+        else:
+            val = RandomDistribution(rv_name, rv_params, rng=rng)
     return val
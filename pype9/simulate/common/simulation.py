@@ -56,6 +56,11 @@ class Simulation(with_metaclass(ABCMeta, object)):
         The maximum delay in the network. If None the max delay will be
         calculated from the first network to be created (if a single cell
         then it will be the same as the timestep)
+    recording_cache_dir : str | None
+        If provided, the data recorded by cells is spilled into memory-mapped
+        files in this directory when the simulation context exits instead of
+        being held in memory (recordings of component arrays are always held
+        in memory)
     options : dict(str, object)
         Options passed to the simulator-specific methods
     """
@@ -64,7 +69,8 @@ class Simulation(with_metaclass(ABCMeta, object)):
 
     def __init__(self, dt, t_start=0.0 * un.s, seed=None, properties_seed=None,
                  min_delay=1 * un.ms, max_delay=10 * un.ms,
-                 code_generator=None, build_base_dir=None, **options):
+                 code_generator=None, build_base_dir=None,
+                 recording_cache_dir=None, **options):
         self._check_units('dt', dt, un.time)
         self._check_units('t_start', dt, un.time)
         self._check_units('min_delay', dt, un.time, allow_none=True)
@@ -75,6 +81,7 @@ class Simulation(with_metaclass(ABCMeta, object)):
         self._min_delay = min_delay if min_delay > dt else dt
         self._max_delay = max_delay if max_delay > dt else dt
         self._options = options
+        self._recording_cache_dir = recording_cache_dir
         self._registered_cells = None
         self._registered_arrays = None
         if seed is not None and (seed < 0 or seed > self.max_seed):
@@ -124,7 +131,7 @@ class Simulation(with_metaclass(ABCMeta, object)):
         self.__class__._active = None
         if kill_cells:
             for cell in self._registered_cells:
-                cell._kill(t_stop)
+                cell._kill(t_stop, cache_dir=self._recording_cache_dir)
             for array in self._registered_arrays:
                 array._kill(t_stop)
         else:
@@ -5,8 +5,12 @@ from builtins import next  # @IgnorePep8
 from builtins import zip  # @IgnorePep8
 from builtins import str  # @IgnorePep8
 from past.builtins import basestring  # @IgnorePep8
+import os  # @IgnorePep8
+import pickle  # @IgnorePep8
+import tempfile  # @IgnorePep8
 import operator  # @IgnorePep8
 from itertools import chain  # @IgnorePep8
+from collections import defaultdict  # @IgnorePep8
 from operator import xor  # @IgnorePep8
 from abc import ABCMeta, abstractmethod  # @IgnorePep8
 import sympy  # @IgnorePep8
@@ -29,6 +33,9 @@ except ImportError:
 from functools import reduce  # @IgnorePep8
 from future.utils import with_metaclass  # @IgnorePep8
 from pype9.utils.logging import logger  # @IgnorePep8
+from pype9.utils.mpi import is_mpi_master  # @IgnorePep8
+from pype9.utils.paths import remove_ignore_missing  # @IgnorePep8
+from pype9.simulate.common.code_gen import BASE_BUILD_DIR  # @IgnorePep8
 numpy.seterr(all='raise')
 
 
@@ -44,6 +51,10 @@ class UnitHandler(with_metaclass(ABCMeta, DynamicsDimensionResolver)):
                      pq.UnitSubstance: 'n', pq.UnitTemperature: 'k'}
 
     _CACHE_FILENAME = '.unit_handler_cache.pkl'
+    _CACHE_VERSION = 2
+    # Path to the persistent cache of unit projections, set in derived classes
+    # (see _get_cache_path). If None the cache is not saved to disk
+    _cache_path = None
 
     def assign_units_to_alias(self, alias):
         dims = self._flatten(sympify(alias))[1]
@@ -176,34 +187,47 @@ class UnitHandler(with_metaclass(ABCMeta, DynamicsDimensionResolver)):
         Returns a list of the basis units with their associated powers and the
         scale of the presented units.
         """
-        if dimension == 1 or dimension == un.dimensionless:
-            return 0, []
         if isinstance(dimension, sympy.Basic):
             dimension = un.Dimension.from_sympy(dimension)
+        elif dimension == 1:
+            return 0, []
         else:
             assert isinstance(dimension, un.Dimension), (
                 "'{}' is not a Dimension".format(dimension))
+        key = tuple(dimension)
+        if not any(key):  # Dimensionless
+            return 0, []
         # Check to see if unit dimension, or some integer power thereof,
         # has been stored in the cache (the basis and compounds are preloaded)
-        dim_vector = array(list(dimension), dtype='float')
-        # mask of units in compound
-        mask = (dim_vector != 0)
-        # Get the coefficients required to transform the basis dim elements
-        # into the provided dimension, and test to see if they are constant
-        with_scalars = [(x, numpy.unique(dim_vector[mask] /
-                                         numpy.asarray(d)[mask]))
-                        for d, x in cls.cache.items()
-                        if ((numpy.asarray(d) != 0) == mask).all()]
-        matches = [(u, int(s[0])) for u, s in with_scalars
-                   if len(s) == 1 and float(s[0]).is_integer()]
-        assert len(matches) <= 1, (
-            "There should not be matches for multiple basis/compound units, "
-            "the dimension vector of one must be a factor of an another")
+        try:
+            base_x = cls.cache[key]
+            scalar = 1
+        except KeyError:
+            base_x = None
+            dim_vector = array(key, dtype='int')
+            # Get the cached dimensions with the same sparsity pattern
+            try:
+                dims, xs = cls._cache_index()[tuple(dim_vector != 0)]
+            except KeyError:
+                pass
+            else:
+                # Get the coefficients required to transform the cached dims
+                # into the provided dimension, and test to see if they are
+                # constant integers
+                i = nonzero(dim_vector)[0][0]
+                scalars = dim_vector[i] // dims[:, i]
+                matches = nonzero((dims * scalars[:, numpy.newaxis] ==
+                                   dim_vector).all(axis=1))[0]
+                assert len(matches) <= 1, (
+                    "There should not be matches for multiple basis/compound "
+                    "units, the dimension vector of one must be a factor of "
+                    "an another")
+                if len(matches):
+                    base_x = xs[matches[0]]
+                    scalar = int(scalars[matches[0]])
         # If there is a match and the scalar is an integer then use that unit
         # basis/compound.
-        if matches and float(matches[0][1]).is_integer():
-            base_x, scalar = matches[0]
-            scalar = int(scalar)
+        if base_x is not None:
             num_compounds = len(nonzero(base_x[len(cls.basis):])[0])
             assert num_compounds <= 1, (
                 "Multiple compound indices matched (x={})".format(base_x))
@@ -220,13 +244,39 @@ class UnitHandler(with_metaclass(ABCMeta, DynamicsDimensionResolver)):
             min_x = cls._select_best_compound(xs)
             x = numpy.concatenate((min_x, numpy.zeros(len(cls.compounds),
                                                       dtype='int')))
-            cls.cache[tuple(dimension)] = x / int(abs(reduce(gcd, x)))
+            # Cache the "primitive" projection (i.e. divided by the greatest
+            # common divisor) so it matches all integer powers of it
+            divisor = int(abs(reduce(gcd, x)))
+            cls.cache[tuple(int(d) for d in b // divisor)] = x // divisor
+            cls._save_cache()
         # Get list of compound units with the powers
         compound = [(u, p) for u, p in zip(cls.specified_units, x) if p]
         # Calculate the appropriate scale for the new compound quantity
         exponent = int(x.dot([b.power for b in cls.specified_units]))
         return exponent, compound
 
+    @classmethod
+    def _cache_index(cls):
+        """
+        Returns an index of the cached projections, which groups the cached
+        dimension vectors by their sparsity pattern (i.e. which dimensions
+        are non-zero) in stacked integer matrices so that they can be matched
+        against in a single vectorised operation. The index is rebuilt when
+        the cache is replaced or new projections are added to it.
+        """
+        index = cls.__dict__.get('_cached_index')
+        if (index is None or index[0] is not cls.cache or
+                index[1] != len(cls.cache)):
+            patterns = defaultdict(list)
+            for dim, x in cls.cache.items():
+                patterns[tuple(d != 0 for d in dim)].append((dim, x))
+            index = (cls.cache, len(cls.cache), dict(
+                (p, (array([d for d, _ in e], dtype='int'),
+                     [x for _, x in e]))
+                for p, e in patterns.items()))
+            cls._cached_index = index
+        return index[2]
+
     @classmethod
     def dimension_to_units(cls, dimension):
         """
@@ -347,10 +397,20 @@ class UnitHandler(with_metaclass(ABCMeta, DynamicsDimensionResolver)):
         return Quantity(float(qty), units)
 
     @classmethod
-    def _init_matrices_and_cache(cls, basis, compounds):
+    def _init_matrices_and_cache(cls, basis, compounds, cache_path=None):
         """
         Creates matrix corresponding to unit basis and loads cache of
         previously calculated mappings from dimensions onto this basis.
+
+        Parameters
+        ----------
+        basis : list(nineml.Unit)
+            The basis units of the simulator
+        compounds : list(nineml.Unit)
+            Compound units used by the simulator
+        cache_path : str | None
+            Path to the persistent cache of previously calculated unit
+            projections to load (see _get_cache_path)
         """
         assert all(u.offset == 0 for u in basis), (
             "Non-zero offsets found in basis units")
@@ -360,7 +420,11 @@ class UnitHandler(with_metaclass(ABCMeta, DynamicsDimensionResolver)):
         cls._A = array([list(b.dimension) for b in basis]).T
         logger.info("Initialising unit conversion cache")
         cls._cache = cls._init_cache(basis, compounds)
-
+        if cache_path is not None:
+            saved_cache = cls._load_cache(cache_path, basis, compounds)
+            # Entries for basis and compound units always take precedence
+            saved_cache.update(cls._cache)
+            cls._cache = saved_cache
         # The lengths in terms of SI dimension bases of each of the unit
         # basis compounds.
         si_lengths = [sum(abs(si) for si in d.dimension) for d in basis]
@@ -392,6 +456,80 @@ class UnitHandler(with_metaclass(ABCMeta, DynamicsDimensionResolver)):
         """
         # Create a new cache with the specified units entered into it
         cls.cache = cls._init_cache(cls.basis, cls.compounds)
+        if cls._cache_path is not None and is_mpi_master():
+            remove_ignore_missing(cls._cache_path)
+
+    @classmethod
+    def _get_cache_path(cls, name):
+        """
+        Returns the path of the persistent cache of unit projections for the
+        given (simulator) name. It is saved in the base build directory,
+        which is specific to the Pype9 and Python versions
+        """
+        return os.path.join(BASE_BUILD_DIR, name + cls._CACHE_FILENAME)
+
+    @classmethod
+    def _cache_signature(cls, basis, compounds):
+        """
+        The signature of the unit basis (and compounds) that the cached unit
+        projections were calculated for
+        """
+        return tuple((tuple(u.dimension), u.power)
+                     for u in chain(basis, compounds))
+
+    @classmethod
+    def _load_cache(cls, cache_path, basis, compounds):
+        """
+        Loads the persistent cache of unit projections, returning an empty
+        cache if it is missing, corrupted or was saved by a different version
+        or for a different unit basis
+        """
+        try:
+            with open(cache_path, 'rb') as f:
+                saved = pickle.load(f)
+        except (IOError, OSError):
+            return {}
+        except Exception as e:
+            logger.warning("Could not load unit handler cache from '{}' ({}), "
+                           "ignoring it".format(cache_path, e))
+            return {}
+        try:
+            if (saved['version'] != cls._CACHE_VERSION or
+                    saved['signature'] != cls._cache_signature(basis,
+                                                               compounds)):
+                return {}
+            return dict(saved['cache'])
+        except (KeyError, TypeError):
+            return {}
+
+    @classmethod
+    def _save_cache(cls):
+        """
+        Saves the cache of unit projections to disk. Entries saved by other
+        processes in the meantime are merged in and the file is written
+        atomically (by renaming a temporary file), so concurrent jobs cannot
+        corrupt it. Only the master MPI node writes the cache.
+        """
+        if cls._cache_path is None or not is_mpi_master():
+            return
+        cache = cls._load_cache(cls._cache_path, cls.basis, cls.compounds)
+        cache.update(cls.cache)
+        cache_dir = os.path.dirname(cls._cache_path)
+        try:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            with tempfile.NamedTemporaryFile(
+                    dir=cache_dir, prefix=cls._CACHE_FILENAME,
+                    suffix='.tmp', delete=False) as f:
+                pickle.dump(
+                    {'version': cls._CACHE_VERSION,
+                     'signature': cls._cache_signature(cls.basis,
+                                                       cls.compounds),
+                     'cache': cache}, f, protocol=2)
+            os.rename(f.name, cls._cache_path)  # Atomic on POSIX
+        except (IOError, OSError) as e:
+            logger.warning("Could not save unit handler cache to '{}': {}"
+                           .format(cls._cache_path, e))
 
     @classmethod
     def _select_best_compound(cls, xs):
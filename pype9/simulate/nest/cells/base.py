@@ -8,6 +8,8 @@
            the MIT Licence, see LICENSE for details.
 """
 from __future__ import absolute_import
+from builtins import zip
+from itertools import chain
 import numpy
 import neo
 import nest
@@ -28,21 +30,48 @@ basic_nineml_translations = {
 
 class Cell(base.Cell):
 
+    # Receptor types of each built cell class, shared between the cells of
+    # the class
+    _class_receptor_types = {}
+
     def __init__(self, *properties, **kwprops):
         self._flag_created(False)
-        self._cell = nest.Create(self.__class__.name)
+        self._cell = kwprops.pop('_sim_cell', None)
+        if self._cell is None:
+            self._cell = nest.Create(self.__class__.library_name)
         super(Cell, self).__init__(*properties, **kwprops)
-        self._receive_ports = nest.GetDefaults(
-            self.__class__.name)['receptor_types']
+        self._receive_ports = self._receptor_types()
         self._inputs = {}
         self._flag_created(True)
 
+    @classmethod
+    def _receptor_types(cls):
+        try:
+            return cls._class_receptor_types[cls.library_name]
+        except KeyError:
+            receptor_types = cls._class_receptor_types[cls.library_name] = (
+                nest.GetDefaults(cls.library_name)['receptor_types'])
+            return receptor_types
+
+    @classmethod
+    def _create_simulator_cells(cls, n):
+        return [(gid,) for gid in nest.Create(cls.library_name, n)]
+
     def _get(self, varname):
         return nest.GetStatus(self._cell, keys=varname)[0]
 
     def _set(self, varname, value):
         nest.SetStatus(self._cell, varname, value)
 
+    def _get_many(self, varnames):
+        if not varnames:
+            return []
+        return nest.GetStatus(self._cell, keys=varnames)[0]
+
+    def _set_many(self, values):
+        if values:
+            nest.SetStatus(self._cell, values)
+
     def _set_regime(self):
         nest.SetStatus(self._cell, self.code_generator.REGIME_VARNAME,
                        self._regime_index)
@@ -114,40 +143,46 @@ class Cell(base.Cell):
             t_start = self.unit_handler.to_pq_quantity(self._t_start)
         t_start = pq.Quantity(t_start, 'ms')
         t_stop = self.unit_handler.to_pq_quantity(t_stop)
+        recorded, interval = self._recorded_data(port_name)
         if port.nineml_type in ('EventSendPort', 'EventSendPortExposure'):
-            spikes = nest.GetStatus(
-                self._recorders[port_name], 'events')[0]['times']
             data = neo.SpikeTrain(
-                self._trim_spike_train(spikes * pq.ms, t_start),
+                self._trim_spike_train(recorded * pq.ms, t_start),
                 t_start=t_start, t_stop=t_stop, name=port_name)
         else:
-            port_name = self.build_name(port_name)
-            events, interval = nest.GetStatus(self._recorders[port_name],
-                                              ('events', 'interval'))[0]
-            try:
-                port = self._nineml.component_class.port(port_name)
-            except NineMLNameError:
-                port = self._nineml.component_class.state_variable(port_name)
             unit_str = self.unit_handler.dimension_to_unit_str(
                 port.dimension, one_as_dimensionless=True)
-            variable_name = self.build_name(port_name)
-            signal = self._trim_analog_signal(events[variable_name],
-                                              t_start, interval * pq.ms)
+            signal = self._trim_analog_signal(recorded, t_start,
+                                              interval * pq.ms)
             data = neo.AnalogSignal(
                 signal, sampling_period=interval * pq.ms,
                 t_start=t_start, units=unit_str, name=port_name)
         return data
 
     def _regime_recording(self):
-        events, interval = nest.GetStatus(
-            self._recorders[self.code_generator.REGIME_VARNAME],
-            ('events', 'interval'))[0]
+        recorded, interval = self._recorded_data(
+            self.code_generator.REGIME_VARNAME)
         return neo.AnalogSignal(
-            events[self.code_generator.REGIME_VARNAME],
-            sampling_period=interval * pq.ms, units='dimensionless',
+            recorded, sampling_period=interval * pq.ms, units='dimensionless',
             t_start=self.unit_handler.to_pq_quantity(self._t_start),
             name=self.code_generator.REGIME_VARNAME)
 
+    def _fetch_recorded_data(self, port_names=None):
+        if port_names is None:
+            port_names = list(self._recorders)
+        # Retrieve the status of all the recorders in a single call
+        statuses = nest.GetStatus(
+            tuple(chain(*(self._recorders[n] for n in port_names))))
+        data = {}
+        for port_name, status in zip(port_names, statuses):
+            events = status['events']
+            if str(status['model']) == 'spike_detector':
+                data[port_name] = (numpy.asarray(events['times']), None)
+            else:
+                data[port_name] = (
+                    numpy.asarray(events[self.build_name(port_name)]),
+                    status['interval'])
+        return data
+
     def build_name(self, varname):
         # Get mapped port name if port corresponds to membrane voltage
         if varname == self.component_class.annotations.get(
@@ -303,6 +338,8 @@ class Cell(base.Cell):
 class CellMetaClass(base.CellMetaClass):
 
     _built_types = {}  # Stores previously created types for reuse
+    _shared_builds = {}  # Libraries loaded for each name-independent digest
+    _build_cache = {}  # Names of the cell classes built for each structure
     CodeGenerator = CodeGenerator
     BaseCellClass = Cell
     Simulation = Simulation
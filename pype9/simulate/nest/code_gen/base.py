@@ -15,9 +15,12 @@ from os import path
 import subprocess as sp
 import re
 import shutil
-from datetime import datetime
 import errno
+from itertools import chain
+from collections import OrderedDict
+import sympy
 import nest
+from nineml.abstraction import Expression
 from pype9.simulate.nest.units import UnitHandler
 from pype9.simulate.common.code_gen import BaseCodeGenerator
 from pype9.utils.paths import remove_ignore_missing, add_lib_path
@@ -39,12 +42,22 @@ class CodeGenerator(BaseCodeGenerator):
     ABS_TOLERANCE_DEFAULT = 1e-3
     REL_TOLERANCE_DEFAULT = 0.0
     GSL_JACOBIAN_APPROX_STEP_DEFAULT = 0.01
+    GSL_STEPPER_DEFAULT = 'rk2'
+    # GSL stepping functions that can be used without a driver. The implicit
+    # steppers (rk1imp, rk2imp, rk4imp and bsimp) use the analytic Jacobian
+    GSL_STEPPERS = ('rk2', 'rk4', 'rkf45', 'rkck', 'rk8pd', 'rk1imp',
+                    'rk2imp', 'rk4imp', 'bsimp')
     V_THRESHOLD_DEFAULT = 0.0
+    EXACT_INTEGRATION_DEFAULT = False
+    OPTIMISE_EXPRESSIONS_DEFAULT = True
     MAX_SIMULTANEOUS_TRANSITIONS = 1000
     BASE_TMPL_PATH = path.abspath(path.join(path.dirname(__file__),
                                             'templates'))
     UnitHandler = UnitHandler
 
+    _WORK_DIR = 'work'  # Source and compile dirs shared between digests
+    _CMAKE_CONFIG = '.cmake_config'  # Fingerprint of the CMake config
+
     _inline_random_implementations = {}
 
     def __init__(self, build_cores=1, **kwargs):
@@ -58,8 +71,21 @@ class CodeGenerator(BaseCodeGenerator):
                       .format(self.nest_config)))
         self._compiler = compiler.strip()  # strip trailing \n
 
+    SUPPORTS_BUNDLES = True
+
     def generate_source_files(self, component_class, src_dir, name=None,
-                              debug_print=None, **kwargs):
+                              **kwargs):
+        if name is None:
+            name = component_class.name
+        self.generate_model_files(component_class, src_dir, name=name,
+                                  **kwargs)
+        self.generate_module_files(name, [name], src_dir)
+
+    def generate_model_files(self, component_class, src_dir, name=None,
+                             debug_print=None, **kwargs):
+        """
+        Generates the C++ header and class files of a NEST model
+        """
         if name is None:
             name = component_class.name
         # Get the initial regime and check that it refers to a regime in the
@@ -68,7 +94,6 @@ class CodeGenerator(BaseCodeGenerator):
             'component_name': name,
             'component_class': component_class,
             'version': pype9.__version__, 'src_dir': src_dir,
-            'timestamp': datetime.now().strftime('%a %d %b %y %I:%M:%S%p'),
             'unit_handler': UnitHandler(component_class),
             'sorted_regimes': sorted(
                 component_class.regimes,
@@ -88,6 +113,38 @@ class CodeGenerator(BaseCodeGenerator):
             'v_threshold': kwargs.get('v_threshold', self.V_THRESHOLD_DEFAULT),
             'regime_varname': self.REGIME_VARNAME,
             'debug_print': [] if debug_print is None else debug_print}
+        if kwargs.get('exact_integration', self.EXACT_INTEGRATION_DEFAULT):
+            tmpl_args['propagators'] = self.regime_propagators(
+                component_class, tmpl_args['unit_handler'])
+        else:
+            tmpl_args['propagators'] = {}
+        # Terms that only depend on the parameters are hoisted out of the
+        # dynamics and Jacobians into derived variables set in calibrate()
+        if kwargs.get('optimise_expressions',
+                      self.OPTIMISE_EXPRESSIONS_DEFAULT):
+            derived = OrderedDict()
+            tmpl_args['dynamics'] = self.regime_dynamics(
+                component_class, tmpl_args['unit_handler'], derived,
+                exclude=tmpl_args['propagators'])
+        else:
+            derived = None
+            tmpl_args['dynamics'] = {}
+        tmpl_args['jacobians'] = self.regime_jacobians(
+            component_class, tmpl_args['unit_handler'],
+            exclude=tmpl_args['propagators'], derived=derived)
+        if derived:
+            tmpl_args['derived'] = [(str(s), Expression(e).rhs_cstr)
+                                    for e, s in derived.items()]
+            tmpl_args['derived_parameters'] = _required_names(
+                component_class, derived)[0]
+        else:
+            tmpl_args['derived'] = tmpl_args['derived_parameters'] = []
+        gsl_stepper = kwargs.get('gsl_stepper', self.GSL_STEPPER_DEFAULT)
+        if gsl_stepper not in self.GSL_STEPPERS:
+            raise Pype9BuildError(
+                "Unrecognised GSL stepper '{}', can be one of '{}'".format(
+                    gsl_stepper, "', '".join(self.GSL_STEPPERS)))
+        tmpl_args['gsl_stepper'] = gsl_stepper
         ode_solver = kwargs.get('ode_solver', self.ODE_SOLVER_DEFAULT)
         ss_solver = kwargs.get('ss_solver', self.SS_SOLVER_DEFAULT)
         if ode_solver is None:
@@ -100,50 +157,212 @@ class CodeGenerator(BaseCodeGenerator):
         self.render_to_file('main.tmpl', tmpl_args, name + '.cpp',
                              src_dir, switches=switches,
                              post_hoc_subs=self._inline_random_implementations)
+
+    def regime_propagators(self, component_class, unit_handler):
+        """
+        Detects the regimes of the component class that are linear with
+        constant coefficients, and can therefore be integrated exactly with
+        propagator matrices (see Rotter & Diesmann 1999) instead of a
+        numerical ODE solver
+
+        Parameters
+        ----------
+        component_class : Dynamics
+            The component class to generate the propagators for
+        unit_handler : UnitHandler
+            The unit handler used to scale the expressions
+
+        Returns
+        -------
+        propagators : dict(str, LinearPropagator)
+            The propagators of the linear regimes, keyed by regime name
+        """
+        propagators = {}
+        for regime in component_class.regimes:
+            system = self.linear_system(regime, component_class, unit_handler)
+            if system is not None:
+                propagators[regime.name] = LinearPropagator(
+                    component_class, unit_handler, *system)
+        return propagators
+
+    def regime_dynamics(self, component_class, unit_handler, derived,
+                        exclude=()):
+        """
+        Optimises the time derivatives of each regime of the component class
+        by hoisting the terms that only depend on parameters into derived
+        variables and eliminating their common subexpressions
+
+        Parameters
+        ----------
+        component_class : Dynamics
+            The component class to optimise the time derivatives of
+        unit_handler : UnitHandler
+            The unit handler used to scale the expressions
+        derived : OrderedDict(sympy.Expr, sympy.Symbol)
+            The derived variables hoisted out of the time derivatives (see
+            'hoist_parameter_terms'), which is appended to
+        exclude : list(str)
+            Names of regimes to skip (e.g. ones that are integrated exactly)
+
+        Returns
+        -------
+        dynamics : dict(str, OptimisedDynamics)
+            The optimised time derivatives of the regimes, keyed by regime
+            name. Regimes that refer to random variables or piecewise
+            expressions are omitted and generated from the original
+            expressions
+        """
+        const_values = _constant_values(component_class, unit_handler)
+        known_names = set(chain(
+            component_class.parameter_names,
+            component_class.state_variable_names,
+            component_class.analog_receive_port_names,
+            component_class.analog_reduce_port_names, ['t']))
+        dynamics = {}
+        for regime in component_class.regimes:
+            if regime.name in exclude or not regime.num_time_derivatives:
+                continue
+            time_derivatives = [
+                (n, e.subs(const_values))
+                for n, e in self.expanded_time_derivatives(
+                    regime, component_class, unit_handler)]
+            if not all(self.depends_only_on(e, known_names)
+                       for _, e in time_derivatives):
+                continue
+            dynamics[regime.name] = OptimisedDynamics(
+                component_class, unit_handler, regime, time_derivatives,
+                derived)
+        return dynamics
+
+    def regime_jacobians(self, component_class, unit_handler, exclude=(),
+                         derived=None):
+        """
+        Differentiates the time derivatives of each regime of the component
+        class symbolically so that their Jacobians can be evaluated exactly
+        (instead of approximating them by finite differences)
+
+        Parameters
+        ----------
+        component_class : Dynamics
+            The component class to generate the Jacobians for
+        unit_handler : UnitHandler
+            The unit handler used to scale the expressions
+        exclude : list(str)
+            Names of regimes to skip (e.g. ones that are integrated exactly)
+        derived : OrderedDict(sympy.Expr, sympy.Symbol) | None
+            The derived variables to hoist the parameter-only terms of the
+            Jacobians into (see 'hoist_parameter_terms'). If None the
+            Jacobians are not optimised
+
+        Returns
+        -------
+        jacobians : dict(str, AnalyticJacobian)
+            The analytic Jacobians of the regimes that can be differentiated
+            symbolically, keyed by regime name
+        """
+        jacobians = {}
+        for regime in component_class.regimes:
+            if regime.name in exclude:
+                continue
+            jacobian = self.jacobian(regime, component_class, unit_handler)
+            if jacobian is not None:
+                jacobians[regime.name] = AnalyticJacobian(
+                    component_class, unit_handler, *jacobian,
+                    derived=derived)
+        return jacobians
+
+    def generate_module_files(self, module_name, model_names, src_dir):
+        """
+        Generates the files of the NEST extension module that registers the
+        given models
+
+        Parameters
+        ----------
+        module_name : str
+            The name of the module ('Module' is appended to it)
+        model_names : list(str)
+            The names of the models (generated by 'generate_model_files')
+            registered by the module
+        src_dir : str
+            The directory the source files are generated in
+        """
+        tmpl_args = {'component_name': module_name,
+                     'model_names': model_names,
+                     'version': pype9.__version__}
         # Render Loader header file
         self.render_to_file('module-header.tmpl', tmpl_args,
-                             name + 'Module.h', src_dir)
+                            module_name + 'Module.h', src_dir)
         # Render Loader C++ class
         self.render_to_file('module-cpp.tmpl', tmpl_args,
-                             name + 'Module.cpp', src_dir)
+                            module_name + 'Module.cpp', src_dir)
         # Render SLI initializer
         self.render_to_file('module_sli_init.tmpl', tmpl_args,
-                             name + 'Module-init.sli',
-                             path.join(src_dir, 'sli'))
+                            module_name + 'Module-init.sli',
+                            path.join(src_dir, 'sli'))
+
+    def generate_bundle_source_files(self, bundle_name, builds, src_dir):
+        for build in builds:
+            self.generate_model_files(build['component_class'], src_dir,
+                                      name=build['name'], **build['kwargs'])
+        self.generate_module_files(bundle_name, [b['name'] for b in builds],
+                                   src_dir)
 
     def configure_build_files(self, name, src_dir, compile_dir, install_dir,
-                              **kwargs):  # @UnusedVariable
-        # Generate Makefile if it is not present
-        if not path.exists(path.join(compile_dir, 'Makefile')):
-            if not path.exists(compile_dir):
-                os.mkdir(compile_dir)
-            logger.info("Configuring build files in '{}' directory"
-                        .format(compile_dir))
-            orig_dir = os.getcwd()
-            config_args = {'name': name, 'src_dir': src_dir,
-                           # NB: ODE solver currently ignored
-                           # 'ode_solver': kwargs.get('ode_solver',
-                           #                          self.ODE_SOLVER_DEFAULT),
-                           'version': pype9.__version__,
-                           'executable': sys.executable}
-            self.render_to_file('CMakeLists.txt.tmpl', config_args,
-                                 'CMakeLists.txt', src_dir)
-            os.chdir(compile_dir)
-            stdout, stderr = self.run_command(
-                ['cmake',
-                 '-Dwith-nest={}'.format(self.nest_config),
-                 '-DCMAKE_INSTALL_PREFIX={}'.format(install_dir), src_dir],
-                fail_msg=(
-                    "Cmake of '{}' NEST module failed (see src "
-                    "directory '{}'):\n\n {{}}".format(name, src_dir)))
-            if stderr:
-                raise Pype9BuildError(
-                    "Configure of '{}' NEST module failed (see src "
-                    "directory '{}'):\n\n{}\n{}"
-                    .format(name or src_dir, src_dir, stdout, stderr))
-                logger.debug("cmake '{}':\nstdout:\n{}stderr:\n{}\n"
-                             .format(compile_dir, stdout, stderr))
-            os.chdir(orig_dir)
+                              model_names=None, **kwargs):  # @UnusedVariable
+        if not path.exists(compile_dir):
+            os.makedirs(compile_dir)
+        if model_names is None:
+            model_names = [name]
+        config_args = {'name': name, 'src_dir': src_dir,
+                       'model_names': model_names,
+                       # NB: ODE solver currently ignored
+                       # 'ode_solver': kwargs.get('ode_solver',
+                       #                          self.ODE_SOLVER_DEFAULT),
+                       'version': pype9.__version__,
+                       'executable': sys.executable}
+        self.render_to_file('CMakeLists.txt.tmpl', config_args,
+                            'CMakeLists.txt', src_dir)
+        # Fingerprint of the configuration that determines how the sources
+        # are compiled (the install prefix doesn't affect the compiled object
+        # files so is saved separately)
+        config_digest = self.contents_digest(
+            self.file_digest(path.join(src_dir, 'CMakeLists.txt')) +
+            self.nest_config)
+        config_path = path.join(compile_dir, self._CMAKE_CONFIG)
+        try:
+            with open(config_path) as f:
+                prev_digest, prev_install_dir = f.read().split('\n')
+        except (IOError, ValueError):
+            prev_digest = prev_install_dir = None
+        if path.exists(path.join(compile_dir, 'Makefile')):
+            if config_digest != prev_digest:
+                # Remove the files compiled with the previous configuration
+                self._make_clean(compile_dir)
+            elif install_dir == prev_install_dir:
+                logger.debug("CMake configuration of '{}' is unchanged, "
+                             "skipping configuration".format(name))
+                return
+        logger.info("Configuring build files in '{}' directory"
+                    .format(compile_dir))
+        orig_dir = os.getcwd()
+        os.chdir(compile_dir)
+        stdout, stderr = self.run_command(
+            ['cmake',
+             '-Dwith-nest={}'.format(self.nest_config),
+             '-DCMAKE_INSTALL_PREFIX={}'.format(install_dir), src_dir],
+            fail_msg=(
+                "Cmake of '{}' NEST module failed (see src "
+                "directory '{}'):\n\n {{}}".format(name, src_dir)))
+        os.chdir(orig_dir)
+        if stderr:
+            raise Pype9BuildError(
+                "Configure of '{}' NEST module failed (see src "
+                "directory '{}'):\n\n{}\n{}"
+                .format(name or src_dir, src_dir, stdout, stderr))
+        logger.debug("cmake '{}':\nstdout:\n{}stderr:\n{}\n"
+                     .format(compile_dir, stdout, stderr))
+        with open(config_path, 'w') as f:
+            f.write('\n'.join((config_digest, install_dir)))
 
     def compile_source_files(self, compile_dir, component_name):
         # Run configure script, make and make install
@@ -176,10 +395,12 @@ class CodeGenerator(BaseCodeGenerator):
         logger.info("Compilation of '{}' NEST module completed "
                     "successfully".format(component_name))
 
-    def clean_src_dir(self, src_dir, name):
-        # Clean existing src directories from previous builds.
-        prefix = path.join(src_dir, name)
-        if path.exists(src_dir):
+    def clean_src_dir(self, src_dir, name, purge=False):
+        # Existing source files are left in place (unless purging) and only
+        # overwritten if their contents change, so that make only recompiles
+        # the translation units that have actually changed
+        if purge:
+            prefix = path.join(src_dir, name)
             remove_ignore_missing(prefix + '.h')
             remove_ignore_missing(prefix + '.cpp')
             remove_ignore_missing(prefix + 'Module.h')
@@ -191,6 +412,8 @@ class CodeGenerator(BaseCodeGenerator):
             os.makedirs(sli_path)
 
     def clean_compile_dir(self, compile_dir, purge=False, **kwargs):  # @UnusedVariable @IgnorePep8
+        # NB: 'make clean' is only run by 'configure_build_files' if the CMake
+        # configuration has changed
         if purge:
             try:
                 shutil.rmtree(compile_dir)
@@ -204,28 +427,64 @@ class CodeGenerator(BaseCodeGenerator):
                 raise Pype9BuildError(
                     "Could not make compile directory '{}': {}"
                     .format(compile_dir, e))
-        else:
-            orig_dir = os.getcwd()
-            os.chdir(compile_dir)
+
+    def _make_clean(self, compile_dir):
+        orig_dir = os.getcwd()
+        os.chdir(compile_dir)
+        try:
+            stdout, stderr = self.run_command(['make', 'clean'])
+        except (sp.CalledProcessError, OSError):
+            os.chdir(orig_dir)
+            shutil.rmtree(compile_dir, ignore_errors=True)
             try:
-                stdout, stderr = self.run_command(['make', 'clean'])
-                os.chdir(orig_dir)
-            except (sp.CalledProcessError, OSError):
-                os.chdir(orig_dir)
-                shutil.rmtree(compile_dir, ignore_errors=True)
-                try:
-                    os.makedirs(compile_dir)
-                except OSError as e:
-                    raise Pype9BuildError(
-                        "Could not create build directory ({}), please check "
-                        "the required permissions or specify a different "
-                        "build directory:\n{}".format(e))
-            if stderr and 'No rule to make target' not in stderr:
+                os.makedirs(compile_dir)
+            except OSError as e:
                 raise Pype9BuildError(
-                    "Clean of '{}' NEST module directory failed:\n\n{}\n{}"
-                    .format(compile_dir, stdout, stderr))
-            logger.debug("make clean '{}':\nstdout:\n{}stderr:\n{}\n"
-                         .format(compile_dir, stdout, stderr))
+                    "Could not create build directory ({}), please check "
+                    "the required permissions or specify a different "
+                    "build directory:\n{}".format(compile_dir, e))
+            return
+        os.chdir(orig_dir)
+        if stderr and 'No rule to make target' not in stderr:
+            raise Pype9BuildError(
+                "Clean of '{}' NEST module directory failed:\n\n{}\n{}"
+                .format(compile_dir, stdout, stderr))
+        logger.debug("make clean '{}':\nstdout:\n{}stderr:\n{}\n"
+                     .format(compile_dir, stdout, stderr))
+
+    def get_source_dir(self, name, url, digest):  # @UnusedVariable
+        """
+        The source and compile directories are shared between the builds of
+        the same name (i.e. they are not addressed by the digest) so that
+        a modified component class only needs to recompile the generated
+        files that have changed. Only the install directory is specific to
+        the digest. Concurrent builds of the same name are serialised by a
+        lock on the shared work directory (see 'generate')
+        """
+        return path.abspath(path.join(self.get_work_dir(name, url),
+                                      self._SRC_DIR))
+
+    def get_compile_dir(self, name, url, digest):  # @UnusedVariable
+        return path.abspath(path.join(self.get_work_dir(name, url),
+                                      self._CMPL_DIR))
+
+    def get_work_dir(self, name, url):
+        return path.join(self.base_dir, self.url_build_path(url), name,
+                         self._WORK_DIR)
+
+    def get_bundle_source_dir(self, bundle_name, digest):  # @UnusedVariable
+        # As for separate builds, the source and compile directories are
+        # shared between the digests of the bundle (see 'get_source_dir')
+        return path.abspath(path.join(self.get_bundle_work_dir(bundle_name),
+                                      self._SRC_DIR))
+
+    def get_bundle_compile_dir(self, bundle_name, digest):  # @UnusedVariable
+        return path.abspath(path.join(self.get_bundle_work_dir(bundle_name),
+                                      self._CMPL_DIR))
+
+    def get_bundle_work_dir(self, bundle_name):
+        return path.join(self.base_dir, self._BUNDLES_DIR, bundle_name,
+                         self._WORK_DIR)
 
     def simulator_specific_paths(self):
         path = []
@@ -233,8 +492,14 @@ class CodeGenerator(BaseCodeGenerator):
             path.append(path.join(os.environ['NEST_INSTALL_DIR'], 'bin'))
         return path
 
-    def load_libraries(self, name, url, **kwargs):  # @UnusedVariable
-        install_dir = self.get_install_dir(name, url)
+    def load_libraries(self, name, url, digest, **kwargs):  # @UnusedVariable @IgnorePep8
+        self._install_module(name, self.get_install_dir(name, url, digest))
+
+    def load_bundle(self, bundle_name, digest):
+        self._install_module(bundle_name, self.get_bundle_install_dir(
+            bundle_name, digest))
+
+    def _install_module(self, name, install_dir):
         lib_dir = os.path.join(install_dir, 'lib')
         add_lib_path(lib_dir)
         # Add module install directory to NEST path
@@ -272,5 +537,215 @@ class CodeGenerator(BaseCodeGenerator):
         return match.group(1)
 
 
+class LinearPropagator(object):
+    """
+    The template arguments required to integrate a linear system of ODEs,
+    dx/dt = A x + b, exactly over each timestep. The propagator matrices
+    exp(A h) and int_0^h exp(A s) ds are calculated in the 'calibrate'
+    method of the regime so the update is reduced to
+
+        x(t + h) = exp(A h) x(t) + int_0^h exp(A s) ds b
+
+    where b is held constant over the timestep.
+
+    Parameters
+    ----------
+    component_class : Dynamics
+        The component class the regime belongs to
+    unit_handler : UnitHandler
+        The unit handler used to scale the expressions
+    states : list(str)
+        The names of the state variables updated by the system (x)
+    coefficients : list(list(sympy.Expr))
+        The coefficient matrix (A)
+    inputs : list(sympy.Expr)
+        The inputs to the system (b)
+    """
+
+    def __init__(self, component_class, unit_handler, states, coefficients,
+                 inputs):
+        const_values = _constant_values(component_class, unit_handler)
+        coefficients = [[c.subs(const_values) for c in row]
+                        for row in coefficients]
+        inputs = [b.subs(const_values) for b in inputs]
+        self.states = states
+        # Non-zero elements of A
+        self.coefficients = [
+            (i, j, Expression(c).rhs_cstr)
+            for i, row in enumerate(coefficients)
+            for j, c in enumerate(row) if c != 0]
+        # Non-zero elements of b
+        self.inputs = [(i, Expression(b).rhs_cstr)
+                       for i, b in enumerate(inputs) if b != 0]
+        self.input_indices = [i for i, _ in self.inputs]
+        # Elements of the propagators that can be non-zero, i.e. the states
+        # that can be reached from each state through the non-zero
+        # coefficients of A
+        self.reachable = []
+        for i in range(len(states)):
+            reachable = set([i])
+            to_visit = [i]
+            while to_visit:
+                k = to_visit.pop()
+                for j, c in enumerate(coefficients[k]):
+                    if c != 0 and j not in reachable:
+                        reachable.add(j)
+                        to_visit.append(j)
+            self.reachable.append(sorted(reachable))
+        self.parameters = _required_names(
+            component_class, chain(*coefficients))[0]
+        (self.input_parameters, self.input_ports,
+         self.input_states) = _required_names(component_class, inputs)
+
+
+class AnalyticJacobian(object):
+    """
+    The template arguments required to evaluate the Jacobian of the time
+    derivatives of a regime analytically (used by the implicit GSL steppers)
+
+    Parameters
+    ----------
+    component_class : Dynamics
+        The component class the regime belongs to
+    unit_handler : UnitHandler
+        The unit handler used to scale the expressions
+    states : list(str)
+        The names of the state variables updated by the regime
+    jacobian : list(list(sympy.Expr))
+        The partial derivatives of the time derivatives with respect to the
+        state variables (df_i/dy_j)
+    dfdt : list(sympy.Expr)
+        The partial derivatives of the time derivatives with respect to time
+    derived : OrderedDict(sympy.Expr, sympy.Symbol) | None
+        The derived variables to hoist the parameter-only terms into (see
+        BaseCodeGenerator.hoist_parameter_terms). If None the elements of the
+        Jacobian are not optimised
+    """
+
+    def __init__(self, component_class, unit_handler, states, jacobian,
+                 dfdt, derived=None):
+        const_values = _constant_values(component_class, unit_handler)
+        n = len(states)
+        # Only the non-zero elements need to be set as the matrices are
+        # zeroed beforehand
+        indices = [(i, j) for i in range(n) for j in range(n)
+                   if jacobian[i][j] != 0]
+        time_indices = [i for i in range(n) if dfdt[i] != 0]
+        exprs = [e.subs(const_values) for e in chain(
+            (jacobian[i][j] for i, j in indices),
+            (dfdt[i] for i in time_indices))]
+        if derived is not None:
+            exprs = BaseCodeGenerator.hoist_parameter_terms(
+                exprs, set(component_class.parameter_names), derived)
+            temporaries, exprs = BaseCodeGenerator.common_subexpressions(
+                exprs)
+        else:
+            temporaries = []
+        self.states = states
+        self.temporaries = [(str(s), Expression(e).rhs_cstr)
+                            for s, e in temporaries]
+        self.elements = [(i, j, Expression(e).rhs_cstr)
+                         for (i, j), e in zip(indices, exprs)]
+        self.time_derivs = [(i, Expression(e).rhs_cstr)
+                            for i, e in zip(time_indices,
+                                            exprs[len(indices):])]
+        (self.parameters, self.ports, self.ode_states, self.other_states,
+         self.derived) = _local_names(
+             component_class, chain(exprs, (e for _, e in temporaries)),
+             states, derived)
+
+
+class OptimisedDynamics(object):
+    """
+    The template arguments required to evaluate the time derivatives of a
+    regime after the terms that only depend on parameters have been hoisted
+    into derived variables (calculated in 'calibrate') and the common
+    subexpressions of the time derivatives have been eliminated
+
+    Parameters
+    ----------
+    component_class : Dynamics
+        The component class the regime belongs to
+    unit_handler : UnitHandler
+        The unit handler used to scale the expressions
+    regime : Regime
+        The regime the time derivatives belong to
+    time_derivatives : list(tuple(str, sympy.Expr))
+        The state variables and the expanded right-hand sides of their time
+        derivatives with the constants substituted
+    derived : OrderedDict(sympy.Expr, sympy.Symbol)
+        The derived variables to hoist the parameter-only terms into (see
+        BaseCodeGenerator.hoist_parameter_terms)
+    """
+
+    def __init__(self, component_class, unit_handler, regime,
+                 time_derivatives, derived):
+        states = [n for n, _ in time_derivatives]
+        exprs = BaseCodeGenerator.hoist_parameter_terms(
+            [e for _, e in time_derivatives],
+            set(component_class.parameter_names), derived)
+        temporaries, exprs = BaseCodeGenerator.common_subexpressions(exprs)
+        units = [u for _, _, u in unit_handler.scale_time_derivatives(
+            regime.time_derivatives)]
+        self.states = states
+        self.temporaries = [(str(s), Expression(e).rhs_cstr)
+                            for s, e in temporaries]
+        self.time_derivatives = [
+            (n, Expression(e).rhs_cstr, u)
+            for n, e, u in zip(states, exprs, units)]
+        (self.parameters, self.ports, _, self.other_states,
+         self.derived) = _local_names(
+             component_class, chain(exprs, (e for _, e in temporaries)),
+             states, derived)
+
+
+def _constant_values(component_class, unit_handler):
+    """
+    Returns the substitutions of the constants of a component class with
+    their values in the units used by the code generator
+    """
+    return [
+        (sympy.Symbol(c.name), unit_handler.assign_units_to_constant(c)[0])
+        for c in component_class.constants]
+
+
+def _local_names(component_class, exprs, states, derived=None):
+    """
+    Returns the names of the parameters, analog receive/reduce ports, states
+    updated by the regime ('states'), other state variables and derived
+    variables that need to be mapped to local variables to evaluate the
+    expressions
+    """
+    exprs = list(exprs)
+    parameters, ports, required_states = _required_names(component_class,
+                                                         exprs)
+    if derived:
+        symbols = set(s for e in exprs for s in e.free_symbols)
+        derived_names = [str(s) for s in derived.values() if s in symbols]
+    else:
+        derived_names = []
+    return (parameters, ports,
+            [s for s in required_states if s in states],
+            [s for s in required_states if s not in states],
+            derived_names)
+
+
+def _required_names(component_class, exprs):
+    """
+    Returns the names of the parameters, analog receive/reduce ports and state
+    variables referenced in a list of sympy expressions (in the order they
+    appear in the component class)
+    """
+    symbols = set(str(s) for e in exprs for s in e.free_symbols)
+    parameters = [p for p in component_class.parameter_names
+                  if p in symbols]
+    ports = [p for p in chain(component_class.analog_receive_port_names,
+                              component_class.analog_reduce_port_names)
+             if p in symbols]
+    states = [s for s in component_class.state_variable_names
+              if s in symbols]
+    return parameters, ports, states
+
+
 if __name__ == '__main__':
     print(CodeGenerator.get_nest_config_path())
@@ -69,6 +69,7 @@ class ConnectionGroup(BaseConnectionGroup, pyNN.nest.Projection):
 
     SynapseClass = StaticSynapse
     PyNNProjectionClass = pyNN.nest.Projection
+    FromListConnector = pyNN.nest.FromListConnector
     UnitHandler = UnitHandler
     Simulation = Simulation
 
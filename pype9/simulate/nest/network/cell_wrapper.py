@@ -45,17 +45,21 @@ class PyNNCellWrapperMetaClass(BasePyNNCellWrapperMetaClass):
     """
 
     loaded_celltypes = {}
+    CellMetaClass = CellMetaClass
 
     def __new__(cls, component_class, default_properties,
-                initial_state, initial_regime, **kwargs):  # @UnusedVariable
+                initial_state, initial_regime, **kwargs):
         # Get the basic Pype9 cell class
-        model = CellMetaClass(component_class=component_class)
+        model = cls.CellMetaClass(**cls.cell_build_kwargs(
+            component_class, default_properties, initial_state,
+            initial_regime, **kwargs))
         try:
             celltype = cls.loaded_celltypes[model.name]
         except (KeyError, Pype9BuildMismatchError):
             dct = {'model': model}
-            dct['nest_name'] = {"on_grid": model.name, "off_grid": model.name}
-            dct['nest_model'] = model.name
+            dct['nest_name'] = {"on_grid": model.library_name,
+                                "off_grid": model.library_name}
+            dct['nest_model'] = model.library_name
             dct['default_properties'] = default_properties
             dct['initial_state'] = initial_state
             dct['initial_regime'] = initial_regime
@@ -11,8 +11,10 @@ class UnitHandler(BaseUnitHandler):
                      un.pF: 'pF', un.um: 'um', un.nS: 'nS', un.K: 'K',
                      un.cd: 'cd'}
 
+    _cache_path = BaseUnitHandler._get_cache_path('nest')
+
     (A, cache, si_lengths) = BaseUnitHandler._init_matrices_and_cache(
-        basis, compounds)
+        basis, compounds, _cache_path)
 
     def _units_for_code_gen(self, units):
         return self.compound_to_units_str(
@@ -55,10 +55,11 @@ class Cell(base.Cell):
 
     def __init__(self, *args, **kwargs):
         self._flag_created(False)
+        kwargs.pop('_sim_cell', None)  # Sections are created for each cell
         # Construct all the NEURON structures
         self._sec = h.Section()  # @UndefinedVariable
         # Insert dynamics mechanism (the built component class)
-        HocClass = getattr(h, self.__class__.name)
+        HocClass = getattr(h, self.__class__.library_name)
         self._hoc = HocClass(0.5, sec=self._sec)
         # A recordable of 'spikes' is needed for PyNN compatibility
         self.recordable = {'spikes': None}
@@ -192,8 +193,7 @@ class Cell(base.Cell):
 
     def initialize(self):
         if self.in_array:
-            for k, v in self._initial_states.items():
-                self._set(k, v)
+            self._set_many(self._initial_states)
             assert self._regime_index is not None
             self._set_regime()
         else:
@@ -237,6 +237,16 @@ class Cell(base.Cell):
                         "Could not set '{}' to hoc object or NEURON section"
                         .format(varname))
 
+    def _set_many(self, values):
+        hoc = self._hoc
+        for varname, val in values.items():
+            try:
+                setattr(hoc, varname, val)
+            except LookupError:
+                self._set(varname, val)  # Fall back to section attributes
+        if self.cm_param_name in values:
+            self._set(self.cm_param_name, values[self.cm_param_name])
+
     def _set_regime(self):
         setattr(self._hoc, self.code_generator.REGIME_VARNAME, self._regime_index)
 
@@ -305,16 +315,16 @@ class Cell(base.Cell):
             port = self.component_class.port(port_name)
         except NineMLNameError:
             port = self.component_class.state_variable(port_name)
+        recorded, interval = self._recorded_data(port_name)
         if isinstance(port, EventPort):
-            events = numpy.asarray(self._recordings[port_name])
             recording = neo.SpikeTrain(
-                self._trim_spike_train(events, t_start), t_start=t_start,
+                self._trim_spike_train(recorded, t_start), t_start=t_start,
                 t_stop=t_stop, units='ms')
         else:
             units_str = self.unit_handler.dimension_to_unit_str(
                 port.dimension, one_as_dimensionless=True)
-            interval = h.dt * pq.ms
-            signal = numpy.asarray(self._recordings[port_name])
+            interval = interval * pq.ms
+            signal = recorded
             recording = neo.AnalogSignal(
                 self._trim_analog_signal(signal, t_start, interval),
                 sampling_period=interval,
@@ -324,12 +334,25 @@ class Cell(base.Cell):
 
     def _regime_recording(self):
         t_start = self.unit_handler.to_pq_quantity(self._t_start)
+        recorded, interval = self._recorded_data(
+            self.code_generator.REGIME_VARNAME)
         return neo.AnalogSignal(
-            self._recordings[self.code_generator.REGIME_VARNAME],
-            sampling_period=h.dt * pq.ms,
+            recorded, sampling_period=interval * pq.ms,
             t_start=t_start, units='dimensionless',
             name=self.code_generator.REGIME_VARNAME)
 
+    def _fetch_recorded_data(self, port_names=None):
+        if port_names is None:
+            port_names = list(self._recordings)
+        # NB: The interval is ignored for recordings of event ports
+        return dict((n, (numpy.array(self._recordings[n]), h.dt))
+                    for n in port_names)
+
+    def _kill(self, t_stop, cache_dir=None):
+        super(Cell, self)._kill(t_stop, cache_dir=cache_dir)
+        # Release the hoc vectors the recordings were stored in
+        super(base.Cell, self).__setattr__('_recordings', {})
+
     def reset_recordings(self):
         """
         Resets the recordings for the cell and the NEURON simulator (assumes
@@ -562,6 +585,8 @@ class CellMetaClass(base.CellMetaClass):
     """
 
     _built_types = {}  # Stores previously created types for reuse
+    _shared_builds = {}  # Libraries loaded for each name-independent digest
+    _build_cache = {}  # Names of the cell classes built for each structure
     CodeGenerator = CodeGenerator
     BaseCellClass = Cell
     Simulation = Simulation
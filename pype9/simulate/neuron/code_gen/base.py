@@ -15,6 +15,8 @@ import tempfile
 import platform
 import re
 import uuid
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from itertools import chain
 import subprocess as sp
 from collections import defaultdict
@@ -29,7 +31,6 @@ from pype9.simulate.common.cells import (
 from pype9.exceptions import (
     Pype9BuildError, Pype9RuntimeError, Pype9CommandNotFoundError)
 import pype9
-from datetime import datetime
 from nineml.abstraction import (StateAssignment, Parameter, StateVariable,
                                 Constant, Expression)
 from nineml.abstraction.dynamics.visitors.queriers import (
@@ -59,6 +60,10 @@ class CodeGenerator(BaseCodeGenerator):
     SIMULATOR_NAME = 'neuron'
     SIMULATOR_VERSION = neuron.h.nrnversion(0)
     ODE_SOLVER_DEFAULT = 'derivimplicit'
+    OPTIMISE_EXPRESSIONS_DEFAULT = True
+    TABULATE_ALIASES_DEFAULT = False
+    TABLE_RANGE_DEFAULT = (-100.0, 100.0)  # mV
+    TABLE_RESOLUTION_DEFAULT = 0.5  # mV
     REGIME_VARNAME = 'regime_'
     SEED_VARNAME = 'seed_'
     BASE_TMPL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
@@ -71,8 +76,15 @@ class CodeGenerator(BaseCodeGenerator):
 
     _inbuilt_ions = ['na', 'k', 'ca']
 
-    def __init__(self, gsl_path=None, **kwargs):
+    _MODLUNIT_CACHE_DIR = '.modlunit'  # Digests of NMODL files that passed
+
+    SUPPORTS_BUNDLES = True
+
+    def __init__(self, gsl_path=None, build_cores=None, **kwargs):
         super(CodeGenerator, self).__init__(**kwargs)
+        if build_cores is None:
+            build_cores = multiprocessing.cpu_count()
+        self._build_cores = build_cores
         self.nrnivmodl_path = self.get_neuron_util_path('nrnivmodl')
         self.modlunit_path = self.get_neuron_util_path('modlunit',
                                                        default=None)
@@ -117,6 +129,20 @@ class CodeGenerator(BaseCodeGenerator):
             Whether to use the 'SUFFIX' tag or not.
         ode_solver : str
             specifies the ODE solver to use
+        optimise_expressions : bool
+            Whether to calculate the aliases that only depend on parameters
+            once in the INITIAL block instead of at every time step
+        tabulate_aliases : bool
+            Whether to generate lookup tables (with NMODL's TABLE statement)
+            for the aliases that only depend on the membrane voltage and
+            parameters (e.g. the rate functions of HH-style gating
+            variables). NB: the tables are only recalculated when the
+            parameters they depend on change, so the parameters should be
+            the same for all instances of the mechanism
+        table_range : tuple(float, float)
+            The range of membrane voltages (mV) covered by the lookup tables
+        table_resolution : float
+            The spacing (mV) between the entries of the lookup tables
         """
         if name is None:
             name = component_class.name
@@ -139,9 +165,9 @@ class CodeGenerator(BaseCodeGenerator):
             'component_class': component_class,
             'all_triggers': all_triggers,
             'version': pype9.__version__, 'src_dir': src_dir,
-            'timestamp': datetime.now().strftime('%a %d %b %y %I:%M:%S%p'),
             'unit_handler': UnitHandler(component_class),
             'ode_solver': self.ODE_SOLVER_DEFAULT,
+            'optimise_expressions': self.OPTIMISE_EXPRESSIONS_DEFAULT,
             'external_ports': [],
             'is_subcomponent': True,
             'regime_varname': self.REGIME_VARNAME,
@@ -149,10 +175,75 @@ class CodeGenerator(BaseCodeGenerator):
 #             # FIXME: weight_vars needs to be removed or implemented properly
 #             'weight_variables': []}
         tmpl_args.update(template_args)
+        if tmpl_args['optimise_expressions']:
+            tmpl_args['parameter_aliases'] = self.parameter_aliases(
+                component_class, tmpl_args['unit_handler'])
+        else:
+            tmpl_args['parameter_aliases'] = []
+        tmpl_args['tables'] = {}
+        if (tmpl_args.get('tabulate_aliases', self.TABULATE_ALIASES_DEFAULT)
+            and component_class.annotations.get(
+                (BUILD_TRANS, PYPE9_NS), MECH_TYPE,
+                default=None) != ARTIFICIAL_CELL_MECH):
+            v_min, v_max = tmpl_args.get('table_range',
+                                         self.TABLE_RANGE_DEFAULT)
+            resolution = tmpl_args.get('table_resolution',
+                                       self.TABLE_RESOLUTION_DEFAULT)
+            if v_max <= v_min or resolution <= 0.0:
+                raise Pype9BuildError(
+                    "Invalid table range ({}, {}) or resolution ({}) for the "
+                    "lookup tables of '{}'".format(v_min, v_max, resolution,
+                                                   name))
+            tmpl_args['table_range'] = (v_min, v_max)
+            tmpl_args['table_size'] = max(
+                int(round((v_max - v_min) / resolution)), 1)
+            tmpl_args['tables'] = self.alias_tables(
+                component_class, tmpl_args['unit_handler'])
         # Render mod file
         self.render_to_file(
             template, tmpl_args, component_class.name + '.mod', src_dir)
 
+    def alias_tables(self, component_class, unit_handler):
+        """
+        Finds the aliases that only depend on the membrane voltage, parameters
+        and constants and call (expensive) functions such as exp(), so they
+        can be evaluated from lookup tables of the membrane voltage
+
+        Parameters
+        ----------
+        component_class : Dynamics
+            The (transformed) component class containing the aliases
+        unit_handler : UnitHandler
+            The unit handler used to scale the aliases
+
+        Returns
+        -------
+        tables : dict(str, AliasTable)
+            The lookup tables of the aliases, keyed by alias name
+        """
+        parameter_names = set(chain(component_class.parameter_names,
+                                    component_class.constant_names))
+        overridden = set(
+            a.name for a in component_class.aliases
+            if list(component_class.overridden_in_regimes(a)))
+        tables = {}
+        for alias in component_class.aliases:
+            if self._depends_on_aliases(alias, component_class, overridden):
+                continue
+            expr = self.expand_scaled_aliases(
+                unit_handler.scale_alias(alias)[0].rhs, component_class,
+                unit_handler)
+            if (sympy.Symbol('v') in expr.free_symbols and
+                    expr.atoms(sympy.Function) and
+                    self.depends_only_on(expr, parameter_names | {'v'})):
+                units = unit_handler.assign_units_to_alias(alias)
+                depends = sorted(
+                    str(s) for s in expr.free_symbols
+                    if str(s) in component_class.parameter_names)
+                tables[alias.name] = AliasTable(alias.name, expr, units,
+                                                depends)
+        return tables
+
     def transform_for_build(self, name, component_class, **kwargs):
         """
         Copies and transforms the component class to match the format of the
@@ -466,26 +557,20 @@ class CodeGenerator(BaseCodeGenerator):
                     .format(compile_dir))
         # Check the created units by running modlunit
         if __debug__ and self.modlunit_path is not None:
-            for fname in os.listdir('.'):
-                if fname.endswith('.mod'):
-                    try:
-                        stdout, stderr = self.run_command([self.modlunit_path,
-                                                           fname])
-                        assert '<<ERROR>>' not in stderr, (
-                            "Incorrect units assigned in NMODL file:\n {}{}"
-                            .format(stdout, stderr))
-                    except sp.CalledProcessError as e:
-                        raise Pype9BuildError(
-                            "Could not run 'modlunit' to check dimensions in "
-                            "NMODL file: {}\n{}".format(fname, e))
-        # Run nrnivmodl command in src directory
+            self.check_units([os.path.join(compile_dir, f)
+                              for f in sorted(os.listdir('.'))
+                              if f.endswith('.mod')])
+        # Run nrnivmodl command in src directory, compiling the mod files in
+        # parallel
         nrnivmodl_cmd = [self.nrnivmodl_path, '-loadflags',
                          ' '.join(self.nrnivmodl_flags)]
         logger.debug("Building nrnivmodl in {} with {}".format(
             compile_dir, nrnivmodl_cmd))
-        self.run_command(nrnivmodl_cmd, fail_msg=(
-            "Compilation of NMODL files for '{}' model failed. See src "
-            "directory '{}':\n\n{{}}".format(name, compile_dir)))
+        stdout, stderr = self.run_command(
+            nrnivmodl_cmd, fail_msg=(
+                "Compilation of NMODL files for '{}' model failed. See src "
+                "directory '{}':\n\n{{}}".format(name, compile_dir)),
+            env_vars={'MAKEFLAGS': '-j{}'.format(self._build_cores)})
         if stderr.strip().endswith('Error 1'):
             raise Pype9BuildError(
                 "Generated mod file failed to compile with output:\n{}\n{}"
@@ -493,20 +578,88 @@ class CodeGenerator(BaseCodeGenerator):
         logger.info("Compilation of NEURON (NMODL) files for '{}' "
                     "completed successfully".format(name))
 
-    def get_install_dir(self, name, url):
+    def get_install_dir(self, name, url, digest):
         # return the platform-specific location of the nrnivmodl output files
-        return os.path.join(self.get_source_dir(name, url), self.specials_dir)
+        return os.path.join(self.get_source_dir(name, url, digest),
+                            self.specials_dir)
 
-    def get_compile_dir(self, name, url):
+    def get_compile_dir(self, name, url, digest):
         """
         The compile dir is the same as the src dir for NEURON compile
         """
-        return self.get_source_dir(name, url)
+        return self.get_source_dir(name, url, digest)
 
-    def load_libraries(self, name, url):
-        install_dir = self.get_install_dir(name, url)
+    def load_libraries(self, name, url, digest):
+        install_dir = self.get_install_dir(name, url, digest)
         load_mechanisms(os.path.dirname(install_dir))
 
+    def check_units(self, mod_paths):
+        """
+        Checks the units of NMODL files by running modlunit on them
+        concurrently. Files that have passed the check previously (as
+        determined by the digest of their contents) are not checked again
+
+        Parameters
+        ----------
+        mod_paths : list(str)
+            Paths of the NMODL files to check
+        """
+        cache_dir = os.path.join(self.base_dir, self._MODLUNIT_CACHE_DIR)
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+        to_check = []
+        for mod_path in mod_paths:
+            passed_path = os.path.join(cache_dir, self.contents_digest(
+                self.file_digest(mod_path) + self.modlunit_path))
+            if not os.path.exists(passed_path):
+                to_check.append((mod_path, passed_path))
+        if not to_check:
+            return
+        # As the checks run in subprocesses threads are sufficient
+        pool = ThreadPool(min(len(to_check), self._build_cores))
+        try:
+            pool.map(self._run_modlunit, [p for p, _ in to_check])
+        finally:
+            pool.close()
+            pool.join()
+        for _, passed_path in to_check:
+            open(passed_path, 'w').close()
+
+    def _run_modlunit(self, mod_path):
+        try:
+            stdout, stderr = self.run_command(
+                [self.modlunit_path, os.path.basename(mod_path)],
+                cwd=os.path.dirname(mod_path))
+        except sp.CalledProcessError as e:
+            raise Pype9BuildError(
+                "Could not run 'modlunit' to check dimensions in "
+                "NMODL file: {}\n{}".format(mod_path, e))
+        if '<<ERROR>>' in stderr:
+            raise Pype9BuildError(
+                "Incorrect units assigned in NMODL file '{}':\n {}{}"
+                .format(mod_path, stdout, stderr))
+
+    def generate_bundle_source_files(self, bundle_name, builds, src_dir):  # @UnusedVariable @IgnorePep8
+        # All mod files in the directory are compiled into the same library
+        # by nrnivmodl
+        for build in builds:
+            self.generate_source_files(
+                component_class=build['component_class'], src_dir=src_dir,
+                name=build['name'], **build['kwargs'])
+
+    def get_bundle_compile_dir(self, bundle_name, digest):
+        return self.get_bundle_source_dir(bundle_name, digest)
+
+    def get_bundle_install_dir(self, bundle_name, digest):
+        return os.path.join(self.get_bundle_source_dir(bundle_name, digest),
+                            self.specials_dir)
+
+    def load_bundle(self, bundle_name, digest):
+        load_mechanisms(self.get_bundle_source_dir(bundle_name, digest))
+
     def clean_compile_dir(self, *args, **kwargs):
         pass  # NEURON doesn't use a separate compile dir
 
@@ -696,3 +849,33 @@ class CodeGenerator(BaseCodeGenerator):
                 p[2:-3] for p in libs.split()
                 if p.startswith('-L') and p.endswith('lib') and 'gsl' in p]
         return prefixes
+
+
+class AliasTable(object):
+    """
+    The template arguments required to evaluate an alias from a lookup table
+    of the membrane voltage (generated by a FUNCTION with a TABLE statement)
+
+    Parameters
+    ----------
+    alias_name : str
+        Name of the tabulated alias
+    expr : sympy.Expr
+        The scaled expression of the alias in terms of 'v', parameters and
+        constants only
+    units : str
+        The units of the alias
+    parameters : list(str)
+        The parameters the table depends on (i.e. which trigger the table to
+        be recalculated when they change)
+    """
+
+    def __init__(self, alias_name, expr, units, parameters):
+        self.alias_name = alias_name
+        self.expr = expr
+        self.units = units
+        self.parameters = parameters
+
+    @property
+    def function_name(self):
+        return 'table_' + self.alias_name
@@ -63,6 +63,7 @@ class ConnectionGroup(BaseConnectionGroup, pyNN.neuron.Projection):
 
     SynapseClass = StaticSynapse
     PyNNProjectionClass = pyNN.neuron.Projection
+    FromListConnector = pyNN.neuron.FromListConnector
     UnitHandler = UnitHandler
     Simulation = Simulation
 
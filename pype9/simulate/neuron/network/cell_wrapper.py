@@ -27,13 +27,13 @@ class PyNNCellWrapper(BasePyNNCellWrapper, pyNN.models.BaseCellType):
 class PyNNCellWrapperMetaClass(BasePyNNCellWrapperMetaClass):
 
     loaded_celltypes = {}
+    CellMetaClass = CellMetaClass
 
     def __new__(cls, component_class, default_properties,
-                initial_state, initial_regime, **kwargs):  # @UnusedVariable @IgnorePep8
-        model = CellMetaClass(component_class=component_class,
-                              default_properties=default_properties,
-                              initial_state=initial_state,
-                              standalone=False, **kwargs)
+                initial_state, initial_regime, **kwargs):
+        model = cls.CellMetaClass(**cls.cell_build_kwargs(
+            component_class, default_properties, initial_state,
+            initial_regime, **kwargs))
         try:
             celltype = cls.loaded_celltypes[model.name]
         except KeyError:
@@ -53,3 +53,12 @@ class PyNNCellWrapperMetaClass(BasePyNNCellWrapperMetaClass):
                     "', '".join(set(recordable_keys))))
             cls.loaded_celltypes[model.name] = celltype
         return celltype
+
+    @classmethod
+    def cell_build_kwargs(cls, component_class, default_properties,
+                          initial_state, initial_regime, **kwargs):  # @UnusedVariable @IgnorePep8
+        kwargs.update({'component_class': component_class,
+                       'default_properties': default_properties,
+                       'initial_state': initial_state,
+                       'standalone': False})
+        return kwargs
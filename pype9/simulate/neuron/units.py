@@ -11,8 +11,10 @@ class UnitHandler(BaseUnitHandler):
                      un.cd: 'cd', un.uF_per_cm2: 'uF/cm2',
                      un.S_per_cm2: 'S/cm2'}
 
+    _cache_path = BaseUnitHandler._get_cache_path('neuron')
+
     (A, cache, si_lengths) = BaseUnitHandler._init_matrices_and_cache(
-        basis, compounds)
+        basis, compounds, _cache_path)
 
     def _units_for_code_gen(self, units):
         return self.compound_to_units_str(
@@ -1,5 +1,46 @@
+from functools import wraps
+from collections import OrderedDict
+
 
 class classproperty(property):
     """Used to set a property of a class"""
     def __get__(self, cls, owner):
         return self.fget.__get__(None, owner)()
+
+
+STRUCTURAL_MEMO_MAXSIZE = 128
+
+
+def structural_memo(func=None, maxsize=STRUCTURAL_MEMO_MAXSIZE):
+    """
+    Memoises a function of a single NineML object on the structure of the
+    object (i.e. its NineML hash), so that structurally identical objects,
+    such as the same synapse type used in many projections, are only
+    analysed once. As NineML objects are mutable, a cached result is only
+    returned if the object it was calculated from is still equal to the
+    argument. The cache holds references to the objects it was calculated
+    from, so only the 'maxsize' most recently used results are kept.
+    """
+    if func is None:
+        return lambda f: structural_memo(f, maxsize=maxsize)
+    cache = OrderedDict()
+
+    @wraps(func)
+    def memoised(nineml_obj):
+        key = hash(nineml_obj)
+        try:
+            cached_obj, result = cache.pop(key)
+        except KeyError:
+            pass
+        else:
+            if cached_obj is nineml_obj or cached_obj == nineml_obj:
+                cache[key] = (cached_obj, result)  # Mark as most recent
+                return result
+        result = func(nineml_obj)
+        cache[key] = (nineml_obj, result)
+        while len(cache) > maxsize:
+            cache.popitem(last=False)
+        return result
+
+    memoised.cache = cache
+    return memoised
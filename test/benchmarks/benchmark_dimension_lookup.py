@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark comparing the vectorised cache lookup in
+UnitHandler.dimension_to_units_compound with a scan of the cached
+projections (as it was looked up previously) over the dimensions of the
+Izhikevich and Hodgkin-Huxley models
+"""
+from __future__ import print_function
+from __future__ import division
+from builtins import zip
+import timeit
+from itertools import chain
+import numpy
+import ninemlcatalog
+from nineml import units as un
+from pype9.simulate.nest.units import UnitHandler
+
+MODELS = ('neuron/Izhikevich.xml#Izhikevich',
+          'neuron/HodgkinHuxley.xml#HodgkinHuxley')
+
+
+def scan_cache(handler_cls, dimension):
+    """
+    Reference implementation of dimension_to_units_compound for dimensions
+    that are powers of cached projections, which scans through each of the
+    cached projections in turn
+    """
+    if dimension == 1 or dimension == un.dimensionless:
+        return 0, []
+    dim_vector = numpy.array(list(dimension), dtype='float')
+    mask = (dim_vector != 0)
+    for d, x in handler_cls.cache.items():
+        d = numpy.asarray(d)
+        if ((d != 0) == mask).all():
+            scalars = numpy.unique(dim_vector[mask] / d[mask])
+            if len(scalars) == 1 and float(scalars[0]).is_integer():
+                x = x * int(scalars[0])
+                units = list(handler_cls.specified_units)
+                return (int(x.dot([u.power for u in units])),
+                        [(u, p) for u, p in zip(units, x) if p])
+    return None
+
+
+def benchmark_dimension_lookup(num_repeats=1000, handler_cls=UnitHandler):
+    dimensions = []
+    for model in MODELS:
+        component_class = ninemlcatalog.load(model)
+        dimensions.extend(
+            e.dimension for e in chain(component_class.parameters,
+                                       component_class.state_variables,
+                                       component_class.analog_ports)
+            if e.dimension != un.dimensionless)
+    # Make sure all projections are cached
+    for dimension in dimensions:
+        handler_cls.dimension_to_units_compound(dimension)
+    assert all(scan_cache(handler_cls, d) ==
+               handler_cls.dimension_to_units_compound(d)
+               for d in dimensions)
+    scan_time = timeit.timeit(
+        lambda: [scan_cache(handler_cls, d) for d in dimensions],
+        number=num_repeats)
+    lookup_time = timeit.timeit(
+        lambda: [handler_cls.dimension_to_units_compound(d)
+                 for d in dimensions], number=num_repeats)
+    print("Looked up {} dimensions {} times: scan {:.3f} s, "
+          "vectorised {:.3f} s ({:.1f}x speed-up)".format(
+              len(dimensions), num_repeats, scan_time, lookup_time,
+              scan_time / lookup_time))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_repeats', type=int, default=1000,
+                        help=("The number of times each dimension is looked "
+                              "up (default: %(default)s)"))
+    args = parser.parse_args()
+    benchmark_dimension_lookup(args.num_repeats)
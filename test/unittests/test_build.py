@@ -1,9 +1,15 @@
 from __future__ import division
 from __future__ import print_function
+import os
+import tempfile
+from collections import OrderedDict
+import sympy
 import ninemlcatalog
-from nineml.abstraction import Parameter, TimeDerivative, StateVariable
+from nineml.abstraction import (
+    Parameter, TimeDerivative, StateVariable, Dynamics, Regime, On)
 import nineml.units as un
 from pype9.simulate.nest import CellMetaClass
+from pype9.simulate.neuron import CellMetaClass as NeuronCellMetaClass
 from pype9.simulate.common.cells.with_synapses import WithSynapses
 from pype9.exceptions import Pype9BuildMismatchError
 from unittest import TestCase  # @Reimport
@@ -28,3 +34,181 @@ class TestSeeding(TestCase):
             Pype9BuildMismatchError,
             CellMetaClass,
             izhi2_wrap)
+
+    def test_build_digest(self):
+        izhi = ninemlcatalog.load('neuron/Izhikevich.xml#Izhikevich')
+        izhi2 = izhi.clone()
+        izhi2.add(Parameter('zp', dimension=un.time))
+        code_gen = CellMetaClass.CodeGenerator()
+        digest = code_gen.build_digest(WithSynapses.wrap(izhi))
+        # Digest should only depend on the contents of the class
+        self.assertEqual(
+            digest, code_gen.build_digest(WithSynapses.wrap(izhi.clone())))
+        self.assertNotEqual(
+            digest, code_gen.build_digest(WithSynapses.wrap(izhi2)))
+        # Build options should also be included in the digest
+        self.assertNotEqual(
+            digest, code_gen.build_digest(WithSynapses.wrap(izhi),
+                                          ode_solver='cvode'))
+
+    def test_jinja_environment_cache(self):
+        code_gen = CellMetaClass.CodeGenerator(base_dir=tempfile.mkdtemp())
+        switches = {'ode_solver': 'gsl', 'ss_solver': None}
+        env = code_gen.jinja_environment(switches)
+        env.get_template('main.tmpl')
+        self.assertIs(env, code_gen.jinja_environment(switches))
+        self.assertIsNot(env, code_gen.jinja_environment(
+            {'ode_solver': 'cvode', 'ss_solver': None}))
+        # Check that the compiled template bytecode has been saved to disk
+        self.assertTrue(os.listdir(os.path.join(
+            code_gen.base_dir, code_gen._TMPL_BYTECODE_DIR)))
+
+    def test_render_unchanged(self):
+        code_gen = CellMetaClass.CodeGenerator(base_dir=tempfile.mkdtemp())
+        src_dir = tempfile.mkdtemp()
+        pth = os.path.join(src_dir, 'izhiModule.h')
+        args = {'component_name': 'izhi', 'version': '1'}
+        self.assertTrue(code_gen.render_to_file('module-header.tmpl', args,
+                                                'izhiModule.h', src_dir))
+        # Set the modification time into the past so it can be checked
+        os.utime(pth, (0, 0))
+        # Identical contents shouldn't be rewritten (preserving the mtime)
+        self.assertFalse(code_gen.render_to_file('module-header.tmpl', args,
+                                                 'izhiModule.h', src_dir))
+        self.assertEqual(os.path.getmtime(pth), 0)
+        args['component_name'] = 'izhi2'
+        self.assertTrue(code_gen.render_to_file('module-header.tmpl', args,
+                                                'izhiModule.h', src_dir))
+        self.assertNotEqual(os.path.getmtime(pth), 0)
+
+    def test_shared_build(self):
+        izhi = ninemlcatalog.load('neuron/Izhikevich.xml#Izhikevich')
+        code_gen = CellMetaClass.CodeGenerator()
+        izhi_a = WithSynapses.wrap(izhi.clone())
+        izhi_a.name = 'IzhikevichA'
+        izhi_b = WithSynapses.wrap(izhi.clone())
+        izhi_b.name = 'IzhikevichB'
+        # Name-independent digest should only differ by structure
+        self.assertNotEqual(code_gen.build_digest(izhi_a),
+                            code_gen.build_digest(izhi_b))
+        self.assertEqual(code_gen.shared_digest(izhi_a),
+                         code_gen.shared_digest(izhi_b))
+        # Builds that only differ by their build version should share the
+        # same library
+        CellA, CellB = CellMetaClass.build_many(
+            [dict(component_class=izhi, build_version='SharedA'),
+             dict(component_class=izhi, build_version='SharedB')])
+        self.assertNotEqual(CellA.name, CellB.name)
+        self.assertEqual(CellA.library_name, CellB.library_name)
+        self.assertEqual(CellA.build_digest, CellB.build_digest)
+
+    def test_bundle(self):
+        izhi = ninemlcatalog.load('neuron/Izhikevich.xml#Izhikevich')
+        hh = ninemlcatalog.load('neuron/HodgkinHuxley.xml#HodgkinHuxley')
+        code_gen = CellMetaClass.CodeGenerator(base_dir=tempfile.mkdtemp())
+        cell_classes = CellMetaClass.build_many(
+            [dict(component_class=c, build_version='Bundled',
+                  code_generator=code_gen) for c in (izhi, hh)],
+            bundle='TestBundleCells')
+        # Check that the cell classes were compiled into a single bundle
+        digest = code_gen.bundle_digest(
+            [{'name': c.name, 'digest': c.build_digest}
+             for c in cell_classes])
+        self.assertTrue(os.path.exists(os.path.join(
+            code_gen.get_bundle_dir('TestBundleCells', digest),
+            code_gen._BUILD_COMPLETE)))
+
+    def test_build_cache(self):
+        izhi = ninemlcatalog.load('neuron/Izhikevich.xml#Izhikevich')
+        Cell = CellMetaClass(izhi, build_version='Cached')
+        self.assertIn(Cell.name,
+                      [n for _, n in CellMetaClass._build_cache.values()])
+        # Structurally identical component classes should be looked up from
+        # the cache without being transformed again
+        self.assertIs(CellMetaClass(izhi.clone(), build_version='Cached'),
+                      Cell)
+
+    def test_linear_propagators(self):
+        liaf = ninemlcatalog.load(
+            'neuron/LeakyIntegrateAndFire.xml#LeakyIntegrateAndFire')
+        hh = ninemlcatalog.load('neuron/HodgkinHuxley.xml#HodgkinHuxley')
+        code_gen = CellMetaClass.CodeGenerator()
+        propagators = code_gen.regime_propagators(
+            liaf, code_gen.UnitHandler(liaf))
+        # Only the subthreshold regime has time derivatives
+        self.assertEqual(list(propagators), ['subthreshold'])
+        propagator = propagators['subthreshold']
+        self.assertEqual(propagator.states, ['v'])
+        self.assertEqual(propagator.parameters, ['tau'])
+        self.assertEqual(propagator.input_ports, ['i_synaptic'])
+        # The gating variables of the HH model are non-linear
+        self.assertFalse(code_gen.regime_propagators(
+            hh, code_gen.UnitHandler(hh)))
+
+    def test_analytic_jacobian(self):
+        hh = ninemlcatalog.load('neuron/HodgkinHuxley.xml#HodgkinHuxley')
+        code_gen = CellMetaClass.CodeGenerator()
+        jacobians = code_gen.regime_jacobians(hh, code_gen.UnitHandler(hh))
+        jacobian = jacobians['default']
+        self.assertEqual(jacobian.states, ['V', 'h', 'm', 'n'])
+        # Each gating variable only depends on itself and the membrane
+        # voltage so only the non-zero elements should be set
+        self.assertEqual(sorted((i, j) for i, j, _ in jacobian.elements),
+                         [(0, 0), (0, 1), (0, 2), (0, 3), (1, 0), (1, 1),
+                          (2, 0), (2, 2), (3, 0), (3, 3)])
+        self.assertFalse(jacobian.time_derivs)
+
+    def test_optimised_dynamics(self):
+        hh = ninemlcatalog.load('neuron/HodgkinHuxley.xml#HodgkinHuxley')
+        code_gen = CellMetaClass.CodeGenerator()
+        derived = OrderedDict()
+        dynamics = code_gen.regime_dynamics(hh, code_gen.UnitHandler(hh),
+                                            derived)
+        optimised = dynamics['default']
+        self.assertEqual(optimised.states, ['V', 'h', 'm', 'n'])
+        # The capacitance only appears through its reciprocal, which is
+        # calculated once from the parameters in calibrate()
+        self.assertIn(1 / sympy.Symbol('C'), derived)
+        self.assertNotIn('C', optimised.parameters)
+        self.assertTrue(optimised.temporaries)
+        # The derived variables are shared with the Jacobian
+        jacobian = code_gen.regime_jacobians(
+            hh, code_gen.UnitHandler(hh), derived=derived)['default']
+        self.assertIn(str(derived[1 / sympy.Symbol('C')]), jacobian.derived)
+
+    def test_alias_tables(self):
+        hh = ninemlcatalog.load('neuron/HodgkinHuxley.xml#PyNNHodgkinHuxley')
+        code_gen = NeuronCellMetaClass.CodeGenerator()
+        trfrm = code_gen.transform_for_build('HHTables', WithSynapses.wrap(hh))
+        tables = code_gen.alias_tables(trfrm, code_gen.UnitHandler(trfrm))
+        # Only the rate functions of the gating variables should be tabulated
+        # (not the linear shift of the voltage or the currents, which depend
+        # on the gating variables)
+        self.assertEqual(
+            sorted(tables),
+            sorted(g + '_' + r for g in 'hmn'
+                   for r in ('alpha', 'beta', 'inf', 'tau')))
+        self.assertEqual(tables['n_beta'].parameters,
+                         ['n_beta_A', 'n_beta_K', 'n_beta_V0', 'v_rest'])
+
+    def test_parameter_aliases(self):
+        dynamics = Dynamics(
+            name='OverriddenAlias',
+            parameters=[Parameter('p', un.dimensionless),
+                        Parameter('q', un.dimensionless),
+                        Parameter('tau', un.time)],
+            state_variables=[StateVariable('X', un.dimensionless)],
+            aliases=['A := p', 'B := A + q', 'C := 2 * p', 'D := C + q'],
+            regimes=[
+                Regime('dX/dt = (A - X) / tau', name='r1',
+                       aliases=['A := q'],
+                       transitions=[On('X > B', do=['X = 0'], to='r2')]),
+                Regime('dX/dt = (A - X) / tau', name='r2',
+                       transitions=[On('X > D', do=['X = 0'], to='r1')])])
+        code_gen = NeuronCellMetaClass.CodeGenerator()
+        # 'A' is overridden in 'r1' and 'B' refers to it, so neither of them
+        # only depends on the parameters
+        self.assertEqual(
+            code_gen.parameter_aliases(dynamics,
+                                       code_gen.UnitHandler(dynamics)),
+            ['C', 'D'])
@@ -0,0 +1,47 @@
+from __future__ import print_function
+import os.path
+import tempfile
+import shutil
+import json
+from pype9.cmd import build
+from pype9.utils.arguments import CATALOG_PREFIX
+if __name__ == '__main__':
+    from pype9.utils.testing import DummyTestCase as TestCase  # @UnusedImport
+else:
+    from unittest import TestCase  # @Reimport
+
+
+class TestBuild(TestCase):
+
+    izhi_path = CATALOG_PREFIX + 'neuron/Izhikevich#SampleIzhikevich'
+    brunel_path = CATALOG_PREFIX + 'network/Brunel2000/AI'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resolve_models(self):
+        networks, component_classes = build.resolve_models(self.izhi_path)
+        self.assertEqual(networks, [])
+        self.assertEqual([c.name for c in component_classes], ['Izhikevich'])
+        networks, component_classes = build.resolve_models(self.brunel_path)
+        self.assertEqual([n.name for n in networks], ['AI'])
+        self.assertEqual(component_classes, [])
+
+    def test_build(self):
+        manifest_path = os.path.join(self.tmpdir, 'manifest.json')
+        build_dir = os.path.join(self.tmpdir, 'build')
+        argv = ("{} --simulator nest --build_dir {} --manifest {}"
+                .format(self.izhi_path, build_dir, manifest_path))
+        build.run(argv.split())
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        self.assertEqual(len(manifest), 1)
+        # Check that the built cell class can be loaded in 'require' mode
+        from pype9.simulate.nest import CellMetaClass
+        networks, component_classes = build.resolve_models(self.izhi_path)
+        Cell = CellMetaClass(component_classes[0], build_mode='require',
+                             build_base_dir=build_dir)
+        self.assertEqual(manifest[0]['digest'], Cell.build_digest)
@@ -3,6 +3,8 @@ from __future__ import print_function
 from __future__ import division
 from builtins import zip
 import sys
+import tempfile
+import numpy
 import quantities as pq
 from itertools import chain, repeat
 import logging
@@ -22,6 +24,8 @@ from pype9.simulate.nest import (  # @IgnorePep8
     CellMetaClass as NESTCellMetaClass,
     Simulation as NESTSimulation)
 from pype9.utils.testing import Comparer, input_step, input_freq  # @IgnorePep8
+from pype9.exceptions import (  # @IgnorePep8
+    Pype9DimensionError, Pype9AttributeError, Pype9UsageError)
 from pype9.simulate.nest.units import UnitHandler as UnitHandlerNEST  # @IgnorePep8
 import pype9.utils.logging.handlers.sysout  # @IgnorePep8
 if __name__ == '__main__':
@@ -242,40 +246,8 @@ class TestDynamics(TestCase):
                        duration=100.0, min_delay=5.0, device_delay=5.0,
                        build_mode=BUILD_MODE_DEFAULT, **kwargs):  # @UnusedVariable @IgnorePep8
         # Perform comparison in subprocess
-        iaf = ninemlcatalog.load(
-            'neuron/LeakyIntegrateAndFire', 'PyNNLeakyIntegrateAndFire')
-        alpha_psr = ninemlcatalog.load(
-            'postsynapticresponse/Alpha', 'PyNNAlpha')
-        static = ninemlcatalog.load(
-            'plasticity/Static', 'Static')
-        iaf_alpha = MultiDynamics(
-            name='IafAlpha_sans_synapses',
-            sub_components={
-                'cell': iaf,
-                'syn': MultiDynamics(
-                    name="IafAlaphSyn",
-                    sub_components={'psr': alpha_psr, 'pls': static},
-                    port_connections=[
-                        ('pls', 'fixed_weight', 'psr', 'q')],
-                    port_exposures=[('psr', 'i_synaptic'),
-                                    ('psr', 'spike')])},
-            port_connections=[
-                ('syn', 'i_synaptic__psr', 'cell', 'i_synaptic')],
-            port_exposures=[('syn', 'spike__psr', 'spike')])
-        iaf_alpha_with_syn = MultiDynamicsWithSynapses(
-            'IafAlpha',
-            iaf_alpha,
-            connection_parameter_sets=[
-                ConnectionParameterSet(
-                    'spike', [iaf_alpha.parameter('weight__pls__syn')])])
-        initial_states = {'a__psr__syn': 0.0 * pq.nA,
-                          'b__psr__syn': 0.0 * pq.nA}
-        initial_regime = 'subthreshold___sole_____sole'
-        liaf_properties = ninemlcatalog.load(
-            'neuron/LeakyIntegrateAndFire/',
-            'PyNNLeakyIntegrateAndFireProperties')
-        alpha_properties = ninemlcatalog.load(
-            'postsynapticresponse/Alpha', 'SamplePyNNAlphaProperties')
+        (iaf_alpha_with_syn, properties_with_syn, initial_states,
+         initial_regime) = self._iaf_alpha()
         nest_tranlsations = {'tau__psr__syn': ('tau_syn_ex', 1),
                              'a__psr__syn': (None, 1),
                              'b__psr__syn': (None, 1),
@@ -285,23 +257,6 @@ class TestDynamics(TestCase):
                                'spike': ('spike', 1),
                                'a__psr__syn': (None, 1),
                                'b__psr__syn': (None, 1)}
-        initial_states.update(
-            (k + '__cell', v) for k, v in self.liaf_initial_states.items())
-        properties = DynamicsProperties(
-            name='IafAlphaProperties', definition=iaf_alpha,
-            properties=dict(
-                (p.name + '__' + suffix, p.quantity)
-                for p, suffix in chain(
-                    list(zip(liaf_properties.properties, repeat('cell'))),
-                    list(zip(alpha_properties.properties, repeat('psr__syn'))),
-                    [(Property('weight', 10 * un.nA), 'pls__syn')])))
-        properties_with_syn = DynamicsWithSynapsesProperties(
-            'IafAlpha_props_with_syn',
-            properties,  # @IgnorePep8
-            connection_property_sets=[
-                ConnectionPropertySet(
-                    'spike',
-                    [properties.property('weight__pls__syn')])])
         nest_tranlsations.update(
             (k + '__cell', v)
             for k, v in self.liaf_nest_translations.items())
@@ -359,6 +314,120 @@ class TestDynamics(TestCase):
                 "reference PyNN within {} ({})".format(
                     0.03 * pq.mV, comparisons[('9ML-neuron', 'Ref-neuron')]))
 
+    def _iaf_alpha(self):
+        """
+        Constructs the leaky integrate-and-fire model with an alpha synapse
+        used in the alpha synapse tests
+        """
+        iaf = ninemlcatalog.load(
+            'neuron/LeakyIntegrateAndFire', 'PyNNLeakyIntegrateAndFire')
+        alpha_psr = ninemlcatalog.load(
+            'postsynapticresponse/Alpha', 'PyNNAlpha')
+        static = ninemlcatalog.load(
+            'plasticity/Static', 'Static')
+        iaf_alpha = MultiDynamics(
+            name='IafAlpha_sans_synapses',
+            sub_components={
+                'cell': iaf,
+                'syn': MultiDynamics(
+                    name="IafAlaphSyn",
+                    sub_components={'psr': alpha_psr, 'pls': static},
+                    port_connections=[
+                        ('pls', 'fixed_weight', 'psr', 'q')],
+                    port_exposures=[('psr', 'i_synaptic'),
+                                    ('psr', 'spike')])},
+            port_connections=[
+                ('syn', 'i_synaptic__psr', 'cell', 'i_synaptic')],
+            port_exposures=[('syn', 'spike__psr', 'spike')])
+        iaf_alpha_with_syn = MultiDynamicsWithSynapses(
+            'IafAlpha',
+            iaf_alpha,
+            connection_parameter_sets=[
+                ConnectionParameterSet(
+                    'spike', [iaf_alpha.parameter('weight__pls__syn')])])
+        initial_states = {'a__psr__syn': 0.0 * pq.nA,
+                          'b__psr__syn': 0.0 * pq.nA}
+        initial_regime = 'subthreshold___sole_____sole'
+        liaf_properties = ninemlcatalog.load(
+            'neuron/LeakyIntegrateAndFire/',
+            'PyNNLeakyIntegrateAndFireProperties')
+        alpha_properties = ninemlcatalog.load(
+            'postsynapticresponse/Alpha', 'SamplePyNNAlphaProperties')
+        initial_states.update(
+            (k + '__cell', v) for k, v in self.liaf_initial_states.items())
+        properties = DynamicsProperties(
+            name='IafAlphaProperties', definition=iaf_alpha,
+            properties=dict(
+                (p.name + '__' + suffix, p.quantity)
+                for p, suffix in chain(
+                    list(zip(liaf_properties.properties, repeat('cell'))),
+                    list(zip(alpha_properties.properties, repeat('psr__syn'))),
+                    [(Property('weight', 10 * un.nA), 'pls__syn')])))
+        properties_with_syn = DynamicsWithSynapsesProperties(
+            'IafAlpha_props_with_syn',
+            properties,  # @IgnorePep8
+            connection_property_sets=[
+                ConnectionPropertySet(
+                    'spike',
+                    [properties.property('weight__pls__syn')])])
+        return (iaf_alpha_with_syn, properties_with_syn, initial_states,
+                initial_regime)
+
+    def test_exact_integration(self, dt=0.001, duration=100.0,
+                               build_mode=BUILD_MODE_DEFAULT, **kwargs):  # @UnusedVariable @IgnorePep8
+        # Compare the traces of linear models integrated exactly with the
+        # propagator matrices against those integrated with the ODE solver
+        (iaf_alpha_with_syn, properties_with_syn, initial_states,
+         initial_regime) = self._iaf_alpha()
+        models = {
+            'LIaF': dict(
+                nineml_model=ninemlcatalog.load(
+                    'neuron/LeakyIntegrateAndFire',
+                    'PyNNLeakyIntegrateAndFire'),
+                properties=ninemlcatalog.load(
+                    'neuron/LeakyIntegrateAndFire',
+                    'PyNNLeakyIntegrateAndFireProperties'),
+                initial_states=self.liaf_initial_states,
+                initial_regime='subthreshold',
+                state_variable='v',
+                input_signal=input_step('i_synaptic', 1, 50, 100, dt, 20)),
+            'LIaF with Alpha syn': dict(
+                nineml_model=iaf_alpha_with_syn,
+                properties=properties_with_syn,
+                initial_states=initial_states,
+                initial_regime=initial_regime,
+                state_variable='v__cell',
+                input_train=input_freq('spike', 450 * pq.Hz,
+                                       duration * pq.ms,
+                                       weight=[Property('weight__pls__syn',
+                                                        10 * un.nA)],
+                                       offset=duration / 2.0),
+                min_delay=5.0, device_delay=5.0)}
+        for model_name, comparer_kwargs in models.items():
+            traces = []
+            for exact_integration in (True, False):
+                comparer = Comparer(
+                    simulators=['nest'], dt=dt,
+                    nest_build_args={
+                        'build_mode': build_mode,
+                        'build_version': ('Exact' if exact_integration
+                                          else 'ODE'),
+                        'exact_integration': exact_integration},
+                    **comparer_kwargs)
+                comparer.simulate(duration * un.ms,
+                                  nest_rng_seed=NEST_RNG_SEED)
+                traces.append(comparer.nml_cells['nest'].recording(
+                    comparer_kwargs['state_variable']))
+            exact, ode = traces
+            self.assertEqual(len(exact), len(ode))
+            avg_diff = (numpy.sum(numpy.abs(numpy.ravel(exact) -
+                                            numpy.ravel(ode))) / len(exact))
+            self.assertLess(
+                avg_diff, 0.01 * pq.mV,
+                "{} NEST 9ML simulation integrated exactly did not match the "
+                "ODE solver within {} ({})".format(model_name, 0.01 * pq.mV,
+                                                   avg_diff))
+
     def test_izhiFS(self, plot=PLOT_DEFAULT, print_comparisons=False,
                     simulators=SIMULATORS_TO_TEST, dt=0.001, duration=100.0,
                     build_mode=BUILD_MODE_DEFAULT, **kwargs):  # @UnusedVariable @IgnorePep8
@@ -436,6 +505,118 @@ class TestDynamics(TestCase):
                      sim_name, recorded_rate, ref_rate, 2.5 * pq.Hz,
                      recorded_rate - ref_rate)))
 
+    def test_attributes(self, simulators=SIMULATORS_TO_TEST, dt=0.1,
+                        build_mode=BUILD_MODE_DEFAULT):
+        nineml_model = ninemlcatalog.load('neuron/Izhikevich', 'Izhikevich')
+        properties = ninemlcatalog.load('neuron/Izhikevich',
+                                        'SampleIzhikevich')
+        for sim_name in simulators:
+            celltype = cell_metaclasses[sim_name](nineml_model,
+                                                  build_mode=build_mode)
+            if sim_name == 'neuron':
+                Simulation = NeuronSimulation(dt=dt * un.ms,
+                                              seed=NEURON_RNG_SEED)
+            else:
+                Simulation = NESTSimulation(dt=dt * un.ms, seed=NEST_RNG_SEED)
+            with Simulation:
+                cell = celltype(properties, V=-65.0 * un.mV,
+                                U=-14.0 * un.mV / un.ms)
+                self.assertEqual(cell.V, -65.0 * pq.mV)
+                # Set with 9ML and python-quantities quantities
+                cell.V = -0.07 * un.V
+                self.assertAlmostEqual(float(cell.V.rescale(pq.mV)), -70.0)
+                cell.a = 30.0 * pq.Hz
+                self.assertAlmostEqual(float(cell.a.rescale(pq.Hz)), 30.0)
+                # Check the values are reflected in the 9ML properties
+                initial_v = next(i for i in cell.initial_values
+                                 if i.name == 'V')
+                self.assertAlmostEqual(
+                    float(initial_v.quantity.in_units(un.mV)), -70.0)
+                self.assertAlmostEqual(
+                    float(cell.property('a').quantity.in_units(un.Hz)),
+                    30.0)
+                self.assertRaises(Pype9DimensionError, setattr, cell, 'V',
+                                  1.0 * un.ms)
+                self.assertRaises(Pype9AttributeError, setattr, cell,
+                                  'not_a_variable', 1.0 * un.ms)
+                # Get and set multiple values at once
+                cell.set_many({'V': -60.0 * un.mV, 'b': 0.3 * un.per_ms})
+                values = cell.get_many(['V', 'b'])
+                self.assertAlmostEqual(float(values['V'].rescale(pq.mV)),
+                                       -60.0)
+                self.assertAlmostEqual(float(values['b'].rescale(pq.Hz)),
+                                       300.0)
+                cell.V = -50.0 * un.mV
+                cell.initialize()
+                self.assertAlmostEqual(float(cell.V.rescale(pq.mV)), -50.0)
+
+    def test_create_many(self, simulators=SIMULATORS_TO_TEST, dt=0.1,
+                         build_mode=BUILD_MODE_DEFAULT):
+        nineml_model = ninemlcatalog.load('neuron/Izhikevich', 'Izhikevich')
+        properties = ninemlcatalog.load('neuron/Izhikevich',
+                                        'SampleIzhikevich')
+        for sim_name in simulators:
+            celltype = cell_metaclasses[sim_name](nineml_model,
+                                                  build_mode=build_mode)
+            if sim_name == 'neuron':
+                Simulation = NeuronSimulation(dt=dt * un.ms,
+                                              seed=NEURON_RNG_SEED)
+            else:
+                Simulation = NESTSimulation(dt=dt * un.ms, seed=NEST_RNG_SEED)
+            with Simulation:
+                cells = celltype.create_many(
+                    3, properties,
+                    properties={'a': [0.01, 0.02, 0.03] * pq.Hz * 1000},
+                    initial_values={'V': -65.0 * un.mV,
+                                    'U': [-14.0, -13.0, -12.0] * (
+                                        pq.mV / pq.ms)})
+                self.assertEqual(len(cells), 3)
+                for cell, a, U in zip(cells, (10.0, 20.0, 30.0),
+                                      (-14.0, -13.0, -12.0)):
+                    self.assertAlmostEqual(float(cell.a.rescale(pq.Hz)), a)
+                    self.assertAlmostEqual(
+                        float(cell.U.rescale(pq.mV / pq.ms)), U)
+                    self.assertAlmostEqual(float(cell.V.rescale(pq.mV)),
+                                           -65.0)
+                self.assertRaises(
+                    Pype9UsageError, celltype.create_many, 2, properties,
+                    properties={'a': [0.01] * pq.Hz})
+
+    def test_recording_cache(self, simulators=SIMULATORS_TO_TEST, dt=0.1,
+                             duration=20.0, build_mode=BUILD_MODE_DEFAULT):
+        nineml_model = ninemlcatalog.load('neuron/Izhikevich', 'Izhikevich')
+        properties = ninemlcatalog.load('neuron/Izhikevich',
+                                        'SampleIzhikevich')
+        for sim_name in simulators:
+            celltype = cell_metaclasses[sim_name](nineml_model,
+                                                  build_mode=build_mode)
+            if sim_name == 'neuron':
+                Simulation = NeuronSimulation
+                seed = NEURON_RNG_SEED
+            else:
+                Simulation = NESTSimulation
+                seed = NEST_RNG_SEED
+            for cache_dir in (None, tempfile.mkdtemp()):
+                with Simulation(dt=dt * un.ms, seed=seed,
+                                recording_cache_dir=cache_dir) as sim:
+                    cell = celltype(properties, V=-65.0 * un.mV,
+                                    U=-14.0 * un.mV / un.ms)
+                    cell.record('V')
+                    cell.record_regime()
+                    sim.run(duration * un.ms)
+                    live = cell.recording('V')
+                # Recordings should still be accessible after the simulation
+                # has ended and a new simulation has been started
+                with Simulation(dt=dt * un.ms, seed=seed) as sim:
+                    other = celltype(properties, V=-60.0 * un.mV,
+                                     U=-14.0 * un.mV / un.ms)
+                    sim.run(duration * un.ms)
+                    cached = cell.recording('V')
+                    self.assertEqual(len(cached), len(live))
+                    self.assertTrue(all(cached == live))
+                    self.assertEqual(len(cell.regime_epochs()), 1)
+                    self.assertIsNot(other, cell)
+
 
 if __name__ == '__main__':
     import argparse
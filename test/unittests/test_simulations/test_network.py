@@ -6,6 +6,7 @@ from builtins import range
 from itertools import groupby
 from operator import itemgetter
 import itertools
+import tempfile
 import numpy
 import quantities as pq
 import neo
@@ -24,11 +25,16 @@ from nineml.abstraction.ports import (
 from nineml.user import AnalogPortConnection, ConnectionRuleProperties
 from nineml import units as un
 from nineml.units import ms
-from nineml.values import RandomDistributionValue
+from nineml.values import RandomDistributionValue, ArrayValue
+import nineml
+from pyNN.random import NumpyRNG
 from pype9.simulate.common.cells import (
     ConnectionPropertySet, MultiDynamicsWithSynapsesProperties,
     SynapseProperties)
 from pype9.simulate.common.network import Network as BasePype9Network
+from pype9.simulate.common.network.base import _is_linear
+from pype9.simulate.common.network.values import get_pyNN_value
+from pype9.utils.misc import structural_memo
 from pype9.simulate.neuron.network import Network as NeuronPype9Network
 from pype9.simulate.neuron import Simulation as NeuronSimulation
 import ninemlcatalog
@@ -37,6 +43,7 @@ argv = sys.argv[1:]  # Save argv before it is clobbered by the NEST init.
 import nest  # @IgnorePep8
 from pype9.simulate.nest.network import Network as NestPype9Network  # @IgnorePep8
 from pype9.simulate.nest import Simulation as NESTSimulation  # @IgnorePep8
+from pype9.simulate.nest.units import UnitHandler as NESTUnitHandler  # @IgnorePep8
 from pype9.utils.testing import ReferenceBrunel2000  # @IgnorePep8
 import pype9.utils.logging.handlers.sysout  # @IgnorePep8
 
@@ -216,6 +223,35 @@ class TestBrunel2000(TestCase):
                         self.out_stdev_error[(pop1_name, pop2_name)],
                         percent_error))
 
+    def test_connections(self, case='AI', order=10, **kwargs):  # @UnusedVariable @IgnorePep8
+        with self.simulations['nest']:
+            nml = self._construct_nineml(case, order, 'nest')
+            for conn_group in nml.connection_groups:
+                stored = sorted(conn_group.connectivity.connections())
+                connected = sorted(
+                    (int(i), int(j)) for i, j in conn_group.get(
+                        [], format='list', gather='all'))
+                self.assertEqual(stored, connected)
+
+    def test_save_connections(self, case='AI', order=10, **kwargs):  # @UnusedVariable @IgnorePep8
+        connections_dir = tempfile.mkdtemp()
+        saved = {}
+        with self.simulations['nest']:
+            nml = self._construct_nineml(case, order, 'nest')
+            nml.save_connections(connections_dir)
+            for conn_group in nml.connection_groups:
+                saved[conn_group.name] = sorted(conn_group.get(
+                    ['weight', 'delay'], format='list'))
+        with self.simulations['nest']:
+            nml = self._construct_nineml(case, order, 'nest',
+                                         connections_from=connections_dir)
+            for conn_group in nml.connection_groups:
+                loaded = sorted(conn_group.get(['weight', 'delay'],
+                                               format='list'))
+                self.assertEqual(len(loaded), len(saved[conn_group.name]))
+                for l, s in zip(loaded, saved[conn_group.name]):
+                    self.assertTrue(numpy.allclose(l, s))
+
     def test_connection_params(self, case='AI', order=10, **kwargs):  # @UnusedVariable @IgnorePep8
         with self.simulations['nest']:
             nml = self._construct_nineml(case, order, 'nest')
@@ -494,6 +530,13 @@ class TestBrunel2000(TestCase):
                 block = data[simulator][pop.name] = pop.get_data()
                 segment = block.segments[0]
                 spiketrains = segment.spiketrains
+                if record_states and pop.name != 'Ext':
+                    recordings = pop.recordings(['spike_output', 'v__cell'])
+                    self.assertEqual(
+                        len(recordings['spike_output'].spiketrains),
+                        len(spiketrains))
+                    self.assertEqual(
+                        len(recordings['v__cell'].analogsignals), 1)
                 spike_times = []
                 ids = []
                 for i, spiketrain in enumerate(spiketrains):
@@ -572,6 +615,32 @@ class TestBrunel2000(TestCase):
         self.assertEqual(len(component_arrays), 3)
         self.assertEqual(len(connection_groups), 3)
         self.assertEqual(len(selections), 1)
+        # The synapse types should be retrieved from the memo caches when the
+        # network is flattened again
+        num_cached = len(_is_linear.cache)
+        BasePype9Network._flatten_to_arrays_and_conns(brunel_network)
+        self.assertEqual(len(_is_linear.cache), num_cached)
+
+    def test_structural_memo(self, **kwargs):  # @UnusedVariable
+        # Only the most recently used results should be kept in the memo
+        # cache so the objects they were calculated from can be released
+        brunel_network = ninemlcatalog.load(
+            'network/Brunel2000/AI/').as_network('brunel_ai')
+        component_classes = list(dict(
+            (p.cell.component_class.name, p.cell.component_class)
+            for p in brunel_network.populations).values())
+        calls = []
+
+        @structural_memo(maxsize=1)
+        def analyse(component_class):
+            calls.append(component_class)
+            return component_class.name
+
+        for component_class in component_classes * 2:
+            self.assertEqual(analyse(component_class), component_class.name)
+            self.assertLessEqual(len(analyse.cache), 1)
+        analyse(component_classes[-1])
+        self.assertEqual(len(calls), 2 * len(component_classes))
 
     def _construct_nineml(self, case, order, simulator, external_input=None,
                           **kwargs):
@@ -1083,3 +1152,25 @@ class TestNetwork(TestCase):
             "Mismatch between generated and expected connection groups:\n {}"
             .format(
                 connection_groups['Proj4'] .find_mismatch(conn_group6)))
+
+    def test_get_pyNN_value(self):
+        # Array values are scaled into the simulator units with a single
+        # multiplication
+        array_qty = nineml.Quantity(ArrayValue(numpy.arange(10.0)), un.V)
+        value = get_pyNN_value(array_qty, NESTUnitHandler, None)
+        self.assertTrue(numpy.allclose(value.value,
+                                       numpy.arange(10.0) * 1000.0))
+        # Random distributions are scaled as they are drawn
+        rand_qty = nineml.Quantity(
+            RandomDistributionValue(RandomDistributionProperties(
+                'uniform_props',
+                ninemlcatalog.load('randomdistribution/Uniform',
+                                   'UniformDistribution'),
+                {'minimum': 1.0 * un.unitless,
+                 'maximum': 2.0 * un.unitless})),
+            un.V)
+        rand_value = get_pyNN_value(rand_qty, NESTUnitHandler,
+                                    NumpyRNG(seed=NEST_RNG_SEED))
+        drawn = rand_value.next(100)
+        self.assertTrue(all(drawn >= 1000.0))
+        self.assertTrue(all(drawn <= 2000.0))
@@ -2,6 +2,7 @@
 from __future__ import division
 from past.utils import old_div
 import os.path
+import tempfile
 import math
 from nineml import units as un
 from pype9.simulate.common.units import UnitHandler as BaseUnitHandler
@@ -182,6 +183,44 @@ class TestUnitAssignment(TestCase):
                              "scale ({} -> {})".format(unit.name, unit.power,
                                                        new_power))
 
+    def test_persistent_cache(self):
+        cache_path = os.path.join(tempfile.mkdtemp(),
+                                  'test' + BaseUnitHandler._CACHE_FILENAME)
+
+        def create_handler_class():
+            return type('TestUnitHandler3', (TestUnitHandler2,), {
+                '_cache_path': cache_path,
+                'cache': BaseUnitHandler._init_matrices_and_cache(
+                    TestUnitHandler2.basis, TestUnitHandler2.compounds,
+                    cache_path)[1]})
+
+        handler_cls = create_handler_class()
+        dimension = self.test_units[2].dimension
+        self.assertNotIn(tuple(dimension), handler_cls.cache)
+        compound = handler_cls.dimension_to_units_compound(dimension)
+        # Check that the projection is loaded into new classes from disk
+        new_handler_cls = create_handler_class()
+        self.assertIn(tuple(dimension), new_handler_cls.cache)
+        self.assertEqual(
+            new_handler_cls.dimension_to_units_compound(dimension), compound)
+        new_handler_cls.clear_cache()
+        self.assertFalse(os.path.exists(cache_path))
+
+    def test_cache_lookup(self):
+        TestUnitHandler1.clear_cache()
+        for unit in self.test_units:
+            exponent, compound = TestUnitHandler1.dimension_to_units_compound(
+                unit.dimension)
+            num_cached = len(TestUnitHandler1.cache)
+            # Integer powers of the dimension should be matched from the cache
+            for power in (2, 3, -1):
+                self.assertEqual(
+                    TestUnitHandler1.dimension_to_units_compound(
+                        (unit ** power).dimension),
+                    (exponent * power, [(u, p * power) for u, p in compound]))
+            self.assertEqual(len(TestUnitHandler1.cache), num_cached)
+
+
 if __name__ == '__main__':
     tester = TestUnitAssignment()
     tester.test_scaling_and_assignment()